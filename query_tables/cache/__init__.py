@@ -1,14 +1,56 @@
-from query_tables.cache.base_cache import BaseCache, AsyncBaseCache, TypeCache
+import importlib
+from typing import TYPE_CHECKING
+from query_tables.cache.base_cache import BaseCache, AsyncBaseCache, TypeCache, QueryKey
+from query_tables.cache.write_through import TableWrite
+from query_tables.cache.handle import CacheHandle, AsyncCacheHandle
+from query_tables.cache.policy import CachePolicy
 from query_tables.cache.cache_query import CacheQuery
-from query_tables.cache.redis_cache import RedisCache, RedisConnect
-from query_tables.cache.async_redis_cache import AsyncRedisCache
+
+if TYPE_CHECKING:
+    from query_tables.cache.redis_cache import RedisCache, RedisConnect
+    from query_tables.cache.async_redis_cache import AsyncRedisCache
+    from query_tables.cache.tiered_cache import TieredCache, AsyncTieredCache
+    from query_tables.cache.shared_cache import SharedMemoryCache
+
+# Модули с кешем на redis и в общей памяти импортируются при первом обращение,
+# чтобы не загружать драйвер и модули платформы, если они не используются.
+_lazy_imports = {
+    'RedisCache': 'query_tables.cache.redis_cache',
+    'RedisConnect': 'query_tables.cache.redis_cache',
+    'AsyncRedisCache': 'query_tables.cache.async_redis_cache',
+    'TieredCache': 'query_tables.cache.tiered_cache',
+    'AsyncTieredCache': 'query_tables.cache.tiered_cache',
+    'SharedMemoryCache': 'query_tables.cache.shared_cache',
+}
+
+
+def __getattr__(name: str):
+    module = _lazy_imports.get(name)
+    if module is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_lazy_imports})
+
 
 __all__ =[
     'BaseCache', 
     'AsyncBaseCache',
     'CacheQuery',
+    'CachePolicy',
     'RedisCache',
     'AsyncRedisCache',
     'RedisConnect',
-    'TypeCache'
-]
\ No newline at end of file
+    'TieredCache',
+    'AsyncTieredCache',
+    'SharedMemoryCache',
+    'TypeCache',
+    'QueryKey',
+    'TableWrite',
+    'CacheHandle',
+    'AsyncCacheHandle'
+]
@@ -1,6 +1,5 @@
-import hashlib
-import asyncio
 from redis import asyncio as aioredis
+from redis.asyncio.client import PubSub
 import json
 import datetime
 import logging
@@ -8,67 +7,107 @@ import base64
 import uuid
 from typing import Union, List, Dict, Optional, Iterator, Tuple
 from query_tables.cache import AsyncBaseCache, RedisConnect, TypeCache
+from query_tables.cache.handle import AsyncCacheHandle
+from query_tables.cache.index import scan, split_operator
+from query_tables.cache.predicates import any_overlap
+from query_tables.cache.ttl import query_ttl, is_ttl_enabled
+from query_tables.cache.keys import hash_key, query_hashkey
 from query_tables.exceptions import NoMatchFieldInCache
+from query_tables.fork import register_after_fork, orphan
 
 logger = logging.getLogger(__name__)
 
 
-class AsyncLockDecorator:
+class AsyncRedisErrorDecorator:
     """
-        Обертка для async redis.
+        Обертка для записи в лог ошибок соединения с async redis.
+        Команды выполняются через общий пул соединений без блокировки.
     """    
-    def __init__(self, method, lock):
+    def __init__(self, method):
         self.method = method
-        self.lock = lock
 
     async def __call__(self, *args, **kwargs):
-        async with self.lock:
-            try:
-                return await self.method(*args, **kwargs)
-            except ConnectionError as e:
-                logger.error(f"Произошла ошибка соединения с Redis: {e}")
-            except TimeoutError as e:
-                logger.error(f"Время ожидания выполнения команды истекло: {e}")
+        try:
+            return await self.method(*args, **kwargs)
+        except ConnectionError as e:
+            logger.error(f"Произошла ошибка соединения с Redis: {e}")
+        except TimeoutError as e:
+            logger.error(f"Время ожидания выполнения команды истекло: {e}")
 
 
 class AsyncRedisCache(AsyncBaseCache):
     
     type_cache = TypeCache.remote
     
-    def __init__(self, conn: RedisConnect):
+    def __init__(
+        self, conn: RedisConnect, versioned_keys: bool = False,
+        ttl: Union[int, Dict[str, int]] = 0, stale_ttl: int = 0,
+        negative_ttl: int = 0
+    ):
+        """
+        Args:
+            conn (RedisConnect): Параметры подключения к redis.
+            versioned_keys (bool, optional): Ключи запросов включают поколения таблиц.
+                Изменение таблицы только увеличивает ее поколение (один INCR), 
+                а старые записи вытесняются политикой памяти redis.
+            ttl (Union[int, Dict[str, int]], optional): Время жизни ключей запросов в секундах. 
+                Можно задать время по таблицам: `{'country': 86400, 'orders': 5}`. Запрос с несколькими 
+                таблицами живет наименьшее из их времен, таблицы не из словаря не кешируются.
+                По умолчанию 0 - ключи не истекают.
+            stale_ttl (int, optional): Сколько секунд после ttl запись еще отдается из кеша,
+                пока ее обновляет фоновый запрос к БД. По умолчанию 0 - записи не отдаются после ttl.
+            negative_ttl (int, optional): Время жизни пустых результатов запросов с таблицами.
+                Не больше ttl запроса. По умолчанию 0 - пустые результаты не кешируются.
+        """
         self._conn = conn
+        self._versioned_keys = versioned_keys
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl if is_ttl_enabled(ttl) else 0
+        self._negative_ttl = negative_ttl
         self._pool = aioredis.ConnectionPool.from_url(conn.get_url(), encoding="utf-8", decode_responses=True)
         self._redis = aioredis.Redis.from_pool(connection_pool=self._pool)
         self._key_queries = 'queries'
         self._key_tables = 'tables'
         self._key_struct = 'struct_tables'
-        self._res: List[Dict] = []
-        self._hashkey = ''
-        self._filter_params = {}
-        self._lock = asyncio.Lock()
-        lock_methods = [
+        self._key_generations = 'generations'
+        self._key_predicates = 'predicates'
+        self._key_fresh = 'fresh'
+        wrapped_methods = [
             self.is_enabled_cache,
             self.clear,
             self.delete_cache_table,
-            self.set_data,
-            self.delete_query,
-            self.insert,
-            self.update,
-            self.delete
+            self.is_stale,
+            self.lookup,
+            self._get_records,
+            self._set_data,
+            self._delete_query,
+            self._insert_record,
+            self._update_records,
+            self._delete_records
         ]
-        for method in lock_methods:
+        for method in wrapped_methods:
             setattr(
                 self, method.__name__, 
-                AsyncLockDecorator(method, self._lock)
+                AsyncRedisErrorDecorator(method)
             )
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            В дочернем процессе создается свой пул соединений.
+        """
+        orphan(self._pool)
+        self._pool = aioredis.ConnectionPool.from_url(
+            self._conn.get_url(), encoding="utf-8", decode_responses=True
+        )
+        self._redis = aioredis.Redis.from_pool(connection_pool=self._pool)
 
     async def is_enabled_cache(self) -> bool:
         """
             Включен ли кеш.
         """
         try:
-            async with self._redis as client:
-                await client.ping()
+            await self._redis.ping()
             return True
         except aioredis.ConnectionError:
             return False
@@ -77,123 +116,222 @@ class AsyncRedisCache(AsyncBaseCache):
         """
             Очищение кеша.
         """
-        async with self._redis as client:
-            await client.flushdb()
+        await self._redis.flushdb()
 
-    async def delete_cache_table(self, table: str) -> bool:
+    async def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
         """Удаление кеша по таблице. Вседу, где использовалась таблица.
             Не связан с конкретным запросом.
 
         Args:
             table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
         
         Returns:
             bool: Флаг успешности.
         """
-        async with self._redis as client:
-            hashes = await client.lrange(f'{self._key_tables}:{table}', 0, -1)
+        if self._versioned_keys:
+            await self._redis.incr(f'{self._key_generations}:{table}')
+        hashes = await self._redis.lrange(f'{self._key_tables}:{table}', 0, -1)
+        if not hashes:
+            return self._versioned_keys
+        if predicates is not None:
+            values = await self._redis.mget([
+                f'{self._key_predicates}:{hashkey}' for hashkey in hashes
+            ])
+            hashes = [
+                hashkey for hashkey, value in zip(hashes, values)
+                if any_overlap(json.loads(value).get(table) if value else None, predicates)
+            ]
             if not hashes:
-                return False
-            await client.delete(
-                *[f'{self._key_queries}:{hashkey}' for hashkey in hashes]
-            )
+                return True
+        await self._redis.delete(
+            *[f'{self._key_queries}:{hashkey}' for hashkey in hashes],
+            *[f'{self._key_predicates}:{hashkey}' for hashkey in hashes],
+            *[f'{self._key_fresh}:{hashkey}' for hashkey in hashes]
+        )
         for hashkey in hashes:
             await self._delete_hashkey_in_tables(hashkey)
         return True
 
-    def __getitem__(self, query: str) -> 'AsyncBaseCache':
-        """Устанавливает контекст SQL запроса.
+    def is_enabled_negative_cache(self) -> bool:
+        """
+            Сохраняются ли в кеш пустые результаты запросов.
+        """
+        return self._negative_ttl > 0
+
+    async def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. Отличает сохраненный пустой результат 
+            от отсутствия запроса в кеше.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата 
+                или ничего, если запроса нет в кеше.
+        """
+        return await self._load_or_forget(query, await self._get_hashkey(query))
+
+    async def is_stale(self, query: str) -> bool:
+        """Запись запроса устарела, но еще отдается из кеша до фонового обновления.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """
+        if not self._stale_ttl:
+            return False
+        hashkey = await self._get_hashkey(query)
+        return not await self._redis.exists(f'{self._key_fresh}:{hashkey}')
+
+    def __getitem__(self, query: str) -> AsyncCacheHandle:
+        """Данные SQL запроса в кеше.
 
         Args:
             query (str): SQL Запрос.
 
         Returns:
-            AsyncBaseCache: Кеш.
+            AsyncCacheHandle: Данные запроса.
         """
-        self._res = []
-        self._hashkey = self._get_hashkey_query(query)
-        return self
-    
-    async def get(self) -> Union[List[Dict], List]:
+        return AsyncCacheHandle(self, query)
+
+    async def _load_records(self, hashkey: str) -> Optional[List[Dict]]:
+        """Загружает записи запроса из redis.
+
+        Args:
+            hashkey (str): Ключ запроса.
+
+        Returns:
+            Optional[List[Dict]]: Записи или ничего, если запроса нет в кеше.
+        """
+        res_str = await self._redis.get(f'{self._key_queries}:{hashkey}')
+        if not res_str:
+            return None
+        return json.loads(res_str)
+
+    async def _save_records(self, hashkey: str, records: List[Dict]):
+        """Сохраняет измененные записи запроса, не меняя время жизни ключа.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи.
+        """
+        await self._redis.set(
+            f'{self._key_queries}:{hashkey}', self._encode_data(records), keepttl=True
+        )
+
+    async def _load_or_forget(self, query: str, hashkey: str) -> Optional[List[Dict]]:
+        """Загружает записи запроса. Если запроса нет в кеше, 
+            его хеш удаляется из списков таблиц.
+
+        Args:
+            query (str): SQL запрос.
+            hashkey (str): Ключ запроса.
+
+        Returns:
+            Optional[List[Dict]]: Записи или ничего, если запроса нет в кеше.
+        """
+        records = await self._load_records(hashkey)
+        if records is None and not self._is_versioned(query):
+            await self._delete_hashkey_in_tables(hashkey)
+        return records
+
+    async def _get_records(self, query: str, params: Dict) -> Union[List[Dict], List]:
         """Получение данных из кеша по условию или без условия.
 
+        Args:
+            query (str): SQL запрос.
+            params (Dict): Условие выборки.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
         Returns:
             Union[List[Dict], List]: Записи или пустой список.
         """
-        if not self._res:
-            await self._init_data()
-        if not self._filter_params:
-            return self._res
-        else:
-            if not self._check_fields_in_cache(list(self._filter_params.keys())):
-                raise NoMatchFieldInCache()
-            data = list(self._filtered_data(self._filter_params))
-            self._filter_params.clear()
-            return data
+        hashkey = await self._get_hashkey(query)
+        records = await self._load_or_forget(query, hashkey) or []
+        if not params:
+            return records
+        if not self._check_fields_in_cache(records, list(params.keys())):
+            raise NoMatchFieldInCache()
+        return list(self._filtered_data(records, params))
 
-    async def set_data(self, data: List[Dict]):
+    async def _set_data(self, query: str, data: List[Dict]):
         """Сохранить в кеш данные.
 
         Args:
+            query (str): SQL запрос.
             data (List[Dict]): Результирующие данные из БД.
         """
-        tables = self._get_tables_from_fields(data)
-        await self._save_hashkey_in_tables(tables, self._hashkey)
-        async with self._redis as client:
-            await client.set(f'{self._key_queries}:{self._hashkey}', self._encode_data(data))
+        # пустой результат без таблиц нельзя удалить при их изменение
+        if not data and not (self._negative_ttl and getattr(query, 'tables', None)):
+            return None
+        if not self._is_cached(query):
+            return None
+        hashkey = await self._get_hashkey(query)
+        if not self._is_versioned(query):
+            tables = self._get_tables_from_fields(data) if data else list(query.tables)
+            await self._save_hashkey_in_tables(tables, hashkey)
+        predicates = getattr(query, 'predicates', None)
+        expire, fresh_expire = self._get_expire(query, not data)
+        if predicates is None or self._is_versioned(query):
+            await self._redis.delete(f'{self._key_predicates}:{hashkey}')
+        else:
+            await self._redis.set(
+                f'{self._key_predicates}:{hashkey}', json.dumps(predicates), ex=expire
+            )
+        await self._redis.set(
+            f'{self._key_queries}:{hashkey}', self._encode_data(data), ex=expire
+        )
+        if self._stale_ttl:
+            await self._redis.set(f'{self._key_fresh}:{hashkey}', 1, ex=fresh_expire)
 
-    async def delete_query(self):
-        """ Удаление из кеша данных. """
-        async with self._redis as client:
-            await client.delete(f'{self._key_queries}:{self._hashkey}')
-        await self._delete_hashkey_in_tables(self._hashkey)
+    async def _delete_query(self, query: str):
+        """Удаление из кеша данных.
 
-    def filter(self, params: Dict) -> 'AsyncBaseCache':
-        """Условие для выборки записей в кеше.
-        Выборка учитывает точное совпадение значений.
-        
         Args:
-            Название полей для выборки. К примеру: `.filter({'person.id': 1, 'person.name': 'Anton'})`
-                Название таблицы: person
-                Название поля: id
-
-        Returns:
-            AsyncBaseCache: Кеш.
+            query (str): SQL запрос.
         """
-        self._filter_params.clear()
-        self._filter_params.update(params)
-        return self
-        
-    async def insert(self, record: Dict) -> Optional[Dict]:
+        hashkey = await self._get_hashkey(query)
+        await self._redis.delete(
+            f'{self._key_queries}:{hashkey}', f'{self._key_predicates}:{hashkey}',
+            f'{self._key_fresh}:{hashkey}'
+        )
+        if not self._is_versioned(query):
+            await self._delete_hashkey_in_tables(hashkey)
+
+    async def _insert_record(self, query: str, record: Dict) -> Optional[Dict]:
         """Добавление записи к кеш.
 
         Args:
-            params (Dict): Запись.
+            query (str): SQL запрос.
+            record (Dict): Запись.
             
         Raises:
             NoMatchFieldInCache: Нет такого поля.
         """
-        if not self._res:
-            await self._init_data()
-        if not self._check_fields_identity(list(record.keys())):
+        hashkey = await self._get_hashkey(query)
+        records = await self._load_or_forget(query, hashkey)
+        if not self._check_fields_identity(records or [], list(record.keys())):
             raise NoMatchFieldInCache()
-        async with self._redis as client:
-            res_key = await client.exists(f'{self._key_queries}:{self._hashkey}')
-        if not res_key:
-            await self._delete_hashkey_in_tables(self._hashkey)
-            self._res = []
-            return None
-        self._res.append(record)
-        async with self._redis as client:
-            await client.set(f'{self._key_queries}:{self._hashkey}', self._encode_data(self._res))
+        records.append(record)
+        await self._save_records(hashkey, records)
         return record
 
-    async def update(self, params: Dict) -> Union[List[Dict], List]:
+    async def _update_records(
+        self, query: str, filter_params: Dict, params: Dict
+    ) -> Union[List[Dict], List]:
         """Обновление записей в кеше по условию.
         
         Args:
-            Название полей для обновления. К примеру: `.filter({'person.id': 1}).update({'person.name': 'Anton'})`
-                либо `.update(**params)`
+            query (str): SQL запрос.
+            filter_params (Dict): Условие выборки.
+            params (Dict): Новые значения полей.
                 
         Raises:
             NoMatchFieldInCache: Нет такого поля.
@@ -201,55 +339,41 @@ class AsyncRedisCache(AsyncBaseCache):
         Returns:
             Union[List[Dict], List]: Обновленные записи или пустой список.
         """
-        updateted_records = []
-        if not self._res:
-            await self._init_data()
-        if not self._check_fields_in_cache(list(self._filter_params.keys())):
+        hashkey = await self._get_hashkey(query)
+        records = await self._load_or_forget(query, hashkey) or []
+        if not self._check_fields_in_cache(records, list(filter_params.keys())):
             raise NoMatchFieldInCache()
-        if not self._check_fields_in_cache(list(params.keys())):
+        if not self._check_fields_in_cache(records, list(params.keys())):
             raise NoMatchFieldInCache()
-        async with self._redis as client:
-            res_key = await client.exists(f'{self._key_queries}:{self._hashkey}')
-        if not res_key:
-            await self._delete_hashkey_in_tables(self._hashkey)
-            self._res = []
-            self._filter_params.clear()
-            return updateted_records
-        for record in self._filtered_data(self._filter_params):
-            record.update(params)
-            updateted_records.append(record)
-        async with self._redis as client:
-            await client.set(f'{self._key_queries}:{self._hashkey}', self._encode_data(self._res))
-        self._filter_params.clear()
+        updateted_records = []
+        for i in self._get_index_records(records, filter_params):
+            records[i].update(params)
+            updateted_records.append(records[i])
+        await self._save_records(hashkey, records)
         return updateted_records
 
-    async def delete(self) -> Union[List[Dict], List]:
+    async def _delete_records(self, query: str, filter_params: Dict) -> Union[List[Dict], List]:
         """Удаление записей из кеша по условию.
         
         Args:
-            Название полей для обновления. К примеру: `.filter({'person.id': 1}).delete()`
+            query (str): SQL запрос.
+            filter_params (Dict): Условие выборки.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
 
         Returns:
             Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
         """
-        deleted = []
-        if not self._res:
-            await self._init_data()
-        if not self._check_fields_in_cache(list(self._filter_params.keys())):
+        hashkey = await self._get_hashkey(query)
+        records = await self._load_or_forget(query, hashkey) or []
+        if not self._check_fields_in_cache(records, list(filter_params.keys())):
             raise NoMatchFieldInCache()
-        async with self._redis as client:
-            res_key = await client.exists(f'{self._key_queries}:{self._hashkey}')
-        if not res_key:
-            await self._delete_hashkey_in_tables(self._hashkey)
-            self._res = []
-            self._filter_params.clear()
-            return deleted
-        for i in self._get_index_records(self._filter_params):
-            deleted.append(self._res[i])
-            del self._res[i]
-        async with self._redis as client:
-            await client.set(f'{self._key_queries}:{self._hashkey}', self._encode_data(self._res))
-        self._filter_params.clear()
+        positions = list(self._get_index_records(records, filter_params))
+        deleted = [records[i] for i in positions]
+        for i in reversed(positions):
+            del records[i]
+        await self._save_records(hashkey, records)
         return deleted
     
     async def _get_data_query(self, query: str) -> Union[List[List], List]:
@@ -262,8 +386,7 @@ class AsyncRedisCache(AsyncBaseCache):
             Union[List[List], List]: Данные.
         """        
         hashkey = self._get_hashkey_query(query)
-        async with self._redis as client:
-            res_str = await client.get(f'{self._key_queries}:{hashkey}')
+        res_str = await self._redis.get(f'{self._key_queries}:{hashkey}')
         if res_str:
             return json.loads(res_str)
         return []
@@ -276,8 +399,7 @@ class AsyncRedisCache(AsyncBaseCache):
             data (List[Tuple]): Данные.
         """        
         hashkey = self._get_hashkey_query(query)
-        async with self._redis as client:
-            await client.set(f'{self._key_queries}:{hashkey}', self._encode_data(data))
+        await self._redis.set(f'{self._key_queries}:{hashkey}', self._encode_data(data))
             
     async def _delete_data_query(self, query: str):
         """Удаляет даннные произвольного запроса из кеша.
@@ -286,39 +408,131 @@ class AsyncRedisCache(AsyncBaseCache):
             query (str): SQL запрос.
         """
         hashkey = self._get_hashkey_query(query)
-        async with self._redis as client:
-            await client.delete(f'{self._key_queries}:{hashkey}')
+        await self._redis.delete(f'{self._key_queries}:{hashkey}')
     
-    async def _get_struct_tables(self) -> Optional[Dict[str, List[str]]]:
+    async def _publish(self, channel: str, message: str):
+        """Отправляет сообщение в канал redis.
+
+        Args:
+            channel (str): Канал.
+            message (str): Сообщение.
+        """
+        await self._redis.publish(channel, message)
+
+    async def _subscribe(self, channel: str) -> PubSub:
+        """Подписка на канал redis через отдельное соединение из пула.
+
+        Args:
+            channel (str): Канал.
+
+        Returns:
+            PubSub: Подписка. Сообщения читаются через `listen`.
+                После `aclose` соединение возвращается в пул.
+        """
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        return pubsub
+
+    async def _get_struct_tables(self, version: str = '') -> Optional[Dict[str, List[str]]]:
         """Получение из кеша структуры таблиц.
+        
+        Args:
+            version (str, optional): Версия схемы БД. Структура другой версии считается устаревшей.
 
         Returns:
             Optional[Dict[str, List[str]]]: Структура таблиц.
         """
-        async with self._redis as client:
-            res = await client.get(self._key_struct)
+        res = await self._redis.get(self._get_struct_key(version))
         if not res:
             return None 
         return json.loads(res)
     
-    async def _save_struct_tables(self, struct: Dict[str, List[str]]):
+    async def _save_struct_tables(self, struct: Dict[str, List[str]], version: str = ''):
         """Сохранение в кеше структуры таблиц.
 
         Args:
             struct (Dict[str, List[str]]): Структура таблиц.
+            version (str, optional): Версия схемы БД.
         """        
         res = json.dumps(struct)
-        async with self._redis as client:
-            await client.set(self._key_struct, res)
+        await self._redis.set(self._get_struct_key(version), res)
     
-    async def _init_data(self):
-        """ Инициализирует переменную с данными по запросу. """
-        async with self._redis as client:
-            res_str = await client.get(f'{self._key_queries}:{self._hashkey}')
-        if res_str:
-            self._res = json.loads(res_str)
-        else:
-            await self._delete_hashkey_in_tables(self._hashkey)
+    async def _get_hashkey(self, query: str) -> str:
+        """Получение ключа запроса. Если запрос передан с таблицами,
+            в ключ добавляются поколения таблиц.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+
+        Returns:
+            str: Ключ запроса.
+        """
+        if not self._is_versioned(query):
+            return self._get_hashkey_query(query)
+        values = await self._redis.mget([
+            f'{self._key_generations}:{table}' for table in query.tables
+        ])
+        generations = ','.join(
+            f'{table}:{int(value or 0)}' for table, value in zip(query.tables, values)
+        )
+        return hash_key(f'{query_hashkey(query)}|{generations}')
+
+    def _is_cached(self, query: str) -> bool:
+        """Кешируется ли запрос. Как и в CacheQuery, при времени кеша по таблицам
+            запросы таблиц, которых нет в словаре, не кешируются.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+
+        Returns:
+            bool: Флаг.
+        """
+        return not isinstance(self._ttl, dict) or query_ttl(self._ttl, query) > 0
+
+    def _get_expire(
+        self, query: str, empty: bool = False
+    ) -> Tuple[Optional[int], Optional[int]]:
+        """Время жизни ключей запроса в redis.
+            Ключ запроса живет ttl + stale_ttl, а отметка свежести - только ttl.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+            empty (bool, optional): Пустой результат запроса. Живет не больше negative_ttl.
+
+        Returns:
+            Tuple[Optional[int], Optional[int]]: Время жизни ключа запроса 
+                и отметки свежести. Ничего, если ключ не истекает.
+        """
+        ttl = query_ttl(self._ttl, query)
+        if empty:
+            ttl = min(ttl, self._negative_ttl) if ttl > 0 else self._negative_ttl
+        if ttl <= 0:
+            return None, None
+        return ttl + self._stale_ttl, ttl
+
+    def _is_versioned(self, query: str) -> bool:
+        """Ключ запроса включает поколения таблиц.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """        
+        return self._versioned_keys and bool(getattr(query, 'tables', None))
+    
+    def _get_struct_key(self, version: str = '') -> str:
+        """Ключ структуры таблиц с учетом версии схемы БД.
+
+        Args:
+            version (str, optional): Версия схемы БД.
+
+        Returns:
+            str: Ключ.
+        """        
+        if not version:
+            return self._key_struct
+        return f'{self._key_struct}:{version}'
     
     def _encode_data(self, data: List[Dict]) -> str:
         """Кодирование данных для redis.
@@ -345,53 +559,49 @@ class AsyncRedisCache(AsyncBaseCache):
                 return super().default(o)
         return json.dumps(data, cls=Encoder)
     
-    def _get_index_records(self, params: Dict) -> Iterator[int]:
+    def _get_index_records(self, records: List[Dict], params: Dict) -> Iterator[int]:
         """Получение индексов записей в кеше.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             params (Dict): Параметры выборки.
 
         Yields:
             Iterator: Индекс.
         """
-        for i, record in enumerate(self._res):
-            common_values = record.items() & params.items()
-            if len(params.keys()) == len(common_values):
-                yield i
+        yield from scan(records, params)
     
-    def _check_fields_identity(self, keys: List) -> bool:
+    def _check_fields_identity(self, records: List[Dict], keys: List) -> bool:
         """Проверить чтобы список полей был идентичен.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             keys (List): Список полей.
 
         Returns:
             bool: Флаг.
         """        
-        for record in self._res:
+        for record in records:
             common_values = set(record.keys()) & set(keys)
             if len(common_values) == len(record.keys()):
                 return True
             break
         return False
     
-    def _check_fields_in_cache(self, keys: List) -> bool:
+    def _check_fields_in_cache(self, records: List[Dict], keys: List) -> bool:
         """Проверить поля на существование в записи кеша.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             keys (List): Список полей.
 
         Returns:
             bool: Флаг.
         """        
-        for record in self._res:
-            common_values = set(record.keys()) & set(keys)
-            if len(common_values) == len(keys):
-                return True
-            break
+        # у поля может быть оператор фильтрации
+        fields = {split_operator(key)[0] for key in keys}
+        for record in records:
+            return fields <= record.keys()
         return False
     
     async def _save_hashkey_in_tables(
@@ -403,9 +613,8 @@ class AsyncRedisCache(AsyncBaseCache):
             hashkey (str): Хеш от запроса.
             tables (List[str]): Список названий таблиц.
         """
-        async with self._redis as client:
-            for table in tables:
-                await client.lpush(f'{self._key_tables}:{table}', hashkey)
+        for table in tables:
+            await self._redis.lpush(f'{self._key_tables}:{table}', hashkey)
         
     def _get_tables_from_fields(self, data: List[Dict]) -> List:
         """Список таблиц которые участвуют в запросе.
@@ -424,27 +633,25 @@ class AsyncRedisCache(AsyncBaseCache):
                 tables.add(table_field[0])
         return list(tables)
     
-    def _filtered_data(self, params: Dict) -> Iterator[Dict]:
+    def _filtered_data(self, records: List[Dict], params: Dict) -> Iterator[Dict]:
         """Фильтрация данных.
 
         Args:
+            records (List[Dict]): Записи запроса.
             params (Dict): Параметры фильтрации.
 
         Yields:
             Iterator: Отфильтрованный элемент из кеша.
         """        
-        for record in self._res:
-            common_values = record.items() & params.items()
-            if len(params.keys()) == len(common_values):
-                yield record
+        for i in scan(records, params):
+            yield records[i]
     
     async def _delete_hashkey_in_tables(self, hashkey: str):
         """ Удаление hashkey из таблиц. """
-        async with self._redis as client:
-            tables_name = await client.keys(f'{self._key_tables}:*')
-            for table in tables_name:
-                _, _table = table.split(':')
-                await client.lrem(f'{self._key_tables}:{_table}', 0, hashkey)
+        tables_name = await self._redis.keys(f'{self._key_tables}:*')
+        for table in tables_name:
+            _, _table = table.split(':')
+            await self._redis.lrem(f'{self._key_tables}:{_table}', 0, hashkey)
     
     def _get_hashkey_query(self, query: str) -> str:
         """Получение кеша от запроса.
@@ -455,6 +662,4 @@ class AsyncRedisCache(AsyncBaseCache):
         Returns:
             str: Хеш от запроса.
         """        
-        query = query.strip().lower().replace(" ", "")
-        hash_object = hashlib.sha256(query.encode('utf-8'))
-        return hash_object.hexdigest()
\ No newline at end of file
+        return query_hashkey(query)
\ No newline at end of file
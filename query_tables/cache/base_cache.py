@@ -1,7 +1,9 @@
 from abc import ABC
-from typing import Union, List, Dict, Optional, Tuple
+from typing import Any, Union, List, Dict, Optional, Tuple, Iterable
 from dataclasses import dataclass
 from query_tables.exceptions import ErrorGetOrSaveStructTable
+from query_tables.cache.write_through import TableWrite
+from query_tables.cache.keys import hash_key
 
 
 @dataclass
@@ -10,6 +12,55 @@ class TypeCache:
     remote = 'remote'
 
 
+class QueryKey(str):
+    """
+        SQL запрос вместе с таблицами, из которых он читает, 
+        и условиями выборки по ним. Передается в кеш вместо строки запроса. 
+        Кеш, которому они не нужны, работает с ним как с обычной строкой.
+    """
+    
+    def __new__(
+        cls, query: str, tables: Iterable[str] = (), 
+        predicates: Optional[Dict[str, Dict[str, Any]]] = None,
+        simple: bool = False,
+        ttl: Optional[int] = None,
+        key: Optional[str] = None
+    ):
+        """
+        Args:
+            query (str): SQL запрос.
+            tables (Iterable[str], optional): Таблицы запроса.
+            predicates (Optional[Dict[str, Dict[str, Any]]], optional): Условия выборки 
+                по каждой таблице. Таблица без условий читается целиком.
+            simple (bool, optional): Запрос к одной таблице без сортировки и лимита.
+                Изменения таблицы можно применить к его записям в кеше.
+            ttl (Optional[int], optional): Время жизни запроса в кеше. 
+                По умолчанию - время кеша по таблицам запроса.
+            key (Optional[str], optional): Ключ запроса для кеша, у одинаковых 
+                по смыслу запросов он совпадает. По умолчанию - сам запрос.
+        """
+        obj = super().__new__(cls, query)
+        obj.tables = tuple(sorted(set(tables)))
+        obj.predicates = predicates
+        obj.simple = simple
+        obj.ttl = ttl
+        obj.key = key
+        obj.cost = None # время последнего выполнения запроса в БД
+        obj._hashkey = None
+        return obj
+
+    @property
+    def hashkey(self) -> str:
+        """Хеш запроса для ключа кеша. Считается при первом обращение.
+
+        Returns:
+            str: Хеш запроса.
+        """
+        if self._hashkey is None:
+            self._hashkey = hash_key((self.key or self).strip())
+        return self._hashkey
+
+
 class BaseCache(ABC):
     
     type_cache = TypeCache.local
@@ -26,26 +77,78 @@ class BaseCache(ABC):
         """ 
         ...
         
-    def delete_cache_table(self, table: str) -> bool:
+    def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
         """Удаление кеша по таблице. Вседу, где использовалась таблица.
             Не связан с конкретным запросом.
 
         Args:
             table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
         
         Returns:
             bool: Флаг успешности.
         """
         ...
         
+    def write_through(self, write: TableWrite) -> bool:
+        """Применяет изменение таблицы к записям запросов в кеше.
+            Запросы, к которым изменение применить нельзя, удаляются.
+            По умолчанию удаляются все запросы, которые могли затронуть измененные записи.
+
+        Args:
+            write (TableWrite): Изменение таблицы.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        return self.delete_cache_table(write.table, write.predicates())
+
+    def is_stale(self, query: str) -> bool:
+        """Запись запроса устарела, но еще отдается из кеша до фонового обновления.
+            По умолчанию записи не устаревают.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """
+        return False
+
+    def is_enabled_negative_cache(self) -> bool:
+        """Сохраняются ли в кеш пустые результаты запросов.
+            По умолчанию - нет.
+
+        Returns:
+            bool: Флаг.
+        """
+        return False
+
+    def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. В отличие от `get` отличает 
+            сохраненный пустой результат от отсутствия запроса в кеше.
+            По умолчанию пустой результат считается отсутствием запроса.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата 
+                или ничего, если запроса нет в кеше.
+        """
+        return self[query].get() or None
+        
     def __getitem__(self, query: str) -> 'BaseCache':
-        """Устанавливает контекст SQL запроса.
+        """Данные SQL запроса. Встроенные кеши возвращают отдельный объект 
+            со своим ключом и условием выборки, поэтому не хранят состояние между вызовами.
 
         Args:
             query (str): SQL Запрос.
 
         Returns:
-            BaseCache: Кеш.
+            BaseCache: Кеш или данные запроса с теми же методами выборки.
         """
         ...
         
@@ -76,7 +179,8 @@ class BaseCache(ABC):
 
     def filter(self, params: Dict) -> 'BaseCache':
         """Условие для выборки записей в кеше.
-        Выборка учитывает точное совпадение значений.
+        Выборка учитывает точное совпадение значений, либо оператор в конце поля:
+        `in`, `gt`, `gte`, `lt`, `lte`, `between`, `like`, `ilike`, `isnull`, `isnotnull`, `notequ`.
         
         Args:
             Название полей для выборки. К примеру: `.filter({'person.id': 1, 'person.name': 'Anton'})`
@@ -150,8 +254,11 @@ class BaseCache(ABC):
         """        
         ...
         
-    def _get_struct_tables(self) -> Optional[Dict[str, List[str]]]:
+    def _get_struct_tables(self, version: str = '') -> Optional[Dict[str, List[str]]]:
         """Получение из кеша структуры таблиц.
+        
+        Args:
+            version (str, optional): Версия схемы БД. Структура другой версии считается устаревшей.
 
         Returns:
             Optional[Dict[str, List[str]]]: Структура таблиц.
@@ -159,11 +266,12 @@ class BaseCache(ABC):
         if self.type_cache == TypeCache.local:
             raise ErrorGetOrSaveStructTable(self.type_cache)
         
-    def _save_struct_tables(self, struct: Dict[str, List[str]]):
+    def _save_struct_tables(self, struct: Dict[str, List[str]], version: str = ''):
         """Сохранение в кеше структуры таблиц.
 
         Args:
             struct (Dict[str, List[str]]): Структура таблиц.
+            version (str, optional): Версия схемы БД.
         """        
         if self.type_cache == TypeCache.local:
             raise ErrorGetOrSaveStructTable(self.type_cache)
@@ -174,19 +282,21 @@ class AsyncBaseCache(ABC):
     type_cache = TypeCache.remote
     
     def __getitem__(self, query: str) -> 'AsyncBaseCache':
-        """Устанавливает контекст SQL запроса.
+        """Данные SQL запроса. Встроенные кеши возвращают отдельный объект 
+            со своим ключом и условием выборки, поэтому не хранят состояние между вызовами.
 
         Args:
             query (str): SQL Запрос.
 
         Returns:
-            AsyncBaseCache: Кеш.
+            AsyncBaseCache: Кеш или данные запроса с теми же методами выборки.
         """
         ...
         
     def filter(self, params: Dict) -> 'AsyncBaseCache':
         """Условие для выборки записей в кеше.
-        Выборка учитывает точное совпадение значений.
+        Выборка учитывает точное совпадение значений, либо оператор в конце поля:
+        `in`, `gt`, `gte`, `lt`, `lte`, `between`, `like`, `ilike`, `isnull`, `isnotnull`, `notequ`.
         
         Args:
             params (Dict): Название полей для выборки. К примеру: `.filter({'person.id': 1, 'person.name': 'Anton'})`
@@ -210,18 +320,69 @@ class AsyncBaseCache(ABC):
         """ 
         ...
         
-    async def delete_cache_table(self, table: str) -> bool:
+    async def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
         """Удаление кеша по таблице. Вседу, где использовалась таблица.
             Не связан с конкретным запросом.
 
         Args:
             table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
         
         Returns:
             bool: Флаг успешности.
         """
         ...
         
+    async def write_through(self, write: TableWrite) -> bool:
+        """Применяет изменение таблицы к записям запросов в кеше.
+            Запросы, к которым изменение применить нельзя, удаляются.
+            По умолчанию удаляются все запросы, которые могли затронуть измененные записи.
+
+        Args:
+            write (TableWrite): Изменение таблицы.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        return await self.delete_cache_table(write.table, write.predicates())
+
+    async def is_stale(self, query: str) -> bool:
+        """Запись запроса устарела, но еще отдается из кеша до фонового обновления.
+            По умолчанию записи не устаревают.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """
+        return False
+
+    def is_enabled_negative_cache(self) -> bool:
+        """Сохраняются ли в кеш пустые результаты запросов.
+            По умолчанию - нет.
+
+        Returns:
+            bool: Флаг.
+        """
+        return False
+
+    async def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. В отличие от `get` отличает 
+            сохраненный пустой результат от отсутствия запроса в кеше.
+            По умолчанию пустой результат считается отсутствием запроса.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата 
+                или ничего, если запроса нет в кеше.
+        """
+        return await self[query].get() or None
+        
     async def get(self) -> Union[List[Dict], List]:
         """Получение данных из кеша по условию или без условия.
 
@@ -304,18 +465,22 @@ class AsyncBaseCache(ABC):
         """        
         ...
         
-    async def _get_struct_tables(self) -> Optional[Dict[str, List[str]]]:
+    async def _get_struct_tables(self, version: str = '') -> Optional[Dict[str, List[str]]]:
         """Получение из кеша структуры таблиц.
+        
+        Args:
+            version (str, optional): Версия схемы БД. Структура другой версии считается устаревшей.
 
         Returns:
             Optional[Dict[str, List[str]]]: Структура таблиц.
         """        
         ...
         
-    async def _save_struct_tables(self, struct: Dict[str, List[str]]):
+    async def _save_struct_tables(self, struct: Dict[str, List[str]], version: str = ''):
         """Сохранение в кеше структуры таблиц.
 
         Args:
             struct (Dict[str, List[str]]): Структура таблиц.
+            version (str, optional): Версия схемы БД.
         """        
         ...
\ No newline at end of file
@@ -1,9 +1,22 @@
-import hashlib
-from cachetools import TTLCache, LRUCache
+import time
+import logging
 from typing import Union, List, Dict, Iterator, Optional, Tuple
 from threading import RLock
 from query_tables.exceptions import NotQuery, NoMatchFieldInCache
 from query_tables.cache import BaseCache, TypeCache
+from query_tables.cache.index import IndexedRecords, split_operator
+from query_tables.cache.dependencies import TableDependencies, LRUCache, TLRUCache
+from query_tables.cache.predicates import any_overlap
+from query_tables.cache.write_through import TableWrite, apply_write
+from query_tables.cache.size import estimate_size
+from query_tables.cache.ttl import query_ttl, is_ttl_enabled
+from query_tables.cache.keys import hash_key, query_hashkey
+from query_tables.cache.handle import CacheHandle
+from query_tables.cache.policy import CachePolicy, make_policy
+from query_tables.cache.snapshot import save_snapshot, read_snapshot
+from query_tables.fork import register_after_fork
+
+logger = logging.getLogger(__name__)
 
 
 class SyncLockDecorator:
@@ -27,57 +40,165 @@ class CacheQuery(BaseCache):
     type_cache = TypeCache.local
     
     def __init__(
-        self, ttl: int = 0, 
+        self, ttl: Union[int, Dict[str, int]] = 0, 
         maxsize: int = 1024,
         use_async: bool = False,
-        non_expired: bool = False
+        non_expired: bool = False,
+        versioned_keys: bool = False,
+        max_bytes: int = 0,
+        max_entry_bytes: int = 0,
+        stale_ttl: int = 0,
+        segments: int = 16,
+        negative_ttl: int = 0,
+        policy: Union[str, CachePolicy] = 'lru'
     ):
         """
         
         Args:
-            ttl (int, optional): Время кеша запроса. По умолчанию 0 секунд - кеширование отключено.
-            maxsize (int, optional): Размер кеша.
+            ttl (Union[int, Dict[str, int]], optional): Время кеша запроса. По умолчанию 0 секунд - кеширование отключено.
+                Можно задать время по таблицам: `{'country': 86400, 'orders': 5}`. Запрос с несколькими 
+                таблицами живет наименьшее из их времен, таблицы не из словаря не кешируются.
+            maxsize (int, optional): Размер кеша. Число запросов, если не задан max_bytes.
             use_async (bool, optional): Включить если ваш код асинхронный.
             non_expired (bool, optional): Если нужен кеш без истечения времени.
+            versioned_keys (bool, optional): Ключи запросов включают поколения таблиц.
+                Изменение таблицы только увеличивает ее поколение, а старые записи 
+                вытесняются по времени жизни или размеру кеша.
+            max_bytes (int, optional): Размер кеша в байтах. Если задан, вместо maxsize 
+                учитывается примерный размер записей каждого запроса. По умолчанию 0 - не задан.
+            max_entry_bytes (int, optional): Максимальный размер записей одного запроса в байтах.
+                Большие результаты не кешируются. По умолчанию 0 - без ограничения.
+            stale_ttl (int, optional): Сколько секунд после ttl запись еще отдается из кеша,
+                пока ее обновляет фоновый запрос к БД. По умолчанию 0 - записи не отдаются после ttl.
+            segments (int, optional): Число блокировок, между которыми распределяются запросы по хешу.
+                Выборка и изменение записей разных запросов выполняются параллельно.
+            negative_ttl (int, optional): Время кеша пустых результатов запросов с таблицами.
+                Не больше времени кеша запроса. По умолчанию 0 - пустые результаты не кешируются.
+                В кеше без истечения времени пустые результаты не кешируются.
+            policy (Union[str, CachePolicy], optional): Политика вытеснения запросов при переполнение кеша:
+                `lru` - давно не используемые, `lfu` - редко используемые, `tinylfu` - новые запросы 
+                вытесняют старые, только если к ним обращаются чаще, `cost` - запросы с наименьшим 
+                временем выполнения в БД на байт записей. Можно передать свою политику. По умолчанию - `lru`.
+
+        Raises:
+            UnknownCachePolicy: Нет такой политики вытеснения.
         """
         self._ttl = ttl
         self._maxsize = maxsize
         self._use_async = use_async
         self._non_expired = non_expired
-        self._hashkey = '' # хэш от SQL запроса
-        self._filter_params = {}
-        self._tables = LRUCache(maxsize=maxsize) # в каких запросах участвует таблица
+        self._versioned_keys = versioned_keys
+        self._max_bytes = max_bytes
+        self._max_entry_bytes = max_entry_bytes
+        self._stale_ttl = 0 if non_expired else stale_ttl
+        # у записей кеша без истечения времени нет своего времени жизни
+        self._negative_ttl = 0 if non_expired else negative_ttl
+        self._policy = make_policy(policy)
+        self._fresh_until: Dict[str, float] = {} # до какого времени запись запроса свежая
+        self._entry_ttl: Dict[str, int] = {} # время жизни сохраняемых записей
+        self._expires: Dict[str, float] = {} # до какого времени запись запроса хранится в кеше
+        self._generations: Dict[str, int] = {} # поколение данных у каждой таблицы
+        self._sized: Optional[Tuple[List, int]] = None # записи и их уже посчитанный размер
+        # в каких запросах участвует таблица и какие таблицы в запросе
+        self._tables = TableDependencies()
+        # при вытеснение или истечение запроса его зависимости тоже удаляются
+        cache_params = dict(
+            maxsize=max_bytes or maxsize, on_evict=self._delete_hashkey_in_tables,
+            policy=self._policy
+        )
+        if max_bytes:
+            cache_params['getsizeof'] = self._getsizeof
         self._cache = (
-            LRUCache(maxsize=maxsize)
+            LRUCache(**cache_params)
             if non_expired 
-            else TTLCache(ttl=ttl, maxsize=maxsize) 
+            else TLRUCache(ttu=self._ttu, **cache_params) 
         )
+        # блокировка словарей кеша держится только на время их изменения,
+        # записи запросов изменяются под блокировкой своего сегмента, 
+        # а выбираются без нее
+        self._rlock = RLock()
+        self._segments = [RLock() for _ in range(max(segments, 1))]
+        register_after_fork(self._after_fork)
         if use_async:
             return None
-        self._rlock = RLock()
         lock_methods = [
             self.clear,
             self.delete_cache_table,
-            self._getitem_,
+            self.is_stale,
             self._setitem_,
             self._delitem_,
-            self.filter,
-            self.get,
-            self.insert,
-            self.update,
-            self.delete
+            self._get_data_query,
+            self._save_data_query,
+            self._delete_data_query
         ]
         for method in lock_methods:
             setattr(
                 self, method.__name__, 
                 SyncLockDecorator(method, self._rlock)
             )
+
+    def _after_fork(self):
+        """
+            В дочернем процессе создаются свои блокировки.
+            Данные кеша остаются общими с родителем до первого изменения.
+        """
+        self._rlock = RLock()
+        self._segments = [RLock() for _ in self._segments]
+        for value in vars(self).values():
+            if isinstance(value, SyncLockDecorator):
+                value.rlock = self._rlock
+
+    def _segment(self, hashkey: str) -> RLock:
+        """Блокировка сегмента, к которому относится запрос.
+
+        Args:
+            hashkey (str): Ключ запроса.
+
+        Returns:
+            RLock: Блокировка.
+        """
+        return self._segments[hash(hashkey) % len(self._segments)]
+
+    def _lookup(self, hashkey: str) -> Optional[List]:
+        """Записи запроса из кеша.
+
+        Args:
+            hashkey (str): Ключ запроса.
+
+        Returns:
+            Optional[List]: Записи или ничего, если запроса нет в кеше.
+        """
+        with self._rlock:
+            return self._cache.get(hashkey)
             
     def is_enabled_cache(self) -> bool:
         """
             Включен ли кеш.
         """        
-        return self._non_expired or bool(self._ttl)
+        return self._non_expired or is_ttl_enabled(self._ttl)
+
+    def is_enabled_negative_cache(self) -> bool:
+        """
+            Сохраняются ли в кеш пустые результаты запросов.
+        """
+        return self._negative_ttl > 0 and self.is_enabled_cache()
+
+    def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. Отличает сохраненный пустой результат 
+            от отсутствия запроса в кеше.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата 
+                или ничего, если запроса нет в кеше.
+        """
+        if not query:
+            raise NotQuery()
+        if not self.is_enabled_cache():
+            return None
+        return self._lookup(self._get_hashkey(query))
 
     def clear(self):
         """
@@ -86,61 +207,237 @@ class CacheQuery(BaseCache):
         if self.is_enabled_cache():
             self._cache.clear()
             self._tables.clear()
+            self._fresh_until.clear()
+            self._expires.clear()
+            if self._policy is not None:
+                self._policy.clear()
 
-    def delete_cache_table(self, table: str) -> bool:
+    def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
         """Удаление кеша по таблице. Вседу, где использовалась таблица.
 
         Args:
             table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
         
         Returns:
             bool: Флаг успешности.
         """
+        # поколение входит в ключи запросов с versioned_keys
+        # и отмечает изменение таблицы для загрузки снимка
+        self._generations[table] = self._generations.get(table, 0) + 1
         if not self._tables.get(table):
-            return False
-        # копируем список
-        hashkeys = [*self._tables[table]]
+            return self._versioned_keys
+        # копируем множество
+        hashkeys = [*self._tables.get(table)]
         for hashkey in hashkeys:
+            if predicates is not None and not any_overlap(
+                self._tables.predicate(hashkey, table), predicates
+            ):
+                continue
             self._cache.pop(hashkey, None)
             self._delete_hashkey_in_tables(hashkey)
         return True
+
+    def _ttu(self, hashkey: str, value: List, now: float) -> float:
+        """Время истечения сохраняемой записи для TLRUCache.
+
+        Args:
+            hashkey (str): Хеш запроса.
+            value (List): Записи.
+            now (float): Текущее время кеша.
+
+        Returns:
+            float: Время истечения.
+        """
+        return now + self._entry_ttl.pop(hashkey, 0) + self._stale_ttl
+        
+    def write_through(self, write: TableWrite) -> bool:
+        """Применяет изменение таблицы к записям запросов в кеше.
+            Запросы, к которым изменение применить нельзя, удаляются.
+
+        Args:
+            write (TableWrite): Изменение таблицы.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        if self._versioned_keys:
+            return self.delete_cache_table(write.table)
+        with self._rlock:
+            hashkeys = [*(self._tables.get(write.table) or ())]
+        if not hashkeys:
+            return False
+        predicates = write.predicates()
+        for hashkey in hashkeys:
+            with self._segment(hashkey):
+                with self._rlock:
+                    predicate = self._tables.predicate(hashkey, write.table)
+                    simple = self._tables.is_simple(hashkey)
+                    records = self._cache.get(hashkey)
+                if predicates is not None and not any_overlap(predicate, predicates):
+                    continue
+                if records is not None and predicate is not None and simple:
+                    changed = records.copy()
+                    if apply_write(changed, predicate, write):
+                        self._replace(hashkey, records, changed)
+                        continue
+                with self._rlock:
+                    self._cache.pop(hashkey, None)
+                    self._delete_hashkey_in_tables(hashkey)
+        return True
+
+    def snapshot(self, path: str, version: str = '') -> int:
+        """Сохраняет записи кеша в файл вместе с оставшимся временем жизни,
+            таблицами и условиями выборки запросов. Вечный кеш не сохраняется.
+
+        Args:
+            path (str): Путь к файлу снимка.
+            version (str, optional): Версия данных, например версия схемы БД.
+                Снимок загружается только с той же версией.
+
+        Returns:
+            int: Сколько запросов сохранено.
+        """
+        if not self.is_enabled_cache() or self._non_expired:
+            return 0
+        entries = []
+        with self._rlock:
+            now = self._cache.timer()
+            for hashkey in list(self._cache.keys()):
+                # сохранение снимка - не обращение к записям
+                records = self._cache.peek(hashkey)
+                remaining = self._expires.get(hashkey, now) - now
+                if remaining <= 0:
+                    continue
+                entries.append((
+                    hashkey, list(records), isinstance(records, IndexedRecords), remaining,
+                    sorted(self._tables.tables(hashkey)), self._tables.predicates(hashkey),
+                    self._tables.is_simple(hashkey)
+                ))
+            snapshot = {
+                'version': version,
+                'created': time.time(),
+                'generations': dict(self._generations),
+                'entries': entries,
+            }
+        if not save_snapshot(path, snapshot):
+            return 0
+        return len(entries)
+
+    def load(self, path: str, version: str = '') -> int:
+        """Загружает записи кеша из снимка. Время, пока процесс не работал, 
+            вычитается из времени жизни записей. Снимок другой версии не загружается,
+            как и записи таблиц, которые изменились в этом процессе до загрузки.
+            Изменения в БД, пока процесс не работал, не отслеживаются: загруженные 
+            записи могут быть устаревшими до конца своего времени жизни.
+            В вечный кеш снимок не загружается: данные в БД могли измениться,
+            пока процесс не работал, а записи без времени жизни отдавались бы вечно.
+
+        Args:
+            path (str): Путь к файлу снимка.
+            version (str, optional): Текущая версия данных, например версия схемы БД.
+
+        Returns:
+            int: Сколько запросов загружено.
+        """
+        if not self.is_enabled_cache():
+            return 0
+        if self._non_expired:
+            logger.warning(f"Снимок кеша '{path}' не загружается в кеш без времени жизни.")
+            return 0
+        snapshot = read_snapshot(path)
+        if not snapshot:
+            return 0
+        if snapshot.get('version') != version:
+            logger.info(f"Снимок кеша '{path}' другой версии и не загружается.")
+            return 0
+        elapsed = max(time.time() - snapshot.get('created', 0), 0)
+        count = 0
+        with self._rlock:
+            changed = set(self._generations)
+            # поколения таблиц входят в ключи запросов, поэтому восстанавливаются,
+            # а у изменившихся таблиц поколение становится новым
+            for table, generation in snapshot.get('generations', {}).items():
+                if table in changed:
+                    self._generations[table] = max(self._generations[table], generation) + 1
+                else:
+                    self._generations[table] = generation
+            for (
+                hashkey, records, indexed, remaining, tables, predicates, simple
+            ) in snapshot.get('entries', ()):
+                if changed.intersection(tables):
+                    continue
+                ttl = remaining - elapsed - self._stale_ttl
+                if ttl <= 0:
+                    continue
+                value = IndexedRecords(records) if indexed else records
+                size = self._measure(value)
+                if not self._is_fit_size(size) or not self._store(hashkey, value, ttl, size=size):
+                    continue
+                if tables:
+                    self._save_hashkey_in_tables(tables, hashkey, predicates, simple)
+                count += 1
+        return count
+
+    def is_stale(self, query: str) -> bool:
+        """Запись запроса устарела, но еще отдается из кеша до фонового обновления.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """
+        if not self._stale_ttl:
+            return False
+        fresh_until = self._fresh_until.get(self._get_hashkey(query))
+        return fresh_until is not None and fresh_until <= self._cache.timer()
         
-    def __getitem__(self, query: str) -> 'BaseCache':
-        """Устанавливает контекст SQL запроса.
+    def __getitem__(self, query: str) -> CacheHandle:
+        """Данные SQL запроса в кеше.
 
         Args:
             query (str): SQL Запрос.
 
         Returns:
-            BaseCache: Кеш.
+            CacheHandle: Данные запроса со своим ключом и условием выборки.
         """
         if not query:
             raise NotQuery()
         return self._getitem_(query)
     
-    def _getitem_(self, query: str) -> 'BaseCache':
-        self._hashkey = self._get_hashkey_query(query)
-        return self
+    def _getitem_(self, query: str) -> CacheHandle:
+        return CacheHandle(self, query, self._get_hashkey(query))
         
-    def get(self) -> Union[List[Dict], List]:
+    def _get_records(self, hashkey: str, params: Dict) -> Union[List[Dict], List]:
         """Получение данных из кеша по условию или без условия.
 
+        Args:
+            hashkey (str): Ключ запроса.
+            params (Dict): Условие выборки.
+
         Returns:
             Union[List[Dict], List]: Записи или пустой список.
         """
-        if not self._hashkey:
-            raise NotQuery()
-        if not any([bool(self._ttl), self._non_expired]):
+        if not self.is_enabled_cache():
             return []
-        if self._hashkey in self._cache:
-            if not self._filter_params:
-                return self._cache[self._hashkey]
-            else:
-                data = list(self._filtered_data(self._hashkey, self._filter_params))
-                self._filter_params.clear()
-                return data
-        self._delete_hashkey_in_tables(self._hashkey)
-        return []
+        with self._rlock:
+            records = self._cache.get(hashkey)
+            if records is None:
+                self._delete_hashkey_in_tables(hashkey)
+                return []
+        # записи в кеше не изменяются, а заменяются измененной копией,
+        # поэтому читаются без блокировки сегмента
+        if not params:
+            return list(records)
+        index_size = records.index_size()
+        found = list(self._filtered_data(records, params))
+        # построенный для выборки индекс тоже занимает место в кеше
+        if records.index_size() != index_size:
+            self._replace(hashkey, records, records)
+        return found
 
     def __setitem__(self, query: str, data: List[Dict]):
         """Сохранить в кеш данные.
@@ -152,12 +449,146 @@ class CacheQuery(BaseCache):
         return self._setitem_(query, data)
 
     def _setitem_(self, query: str, data: List[Dict]):
-        if not any([bool(self._ttl), self._non_expired]):
+        if not self.is_enabled_cache():
             return None
-        hashkey = self._get_hashkey_query(query)
-        tables = self._get_tables_from_fields(data)
-        self._save_hashkey_in_tables(tables, hashkey)
-        self._cache[hashkey] = data
+        # пустой результат без таблиц нельзя удалить при их изменение
+        if not data and not (self._negative_ttl and getattr(query, 'tables', None)):
+            return None
+        hashkey = self._get_hashkey(query)
+        records = IndexedRecords(data)
+        size = self._measure(records)
+        if not self._is_fit_size(size):
+            logger.debug(f"Результат запроса больше допустимого размера и не кешируется: {hashkey}")
+            self._cache.pop(hashkey, None)
+            self._delete_hashkey_in_tables(hashkey)
+            return None
+        ttl = query_ttl(self._ttl, query)
+        if not data:
+            ttl = min(ttl, self._negative_ttl)
+        if not self._store(hashkey, records, ttl, getattr(query, 'cost', None), size):
+            return None
+        if self._is_versioned(query):
+            return None
+        tables = self._get_tables_from_fields(data) if data else list(query.tables)
+        self._save_hashkey_in_tables(
+            tables, hashkey, 
+            getattr(query, 'predicates', None), getattr(query, 'simple', False)
+        )
+
+    def _store(
+        self, hashkey: str, value: List, ttl: int, 
+        cost: Optional[float] = None, size: Optional[int] = None
+    ) -> bool:
+        """Сохраняет записи в кеш со своим временем жизни.
+
+        Args:
+            hashkey (str): Хеш запроса.
+            value (List): Записи.
+            ttl (int): Время жизни в секундах. Если 0, записи не кешируются.
+            cost (Optional[float], optional): Время запроса к БД в секундах для политики вытеснения.
+            size (Optional[int], optional): Размер записей из `_measure`.
+
+        Returns:
+            bool: Сохранены ли записи.
+        """
+        with self._rlock:
+            if not self._non_expired:
+                if ttl <= 0:
+                    self._cache.pop(hashkey, None)
+                    self._delete_hashkey_in_tables(hashkey)
+                    return False
+                self._entry_ttl[hashkey] = ttl
+            self._sized = (value, size)
+            try:
+                self._cache[hashkey] = value
+            finally:
+                self._sized = None
+            if self._policy is not None and hashkey in self._cache:
+                self._policy.add(hashkey, value, cost, size)
+            if not self._non_expired:
+                self._expires[hashkey] = self._cache.timer() + ttl + self._stale_ttl
+            if self._stale_ttl:
+                self._fresh_until[hashkey] = self._cache.timer() + ttl
+            return True
+
+    def _replace(self, hashkey: str, old: List, new: List):
+        """Заменяет записи запроса в кеше их измененной копией 
+            или пересчитывает размер записей, если у них построился индекс.
+            Записи сохраняются заново с оставшимся временем жизни,
+            а если больше не помещаются по размеру - удаляются.
+            Если записи в кеше уже заменили, копия не сохраняется.
+
+        Args:
+            hashkey (str): Хеш запроса.
+            old (List): Записи, которые лежат в кеше.
+            new (List): Новые записи.
+        """
+        if old is new and not self._max_bytes:
+            return None
+        size = estimate_size(new) if self._max_bytes or self._max_entry_bytes else None
+        with self._rlock:
+            if hashkey not in self._cache:
+                return None
+            if not self._is_fit_size(size):
+                self._cache.pop(hashkey, None)
+                self._delete_hashkey_in_tables(hashkey)
+                return None
+            if not self._non_expired:
+                remaining = self._expires.get(hashkey, 0) - self._cache.timer()
+                if remaining <= 0:
+                    return None
+                self._entry_ttl[hashkey] = remaining - self._stale_ttl
+            self._sized = (new, size)
+            try:
+                self._cache.replace(hashkey, old, new)
+            finally:
+                self._sized = None
+                self._entry_ttl.pop(hashkey, None)
+            if hashkey not in self._cache:
+                self._delete_hashkey_in_tables(hashkey)
+
+    def _measure(self, records: List) -> Optional[int]:
+        """Размер записей, если он нужен для лимитов или политики вытеснения.
+            Считается один раз и передается в кеш и политику.
+
+        Args:
+            records (List): Записи.
+
+        Returns:
+            Optional[int]: Размер в байтах или ничего, если он не нужен.
+        """
+        if self._max_bytes or self._max_entry_bytes or self._policy is not None:
+            return estimate_size(records)
+        return None
+
+    def _getsizeof(self, records: List) -> int:
+        """Размер записей для кеша с лимитом в байтах.
+            Уже посчитанный при сохранение размер не считается заново.
+
+        Args:
+            records (List): Записи.
+
+        Returns:
+            int: Размер в байтах.
+        """
+        sized = self._sized
+        if sized is not None and sized[0] is records and sized[1] is not None:
+            return sized[1]
+        return estimate_size(records)
+
+    def _is_fit_size(self, size: Optional[int]) -> bool:
+        """Помещаются ли записи запроса в кеш по размеру.
+
+        Args:
+            size (Optional[int]): Размер записей из `_measure`.
+
+        Returns:
+            bool: Флаг.
+        """
+        limits = [limit for limit in (self._max_entry_bytes, self._max_bytes) if limit]
+        if not limits:
+            return True
+        return size <= min(limits)
 
     def __delitem__(self, query: str):
         """Удаление из кеша данных.
@@ -168,100 +599,88 @@ class CacheQuery(BaseCache):
         return self._delitem_(query)
 
     def _delitem_(self, query: str):
-        hashkey = self._get_hashkey_query(query)
+        hashkey = self._get_hashkey(query)
         self._cache.pop(hashkey, None)
         self._delete_hashkey_in_tables(hashkey)
         
-    def filter(self, params: Dict) -> 'BaseCache':
-        """Условие для выборки записей в кеше.
-        Выборка учитывает точное совпадение значений.
-        
+    def _check_filter(self, hashkey: str, params: Dict):
+        """Проверка полей условия выборки.
+
         Args:
-            Название полей для выборки. К примеру: `.filter({'person.id': 1, 'person.name': 'Anton'})`
-                Название таблицы: person
-                Название поля: id
-                
+            hashkey (str): Ключ запроса.
+            params (Dict): Условие выборки.
+
         Raises:
-            NotQuery: Запрос не установлен.
             NoMatchFieldInCache: Нет такого поля.
-
-        Returns:
-            BaseCache: Кеш.
         """ 
-        if not self._hashkey:
-            raise NotQuery()
-        if not self._check_fields_in_cache(self._hashkey, list(params.keys())):
+        if not self._check_fields_in_cache(self._lookup(hashkey) or [], list(params.keys())):
             raise NoMatchFieldInCache()
-        self._filter_params.clear()
-        self._filter_params.update(params)
-        return self
-    
-    def insert(self, record: Dict) -> Optional[Dict]:
+
+    def _insert_record(self, hashkey: str, query: str, record: Dict) -> Optional[Dict]:
         """Добавление записи к кеш.
 
         Args:
-            params (Dict): Запись.
+            hashkey (str): Ключ запроса.
+            query (str): SQL запрос.
+            record (Dict): Запись.
             
         Raises:
-            NotQuery: Запрос не установлен.
             NoMatchFieldInCache: Нет такого поля.
         """ 
-        if not self._hashkey:
-            raise NotQuery()
-        if not self._check_fields_identity(self._hashkey, list(record.keys())):
-            raise NoMatchFieldInCache()
-        if self._hashkey not in self._cache:
-            self._cache[self._hashkey] = [record]
-        else:
-            self._cache[self._hashkey].append(record)
+        with self._segment(hashkey):
+            records = self._lookup(hashkey)
+            if not self._check_fields_identity(records or [], list(record.keys())):
+                raise NoMatchFieldInCache()
+            changed = records.copy()
+            changed.append(record)
+            self._replace(hashkey, records, changed)
         return record
         
-    def update(self, params: Dict) -> Union[List[Dict], List]:
+    def _update_records(self, hashkey: str, filter_params: Dict, params: Dict) -> Union[List[Dict], List]:
         """Обновление записей в кеше по условию.
         
         Args:
-            params (Dict): Название полей для обновления. К примеру: `.filter({'person.id': 1}).update({'person.name': 'Anton'})`
-                либо `.update(**params)`
+            hashkey (str): Ключ запроса.
+            filter_params (Dict): Условие выборки.
+            params (Dict): Новые значения полей.
                 
         Raises:
-            NotQuery: Запрос не установлен.
             NoMatchFieldInCache: Нет такого поля.
 
         Returns:
             Union[List[Dict], List]: Обновленные записи или пустой список.
         """ 
-        if not self._hashkey:
-            raise NotQuery()
-        if not self._check_fields_in_cache(self._hashkey, list(params.keys())):
-            raise NoMatchFieldInCache()
-        updateted_records = []
-        if self._hashkey not in self._cache:
-            return updateted_records
-        for record in self._filtered_data(self._hashkey, self._filter_params):
-            record.update(params)
-            updateted_records.append(record)
-        self._filter_params.clear()
-        return updateted_records
+        with self._segment(hashkey):
+            records: Optional[IndexedRecords] = self._lookup(hashkey)
+            if not self._check_fields_in_cache(records or [], list(params.keys())):
+                raise NoMatchFieldInCache()
+            changed = records.copy()
+            updated = changed.update_records(
+                list(self._get_index_records(changed, filter_params)), params
+            )
+            self._replace(hashkey, records, changed)
+            return updated
         
-    def delete(self) -> Union[List[Dict], List]:
+    def _delete_records(self, hashkey: str, filter_params: Dict) -> Union[List[Dict], List]:
         """Удаление записей из кеша по условию.
         
         Args:
-            Название полей для обновления. К примеру: `.filter({'person.id': 1}).delete()`
+            hashkey (str): Ключ запроса.
+            filter_params (Dict): Условие выборки.
 
         Returns:
             Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
         """  
-        if not self._hashkey:
-            raise NotQuery()
-        deleted = []
-        if self._hashkey not in self._cache:
+        with self._segment(hashkey):
+            records: Optional[IndexedRecords] = self._lookup(hashkey)
+            if records is None:
+                return []
+            changed = records.copy()
+            deleted = changed.delete_records(
+                list(self._get_index_records(changed, filter_params))
+            )
+            self._replace(hashkey, records, changed)
             return deleted
-        for i in self._get_index_records(self._hashkey, self._filter_params):
-            deleted.append(self._cache[self._hashkey][i])
-            del self._cache[self._hashkey][i]
-        self._filter_params.clear()
-        return deleted
     
     def _get_data_query(self, query: str) -> Union[List[Tuple], List]:
         """Получает данные из произвольного запроса.
@@ -273,9 +692,10 @@ class CacheQuery(BaseCache):
             Union[List[List], List]: Данные.
         """
         hashkey = self._get_hashkey_query(query)
-        if hashkey in self._cache:
-            return self._cache[self._hashkey]
-        return []
+        data = self._cache.get(hashkey)
+        if data is None:
+            return []
+        return data
         
     def _save_data_query(self, query: str, data: List[Tuple]):
         """Сохраняет даннные произвольного запроса в кеш.
@@ -285,7 +705,11 @@ class CacheQuery(BaseCache):
             data (List[Tuple]): Данные.
         """
         hashkey = self._get_hashkey_query(query)
-        self._cache[hashkey] = data
+        size = self._measure(data)
+        if not self._is_fit_size(size):
+            self._cache.pop(hashkey, None)
+            return None
+        self._store(hashkey, data, query_ttl(self._ttl, query), size=size)
         
     def _delete_data_query(self, query: str):
         """Удаляет даннные произвольного запроса из кеша.
@@ -296,69 +720,63 @@ class CacheQuery(BaseCache):
         hashkey = self._get_hashkey_query(query)
         self._cache.pop(hashkey, None)
 
-    def _get_index_records(self, hashkey: str, params: Dict) -> Iterator[int]:
+    def _get_index_records(self, records: IndexedRecords, params: Dict) -> Iterator[int]:
         """Получение индексов записей в кеше.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (IndexedRecords): Записи запроса.
             params (Dict): Параметры выборки.
 
         Yields:
             Iterator: Индекс.
         """
-        for i, record in enumerate(self._cache[hashkey]):
-            common_values = record.items() & params.items()
-            if len(params.keys()) == len(common_values):
-                yield i
+        yield from records.find(params)
 
-    def _check_fields_identity(self, hashkey: str, keys: List) -> bool:
+    def _check_fields_identity(self, records: List[Dict], keys: List) -> bool:
         """Проверить чтобы список полей был идентичен.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             keys (List): Список полей.
 
         Returns:
             bool: Флаг.
         """        
-        for record in self._cache[hashkey]:
+        for record in records:
             common_values = set(record.keys()) & set(keys)
             if len(common_values) == len(record.keys()):
                 return True
             break
         return False
 
-    def _check_fields_in_cache(self, hashkey: str, keys: List) -> bool:
+    def _check_fields_in_cache(self, records: List[Dict], keys: List) -> bool:
         """Проверить поля на существование в записи кеша.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             keys (List): Список полей.
 
         Returns:
             bool: Флаг.
         """        
-        for record in self._cache[hashkey]:
-            common_values = set(record.keys()) & set(keys)
-            if len(common_values) == len(keys):
-                return True
-            break
+        # у поля может быть оператор фильтрации
+        fields = {split_operator(key)[0] for key in keys}
+        for record in records:
+            return fields <= record.keys()
         return False
 
-    def _filtered_data(self, hashkey: str, params: Dict) -> Iterator[Dict]:
+    def _filtered_data(self, records: IndexedRecords, params: Dict) -> Iterator[Dict]:
         """Фильтрация данных.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (IndexedRecords): Записи запроса.
             params (Dict): Параметры фильрации.
 
         Yields:
             Iterator: Отфильтрованный элемент из кеша.
         """        
-        for record in self._cache[hashkey]:
-            common_values = record.items() & params.items()
-            if len(params.keys()) == len(common_values):
-                yield record
+        for i in records.find(params):
+            yield records[i]
 
     def _get_tables_from_fields(self, data: List[Dict]) -> List:
         """Список таблиц которые участвуют в запросе.
@@ -378,30 +796,57 @@ class CacheQuery(BaseCache):
         return list(tables)
 
     def _save_hashkey_in_tables(
-        self, tables: List[str], hashkey: str
+        self, tables: List[str], hashkey: str,
+        predicates: Optional[Dict[str, Dict]] = None,
+        simple: bool = False
     ):
         """Сохраняет для каждой таблицы хеш запроса.
         (В каком запросе участвовала таблица)
         Args:
             hashkey (str): Хеш от запроса.
             tables (List[str]): Список названий таблиц.
+            predicates (Optional[Dict[str, Dict]], optional): Условия выборки по таблицам.
+            simple (bool, optional): Запрос к одной таблице без сортировки и лимита.
         """
-        for table in tables:
-            if self._tables.get(table) is None:
-                self._tables[table] = [hashkey]
-                continue
-            self._tables[table].append(hashkey)
+        self._tables.add(hashkey, tables, predicates, simple)
 
     def _delete_hashkey_in_tables(self, hashkey: str):
-        """Удаление hashkey из таблиц.
+        """Удаление hashkey из таблиц и времени свежести записи.
 
         Args:
             hashkey (str): Хеш.
         """        
-        for _, hashkeys in self._tables.items():
-            if hashkey not in hashkeys:
-                continue
-            hashkeys.remove(hashkey)
+        self._tables.discard(hashkey)
+        self._fresh_until.pop(hashkey, None)
+        self._expires.pop(hashkey, None)
+
+    def _is_versioned(self, query: str) -> bool:
+        """Ключ запроса включает поколения таблиц.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """        
+        return self._versioned_keys and bool(getattr(query, 'tables', None))
+
+    def _get_hashkey(self, query: str) -> str:
+        """Получение ключа запроса. Если запрос передан с таблицами,
+            в ключ добавляются поколения таблиц.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+
+        Returns:
+            str: Ключ запроса.
+        """        
+        if not self._is_versioned(query):
+            return self._get_hashkey_query(query)
+        generations = ','.join(
+            f'{table}:{self._generations.get(table, 0)}' for table in query.tables
+        )
+        return hash_key(f'{query_hashkey(query)}|{generations}')
 
     def _get_hashkey_query(self, query: str) -> str:
         """Получение кеша от запроса.
@@ -412,6 +857,4 @@ class CacheQuery(BaseCache):
         Returns:
             str: Хеш от запроса.
         """        
-        query = query.strip().lower().replace(" ", "")
-        hash_object = hashlib.sha256(query.encode('utf-8'))
-        return hash_object.hexdigest()
\ No newline at end of file
+        return query_hashkey(query)
\ No newline at end of file
@@ -0,0 +1,251 @@
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Optional, Set
+import cachetools
+
+if TYPE_CHECKING:
+    from query_tables.cache.policy import CachePolicy
+
+
+class TableDependencies(object):
+    """
+        Двусторонний индекс зависимостей: таблица -> ключи запросов
+        и ключ запроса -> таблицы. Удаление ключа стоит столько,
+        сколько таблиц участвует в запросе. Для запроса также 
+        хранятся условия выборки по таблицам.
+    """
+
+    def __init__(self):
+        self._table_keys: Dict[str, Set[str]] = {}
+        self._key_tables: Dict[str, Set[str]] = {}
+        self._key_predicates: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._simple_keys: Set[str] = set()
+
+    def add(
+        self, key: str, tables: Iterable[str], 
+        predicates: Optional[Dict[str, Dict[str, Any]]] = None,
+        simple: bool = False
+    ):
+        """Сохраняет таблицы, которые участвуют в запросе.
+
+        Args:
+            key (str): Ключ запроса.
+            tables (Iterable[str]): Таблицы.
+            predicates (Optional[Dict[str, Dict[str, Any]]], optional): Условия выборки по таблицам.
+            simple (bool, optional): Запрос к одной таблице без сортировки и лимита.
+        """
+        if predicates is None:
+            self._key_predicates.pop(key, None)
+        else:
+            self._key_predicates[key] = predicates
+        if simple and predicates is not None:
+            self._simple_keys.add(key)
+        else:
+            self._simple_keys.discard(key)
+        key_tables = self._key_tables.setdefault(key, set())
+        for table in tables:
+            key_tables.add(table)
+            self._table_keys.setdefault(table, set()).add(key)
+
+    def discard(self, key: str):
+        """Удаляет ключ запроса из индекса.
+
+        Args:
+            key (str): Ключ запроса.
+        """
+        self._key_predicates.pop(key, None)
+        self._simple_keys.discard(key)
+        for table in self._key_tables.pop(key, ()):
+            keys = self._table_keys.get(table)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._table_keys[table]
+
+    def get(self, table: str) -> Optional[Set[str]]:
+        """Ключи запросов, в которых участвует таблица.
+
+        Args:
+            table (str): Таблица.
+
+        Returns:
+            Optional[Set[str]]: Ключи или ничего.
+        """
+        return self._table_keys.get(table)
+
+    def tables(self, key: str) -> Set[str]:
+        """Таблицы, которые участвуют в запросе.
+
+        Args:
+            key (str): Ключ запроса.
+
+        Returns:
+            Set[str]: Таблицы.
+        """
+        return self._key_tables.get(key, set())
+
+    def predicate(self, key: str, table: str) -> Optional[Dict[str, Any]]:
+        """Условие выборки запроса по таблице.
+
+        Args:
+            key (str): Ключ запроса.
+            table (str): Таблица.
+
+        Returns:
+            Optional[Dict[str, Any]]: Условие или ничего, если оно неизвестно.
+        """
+        return self._key_predicates.get(key, {}).get(table)
+
+    def predicates(self, key: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Условия выборки запроса по всем таблицам.
+
+        Args:
+            key (str): Ключ запроса.
+
+        Returns:
+            Optional[Dict[str, Dict[str, Any]]]: Условия или ничего, если они неизвестны.
+        """
+        return self._key_predicates.get(key)
+
+    def is_simple(self, key: str) -> bool:
+        """Можно ли применить изменения таблицы к записям запроса.
+
+        Args:
+            key (str): Ключ запроса.
+
+        Returns:
+            bool: Флаг.
+        """
+        return key in self._simple_keys
+
+    def clear(self):
+        self._table_keys.clear()
+        self._key_tables.clear()
+        self._key_predicates.clear()
+        self._simple_keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._key_tables)
+
+
+class EvictCallbackMixin(object):
+    """
+        Вызывает функцию, когда кеш сам удаляет элемент:
+        при вытеснение или по истечению времени жизни.
+    """
+
+    def __init__(self, *args, on_evict: Optional[Callable[[str], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        if self._on_evict:
+            self._on_evict(key)
+        return key, value
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if self._on_evict:
+            for key, _ in expired:
+                self._on_evict(key)
+        return expired
+
+
+class PolicyMixin(object):
+    """
+        Сообщает политике вытеснения об обращениях к элементам
+        и вытесняет элемент, который она выбрала. Без политики 
+        кеш вытесняет элементы в своем порядке.
+    """
+
+    def __init__(self, *args, policy: Optional['CachePolicy'] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._policy = policy
+
+    def get(self, key, default=None):
+        if self._policy is not None:
+            self._policy.record(key)
+        return super().get(key, default)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if self._policy is not None:
+            self._policy.touch(key)
+        return value
+
+    def peek(self, key, default=None):
+        """Значение элемента без обращения: не меняет порядок вытеснения 
+            и счетчики политики.
+
+        Args:
+            key: Ключ.
+            default (optional): Значение, если элемента нет.
+
+        Returns:
+            Значение элемента или default.
+        """
+        try:
+            return cachetools.Cache.__getitem__(self, key)
+        except KeyError:
+            return default
+
+    def __delitem__(self, key):
+        try:
+            super().__delitem__(key)
+        finally:
+            if self._policy is not None:
+                self._policy.discard(key)
+
+    def popitem(self):
+        key = self._policy.victim() if self._policy is not None else None
+        if key is not None and key not in self:
+            # ключа уже нет в кеше, вытесняем элемент в порядке кеша
+            self._policy.discard(key)
+            key = None
+        if key is None:
+            return super().popitem()
+        return key, self.pop(key)
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        if self._policy is not None:
+            for key, _ in expired:
+                self._policy.discard(key)
+        return expired
+
+    def replace(self, key, old, new) -> bool:
+        """Заменяет значение элемента, чтобы кеш пересчитал его размер. 
+            Пока элемент сохраняется, его нет в кеше, поэтому он не вытесняет 
+            сам себя. Политика вытеснения не забывает элемент.
+
+        Args:
+            key: Ключ.
+            old: Значение, которое должно лежать в кеше.
+            new: Новое значение, может быть тем же.
+
+        Returns:
+            bool: Сохранен ли элемент. Нет, если в кеше другое значение или его нет.
+        """
+        try:
+            if super().__getitem__(key) is not old:
+                return False
+        except KeyError:
+            return False
+        # удаление мимо политики, ее состояние у элемента остается
+        super().__delitem__(key)
+        self[key] = new
+        return key in self
+
+
+class LRUCache(EvictCallbackMixin, PolicyMixin, cachetools.LRUCache):
+    """
+        LRUCache с уведомлением о вытеснение и политикой вытеснения.
+    """
+
+
+class TLRUCache(EvictCallbackMixin, PolicyMixin, cachetools.TLRUCache):
+    """
+        TLRUCache с уведомлением о вытеснение и истечение времени жизни
+        и политикой вытеснения.
+        Время жизни задается для каждого элемента.
+    """
@@ -0,0 +1,167 @@
+from typing import Union, List, Dict, Optional
+
+
+class CacheHandle(object):
+    """
+        Данные одного SQL запроса в кеше. Хранит свой ключ и условие выборки,
+        поэтому кеш не хранит состояние между вызовами и одинаково работает
+        из разных потоков.
+    """
+
+    def __init__(self, cache: object, query: str, hashkey: str):
+        """
+        Args:
+            cache (object): Кеш.
+            query (str): SQL запрос.
+            hashkey (str): Ключ запроса в кеше.
+        """
+        self._cache = cache
+        self._query = query
+        self._hashkey = hashkey
+        self._filter_params: Dict = {}
+
+    def filter(self, params: Dict) -> 'CacheHandle':
+        """Условие для выборки записей в кеше.
+        Выборка учитывает точное совпадение значений, либо оператор в конце поля:
+        `in`, `gt`, `gte`, `lt`, `lte`, `between`, `like`, `ilike`, `isnull`, `isnotnull`, `notequ`.
+
+        Args:
+            params (Dict): Название полей для выборки. К примеру: `.filter({'person.id': 1, 'person.name': 'Anton'})`
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            CacheHandle: Данные запроса.
+        """
+        self._cache._check_filter(self._hashkey, params)
+        self._filter_params = dict(params)
+        return self
+
+    def get(self) -> Union[List[Dict], List]:
+        """Получение данных из кеша по условию или без условия.
+
+        Returns:
+            Union[List[Dict], List]: Записи или пустой список.
+        """
+        return self._cache._get_records(self._hashkey, self._filter_params)
+
+    def insert(self, record: Dict) -> Optional[Dict]:
+        """Добавление записи к кеш.
+
+        Args:
+            record (Dict): Запись.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+        """
+        return self._cache._insert_record(self._hashkey, self._query, record)
+
+    def update(self, params: Dict) -> Union[List[Dict], List]:
+        """Обновление записей в кеше по условию.
+
+        Args:
+            params (Dict): Название полей для обновления. К примеру: `.filter({'person.id': 1}).update({'person.name': 'Anton'})`
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            Union[List[Dict], List]: Обновленные записи или пустой список.
+        """
+        return self._cache._update_records(self._hashkey, self._filter_params, params)
+
+    def delete(self) -> Union[List[Dict], List]:
+        """Удаление записей из кеша по условию.
+
+        Returns:
+            Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
+        """
+        return self._cache._delete_records(self._hashkey, self._filter_params)
+
+
+class AsyncCacheHandle(object):
+    """
+        Данные одного SQL запроса в асинхронном кеше. Хранит свой запрос
+        и условие выборки, поэтому задачи не ждут друг друга на общей блокировке.
+    """
+
+    def __init__(self, cache: object, query: str):
+        """
+        Args:
+            cache (object): Кеш.
+            query (str): SQL запрос.
+        """
+        self._cache = cache
+        self._query = query
+        self._filter_params: Dict = {}
+
+    def filter(self, params: Dict) -> 'AsyncCacheHandle':
+        """Условие для выборки записей в кеше.
+        Выборка учитывает точное совпадение значений, либо оператор в конце поля:
+        `in`, `gt`, `gte`, `lt`, `lte`, `between`, `like`, `ilike`, `isnull`, `isnotnull`, `notequ`.
+
+        Args:
+            params (Dict): Название полей для выборки. К примеру: `.filter({'person.id': 1, 'person.name': 'Anton'})`
+
+        Returns:
+            AsyncCacheHandle: Данные запроса.
+        """
+        self._filter_params = dict(params)
+        return self
+
+    async def get(self) -> Union[List[Dict], List]:
+        """Получение данных из кеша по условию или без условия.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            Union[List[Dict], List]: Записи или пустой список.
+        """
+        return await self._cache._get_records(self._query, self._filter_params)
+
+    async def set_data(self, data: List[Dict]):
+        """Сохранить в кеш данные.
+
+        Args:
+            data (List[Dict]): Результирующие данные из БД.
+        """
+        await self._cache._set_data(self._query, data)
+
+    async def delete_query(self):
+        """ Удаление из кеша данных. """
+        await self._cache._delete_query(self._query)
+
+    async def insert(self, record: Dict) -> Optional[Dict]:
+        """Добавление записи к кеш.
+
+        Args:
+            record (Dict): Запись.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+        """
+        return await self._cache._insert_record(self._query, record)
+
+    async def update(self, params: Dict) -> Union[List[Dict], List]:
+        """Обновление записей в кеше по условию.
+
+        Args:
+            params (Dict): Название полей для обновления. К примеру: `.filter({'person.id': 1}).update({'person.name': 'Anton'})`
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            Union[List[Dict], List]: Обновленные записи или пустой список.
+        """
+        return await self._cache._update_records(self._query, self._filter_params, params)
+
+    async def delete(self) -> Union[List[Dict], List]:
+        """Удаление записей из кеша по условию.
+
+        Returns:
+            Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
+        """
+        return await self._cache._delete_records(self._query, self._filter_params)
@@ -0,0 +1,488 @@
+import re
+import sys
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Операторы фильтрации в кеше, как у `Query.filter`.
+OPERATORS = (
+    'ilike', 'like', 'in', 'gt', 'gte', 'lt', 'lte',
+    'between', 'isnull', 'isnotnull', 'notequ'
+)
+# Операторы, для которых используется отсортированный индекс.
+RANGE_OPERATORS = ('gt', 'gte', 'lt', 'lte', 'between')
+# Число обновляемых записей, начиная с которого индексы обновляемых полей
+# не поддерживаются по записи, а строятся заново при следующей выборке.
+BULK_UPDATE = 64
+_MAX_POS = float('inf')
+# Размеры элементов индексов для оценки их памяти.
+_POSITIONS_SIZE = sys.getsizeof({0})
+_PAIR_SIZE = sys.getsizeof((0, 0))
+
+
+def split_operator(key: str) -> Tuple[str, str]:
+    """Получение поля и оператора из параметра фильтрации.
+
+    Args:
+        key (str): Параметр, к примеру: `person.age__gte`.
+
+    Returns:
+        Tuple[str, str]: Поле и оператор. Для точного совпадения оператор - пустая строка.
+    """
+    field, sep, operator = key.rpartition('__')
+    if sep and field and operator in OPERATORS:
+        return field, operator
+    return key, ''
+
+
+def _like_to_regex(pattern: str, flags: int = 0) -> 're.Pattern':
+    """Шаблон sql like в регулярное выражение.
+
+    Args:
+        pattern (str): Шаблон like.
+        flags (int, optional): Флаги регулярного выражения.
+
+    Returns:
+        re.Pattern: Регулярное выражение.
+    """
+    regex = ''.join(
+        '.*' if char == '%' else '.' if char == '_' else re.escape(char)
+        for char in pattern
+    )
+    return re.compile(f'{regex}$', flags | re.DOTALL)
+
+
+def _in_values(value: Any) -> Iterable:
+    """Значения для оператора `in`. Одно значение, в том числе строка,
+        считается списком из одного значения, а не последовательностью символов.
+
+    Args:
+        value (Any): Значение из фильтра.
+
+    Returns:
+        Iterable: Значения.
+    """
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return value
+    return (value,)
+
+
+def _check(current: Any, operator: str, value: Any) -> bool:
+    """Проверка значения записи по оператору.
+        Как и в sql, null не проходит сравнения.
+
+    Args:
+        current (Any): Значение из записи.
+        operator (str): Оператор.
+        value (Any): Значение из фильтра.
+
+    Returns:
+        bool: Флаг.
+    """
+    if not operator:
+        return current == value
+    if operator == 'isnull':
+        return current is None
+    if operator == 'isnotnull':
+        return current is not None
+    if current is None:
+        return False
+    try:
+        if operator == 'in':
+            return current in _in_values(value)
+        if operator == 'notequ':
+            return current != value
+        if operator == 'gt':
+            return current > value
+        if operator == 'gte':
+            return current >= value
+        if operator == 'lt':
+            return current < value
+        if operator == 'lte':
+            return current <= value
+        if operator == 'between':
+            return value[0] <= current <= value[1]
+        if operator in ('like', 'ilike'):
+            flags = re.IGNORECASE if operator == 'ilike' else 0
+            return bool(_like_to_regex(value, flags).match(str(current)))
+    except TypeError:
+        return False
+    return False
+
+
+def scan(records: List[Dict], params: Dict) -> List[int]:
+    """Позиции записей, которые подходят под все условия, перебором без индексов.
+        Записи из redis и общей памяти загружаются на один вызов, 
+        индекс по ним не окупается.
+
+    Args:
+        records (List[Dict]): Записи.
+        params (Dict): Параметры выборки. К полю можно добавить оператор.
+
+    Returns:
+        List[int]: Позиции записей по возрастанию.
+    """
+    conditions = [(*split_operator(key), value) for key, value in params.items()]
+    return [i for i, record in enumerate(records) if IndexedRecords._match(record, conditions)]
+
+
+class IndexedRecords(list):
+    """
+        Записи кеша с ленивыми индексами по полям.
+        Для точного совпадения и `in` строится хеш-индекс,
+        для сравнений и `between` - отсортированный индекс.
+        Индекс по полю строится при первой выборке по этому полю
+        и поддерживается при добавление и обновление записей.
+        Записи в кеше изменяются через копию из `copy`, поэтому 
+        их можно читать без блокировки.
+    """
+
+    def __init__(self, records: Iterable[Dict] = ()):
+        """
+        Args:
+            records (Iterable[Dict], optional): Записи.
+        """
+        super().__init__(records)
+        # поле -> значение -> позиции записей.
+        # None, если у поля есть нехешируемые значения.
+        self._indexes: Dict[str, Optional[Dict[Any, Set[int]]]] = {}
+        # поле -> отсортированные пары (значение, позиция) без null.
+        # None, если значения поля нельзя сравнить между собой.
+        self._sorted_indexes: Dict[str, Optional[List[Tuple[Any, int]]]] = {}
+        # поля, множества позиций которых общие с записями, из которых сделана копия,
+        # и значения полей, множества позиций которых уже скопированы
+        self._shared: Set[str] = set()
+        self._copied: Set[Tuple[str, Any]] = set()
+
+    def copy(self) -> 'IndexedRecords':
+        """Копия записей для изменения, пока эти записи читают другие потоки.
+            Сами записи общие. Индексы копируются, а множества позиций 
+            в них копируются только при первом изменении.
+
+        Returns:
+            IndexedRecords: Копия.
+        """
+        records = IndexedRecords(self)
+        # словари индексов могут дополнять читатели, поэтому сначала берется их копия
+        indexes = dict(self._indexes)
+        records._indexes = {
+            field: None if index is None else dict(index)
+            for field, index in indexes.items()
+        }
+        records._shared = {field for field, index in indexes.items() if index is not None}
+        records._sorted_indexes = {
+            field: None if index is None else list(index)
+            for field, index in dict(self._sorted_indexes).items()
+        }
+        return records
+
+    def find(self, params: Dict) -> List[int]:
+        """Позиции записей, которые подходят под все условия.
+
+        Args:
+            params (Dict): Параметры выборки. К полю можно добавить оператор,
+                к примеру: `{'person.age__gte': 30}`.
+
+        Returns:
+            List[int]: Позиции записей по возрастанию.
+        """
+        if not params:
+            return list(range(len(self)))
+        conditions = [(*split_operator(key), value) for key, value in params.items()]
+        best: Optional[Tuple[int, Callable[[], List[int]]]] = None
+        best_condition = None
+        for condition in conditions:
+            plan = self._plan(*condition)
+            if plan is not None and (best is None or plan[0] < best[0]):
+                best, best_condition = plan, condition
+        if best is None:
+            candidates = range(len(self))
+        else:
+            # начинаем с самого избирательного индекса, остальные условия проверяем у записей
+            candidates = best[1]()
+            conditions.remove(best_condition)
+        if not conditions:
+            return list(candidates)
+        return [i for i in candidates if self._match(self[i], conditions)]
+
+    def update_records(self, positions: List[int], params: Dict) -> List[Dict]:
+        """Обновление записей с поддержкой индексов.
+
+        Args:
+            positions (List[int]): Позиции записей.
+            params (Dict): Новые значения полей.
+
+        Returns:
+            List[Dict]: Обновленные записи.
+        """
+        # запись заменяется новым словарем, старый может быть в копии записей
+        if len(positions) >= BULK_UPDATE:
+            # индексы обновляемых полей построятся заново один раз при следующей выборке
+            for field in params:
+                self._indexes.pop(field, None)
+                self._sorted_indexes.pop(field, None)
+                self._shared.discard(field)
+            updated = []
+            for i in positions:
+                record = {**self[i], **params}
+                list.__setitem__(self, i, record)
+                updated.append(record)
+            return updated
+        updated = []
+        for i in positions:
+            old = self[i]
+            for field in params:
+                self._unindex(field, old, i)
+            record = {**old, **params}
+            list.__setitem__(self, i, record)
+            for field in params:
+                self._index(field, record, i)
+            updated.append(record)
+        return updated
+
+    def delete_records(self, positions: List[int]) -> List[Dict]:
+        """Удаление записей. Позиции остальных записей сдвигаются,
+            поэтому индексы будут построены заново.
+
+        Args:
+            positions (List[int]): Позиции записей по возрастанию.
+
+        Returns:
+            List[Dict]: Удаленные записи.
+        """
+        deleted = [self[i] for i in positions]
+        for i in reversed(positions):
+            super().__delitem__(i)
+        if deleted:
+            self._drop_indexes()
+        return deleted
+
+    def append(self, record: Dict):
+        position = len(self)
+        super().append(record)
+        # при восстановление из pickle индексов еще нет
+        if getattr(self, '_indexes', None) is None:
+            return
+        for field in {*self._indexes, *self._sorted_indexes}:
+            self._index(field, record, position)
+
+    def index_size(self) -> int:
+        """Примерный размер построенных индексов в байтах.
+            Значения полей общие с записями и не учитываются.
+
+        Returns:
+            int: Размер в байтах.
+        """
+        size = 0
+        for index in self._indexes.values():
+            if index is not None:
+                size += sys.getsizeof(index) + len(index) * _POSITIONS_SIZE
+        for sorted_index in self._sorted_indexes.values():
+            if sorted_index is not None:
+                size += sys.getsizeof(sorted_index) + len(sorted_index) * _PAIR_SIZE
+        return size
+
+    def _plan(self, field: str, operator: str, value: Any) -> Optional[Tuple[int, Callable[[], List[int]]]]:
+        """План выборки по индексу для одного условия.
+
+        Args:
+            field (str): Поле.
+            operator (str): Оператор.
+            value (Any): Значение.
+
+        Returns:
+            Optional[Tuple[int, Callable[[], List[int]]]]: Число записей и функция,
+                которая возвращает их позиции. Ничего, если индекс не применим.
+        """
+        if operator in ('', 'isnull', 'in'):
+            index = self._get_index(field)
+            if index is None:
+                return None
+            try:
+                if operator == 'in':
+                    postings = [index.get(item, ()) for item in _in_values(value)]
+                    return sum(map(len, postings)), lambda: sorted(set().union(*postings))
+                positions = index.get(None if operator == 'isnull' else value, ())
+            except TypeError:
+                return None
+            return len(positions), lambda: sorted(positions)
+        if operator in RANGE_OPERATORS:
+            index = self._get_sorted_index(field)
+            if index is None:
+                return None
+            try:
+                lo, hi = self._bounds(index, operator, value)
+            except (TypeError, IndexError, ValueError):
+                return None
+            return max(hi - lo, 0), lambda: sorted(pos for _, pos in index[lo:hi])
+        return None
+
+    @staticmethod
+    def _bounds(index: List[Tuple[Any, int]], operator: str, value: Any) -> Tuple[int, int]:
+        """Границы диапазона в отсортированном индексе.
+
+        Args:
+            index (List[Tuple[Any, int]]): Отсортированный индекс.
+            operator (str): Оператор сравнения.
+            value (Any): Значение.
+
+        Returns:
+            Tuple[int, int]: Начало и конец диапазона.
+        """
+        # пары сравниваются сначала по значению, затем по позиции
+        if operator == 'gt':
+            return bisect_right(index, (value, _MAX_POS)), len(index)
+        if operator == 'gte':
+            return bisect_left(index, (value, -1)), len(index)
+        if operator == 'lt':
+            return 0, bisect_left(index, (value, -1))
+        if operator == 'lte':
+            return 0, bisect_right(index, (value, _MAX_POS))
+        low, high = value
+        return bisect_left(index, (low, -1)), bisect_right(index, (high, _MAX_POS))
+
+    def _get_index(self, field: str) -> Optional[Dict[Any, Set[int]]]:
+        """Хеш-индекс по полю. Строится при первом обращение.
+
+        Args:
+            field (str): Поле.
+
+        Returns:
+            Optional[Dict[Any, Set[int]]]: Индекс или ничего,
+                если у поля есть нехешируемые значения.
+        """
+        if field not in self._indexes:
+            index = {}
+            try:
+                for i, record in enumerate(self):
+                    if field in record:
+                        index.setdefault(record[field], set()).add(i)
+            except TypeError:
+                index = None
+            self._indexes[field] = index
+            self._shared.discard(field)
+        return self._indexes[field]
+
+    def _get_sorted_index(self, field: str) -> Optional[List[Tuple[Any, int]]]:
+        """Отсортированный индекс по полю. Строится при первом обращение.
+
+        Args:
+            field (str): Поле.
+
+        Returns:
+            Optional[List[Tuple[Any, int]]]: Индекс или ничего,
+                если значения поля нельзя сравнить между собой.
+        """
+        if field not in self._sorted_indexes:
+            try:
+                index = sorted(
+                    (record[field], i) for i, record in enumerate(self)
+                    if record.get(field) is not None
+                )
+            except TypeError:
+                index = None
+            self._sorted_indexes[field] = index
+        return self._sorted_indexes[field]
+
+    def _index(self, field: str, record: Dict, position: int):
+        """Добавляет значение поля записи в построенные индексы.
+
+        Args:
+            field (str): Поле.
+            record (Dict): Запись.
+            position (int): Позиция записи.
+        """
+        if field not in record:
+            return
+        value = record[field]
+        index = self._indexes.get(field)
+        if index is not None:
+            try:
+                self._positions(field, index, value).add(position)
+            except TypeError:
+                self._indexes[field] = None
+        sorted_index = self._sorted_indexes.get(field)
+        if sorted_index is not None and value is not None:
+            try:
+                insort(sorted_index, (value, position))
+            except TypeError:
+                self._sorted_indexes[field] = None
+
+    def _unindex(self, field: str, record: Dict, position: int):
+        """Удаляет значение поля записи из построенных индексов.
+
+        Args:
+            field (str): Поле.
+            record (Dict): Запись.
+            position (int): Позиция записи.
+        """
+        if field not in record:
+            return
+        value = record[field]
+        index = self._indexes.get(field)
+        if index is not None and value in index:
+            positions = self._positions(field, index, value)
+            positions.discard(position)
+            if not positions:
+                del index[value]
+        sorted_index = self._sorted_indexes.get(field)
+        if sorted_index is not None and value is not None:
+            i = bisect_left(sorted_index, (value, position))
+            if i < len(sorted_index) and sorted_index[i] == (value, position):
+                del sorted_index[i]
+
+    def _positions(self, field: str, index: Dict[Any, Set[int]], value: Any) -> Set[int]:
+        """Множество позиций значения поля, которое можно изменять.
+            Общее с другой копией записей множество сначала копируется.
+
+        Args:
+            field (str): Поле.
+            index (Dict[Any, Set[int]]): Хеш-индекс поля.
+            value (Any): Значение поля.
+
+        Returns:
+            Set[int]: Позиции записей.
+        """
+        positions = index.get(value)
+        if positions is None:
+            positions = index[value] = set()
+            self._copied.add((field, value))
+        elif field in self._shared and (field, value) not in self._copied:
+            positions = index[value] = set(positions)
+            self._copied.add((field, value))
+        return positions
+
+    def _drop_indexes(self):
+        self._indexes.clear()
+        self._sorted_indexes.clear()
+        self._shared.clear()
+        self._copied.clear()
+
+    @staticmethod
+    def _match(record: Dict, conditions: List[Tuple[str, str, Any]]) -> bool:
+        for field, operator, value in conditions:
+            if field not in record or not _check(record[field], operator, value):
+                return False
+        return True
+
+    def _mutator(name: str):
+        method = getattr(list, name)
+        def wrapper(self, *args, **kwargs):
+            res = method(self, *args, **kwargs)
+            if getattr(self, '_indexes', None) is not None:
+                self._drop_indexes()
+            return res
+        wrapper.__name__ = name
+        return wrapper
+
+    # при прямом изменение списка индексы сбрасываются
+    __setitem__ = _mutator('__setitem__')
+    __delitem__ = _mutator('__delitem__')
+    __iadd__ = _mutator('__iadd__')
+    extend = _mutator('extend')
+    insert = _mutator('insert')
+    pop = _mutator('pop')
+    remove = _mutator('remove')
+    clear = _mutator('clear')
+    sort = _mutator('sort')
+    reverse = _mutator('reverse')
+    del _mutator
@@ -0,0 +1,34 @@
+import hashlib
+
+# Длина хеша ключа в байтах. 128 бит достаточно, чтобы не было коллизий.
+DIGEST_SIZE = 16
+
+
+def hash_key(text: str) -> str:
+    """Хеш для ключа кеша.
+
+    Args:
+        text (str): Текст ключа.
+
+    Returns:
+        str: Хеш в шестнадцатеричном виде.
+    """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def query_hashkey(query: str) -> str:
+    """Хеш запроса для ключа кеша.
+        У QueryKey хеш считается один раз и запоминается в нем.
+        Регистр и пробелы внутри запроса не меняются: иначе совпадали бы ключи
+        запросов с разными строковыми значениями (`'a b'` и `'ab'`).
+
+    Args:
+        query (str): SQL запрос или QueryKey.
+
+    Returns:
+        str: Хеш запроса.
+    """
+    hashkey = getattr(query, 'hashkey', None)
+    if hashkey is not None:
+        return hashkey
+    return hash_key(query.strip())
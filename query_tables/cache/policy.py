@@ -0,0 +1,342 @@
+import heapq
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, List, Optional, Tuple, Union
+from query_tables.cache.size import estimate_size
+from query_tables.exceptions import UnknownCachePolicy
+
+# Время запроса к БД, если оно не измерено. Например, данные сохранены в кеш вручную.
+DEFAULT_COST = 0.001
+
+
+class CachePolicy(object):
+    """
+        Политика вытеснения запросов из локального кеша.
+        Кеш сообщает ей об обращениях к запросам, а при переполнение
+        спрашивает, какой запрос вытеснить. Все методы вызываются
+        под блокировкой кеша.
+    """
+
+    name = ''
+
+    def record(self, key: str):
+        """Обращение к запросу, в том числе промах кеша.
+
+        Args:
+            key (str): Ключ запроса.
+        """
+
+    def touch(self, key: str):
+        """Запрос прочитан из кеша.
+
+        Args:
+            key (str): Ключ запроса.
+        """
+
+    def add(
+        self, key: str, value: List, 
+        cost: Optional[float] = None, size: Optional[int] = None
+    ):
+        """Запрос сохранен в кеш.
+
+        Args:
+            key (str): Ключ запроса.
+            value (List): Записи.
+            cost (Optional[float], optional): Время запроса к БД в секундах.
+            size (Optional[int], optional): Размер записей в байтах, если он уже посчитан.
+        """
+
+    def discard(self, key: str):
+        """Запрос удален из кеша.
+
+        Args:
+            key (str): Ключ запроса.
+        """
+
+    def victim(self) -> Optional[str]:
+        """Запрос, который нужно вытеснить.
+
+        Returns:
+            Optional[str]: Ключ запроса или ничего, тогда кеш
+                вытесняет давно не используемый запрос.
+        """
+        return None
+
+    def clear(self):
+        """
+            Очищение состояния политики.
+        """
+
+
+class _PriorityQueue(object):
+    """
+        Ключи по возрастанию приоритета. Старый приоритет ключа
+        не удаляется из кучи сразу, а пропускается при выборке.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, int, str]] = {}
+        self._counter = count()
+
+    def push(self, key: str, priority: float):
+        # при равном приоритете раньше вытесняется ключ, который раньше изменялся
+        entry = (priority, next(self._counter), key)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+    def peek(self) -> Optional[Tuple[str, float]]:
+        """Ключ с наименьшим приоритетом.
+
+        Returns:
+            Optional[Tuple[str, float]]: Ключ и его приоритет или ничего.
+        """
+        while self._heap:
+            entry = self._heap[0]
+            if self._entries.get(entry[2]) is entry:
+                return entry[2], entry[0]
+            heapq.heappop(self._heap)
+        return None
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+
+
+class LFUPolicy(CachePolicy):
+    """
+        Вытесняется запрос, который реже всего читали.
+        Из одинаково редких - тот, который раньше всего читали.
+    """
+
+    name = 'lfu'
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._queue = _PriorityQueue()
+
+    def touch(self, key: str):
+        if key not in self._counts:
+            return None
+        self._counts[key] += 1
+        self._queue.push(key, self._counts[key])
+
+    def add(
+        self, key: str, value: List, 
+        cost: Optional[float] = None, size: Optional[int] = None
+    ):
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._queue.push(key, self._counts[key])
+
+    def discard(self, key: str):
+        self._counts.pop(key, None)
+        self._queue.discard(key)
+
+    def victim(self) -> Optional[str]:
+        item = self._queue.peek()
+        return item[0] if item else None
+
+    def clear(self):
+        self._counts.clear()
+        self._queue.clear()
+
+
+class FrequencySketch(object):
+    """
+        Частота обращений к запросам, в том числе к тем, которых нет в кеше.
+        После sample обращений все счетчики уменьшаются вдвое,
+        поэтому старая популярность запросов со временем забывается.
+    """
+
+    def __init__(self, sample: int):
+        """
+        Args:
+            sample (int): Число обращений между уменьшениями счетчиков.
+        """
+        self._sample = sample
+        self._counts: Dict[int, int] = {}
+        self._added = 0
+
+    def increment(self, key: str):
+        # хранится хеш ключа, а не сам ключ
+        hashed = hash(key)
+        self._counts[hashed] = self._counts.get(hashed, 0) + 1
+        self._added += 1
+        if self._added >= self._sample:
+            self._counts = {
+                hashed: value // 2
+                for hashed, value in self._counts.items() if value > 1
+            }
+            self._added //= 2
+
+    def frequency(self, key: str) -> int:
+        return self._counts.get(hash(key), 0)
+
+    def clear(self):
+        self._counts.clear()
+        self._added = 0
+
+
+class TinyLFUPolicy(CachePolicy):
+    """
+        W-TinyLFU. Новые запросы попадают в небольшое окно. Когда окно заполнено,
+        самый старый запрос окна переходит в основную часть кеша, только если
+        к нему обращались чаще, чем к запросу, который вытесняется вместо него.
+        Поэтому разовые запросы не вытесняют часто используемые.
+    """
+
+    name = 'tinylfu'
+
+    def __init__(self, window: float = 0.01, sample: int = 100000):
+        """
+        Args:
+            window (float, optional): Доля окна для новых запросов от числа запросов в кеше.
+            sample (int, optional): Число обращений, после которого частоты уменьшаются вдвое.
+        """
+        self._window_share = window
+        self._sketch = FrequencySketch(sample)
+        self._window: OrderedDict = OrderedDict()
+        self._main: OrderedDict = OrderedDict()
+
+    def record(self, key: str):
+        self._sketch.increment(key)
+
+    def touch(self, key: str):
+        for part in (self._window, self._main):
+            if key in part:
+                part.move_to_end(key)
+                return None
+
+    def add(
+        self, key: str, value: List, 
+        cost: Optional[float] = None, size: Optional[int] = None
+    ):
+        if key in self._main:
+            self._main.move_to_end(key)
+            return None
+        self._window[key] = None
+        self._window.move_to_end(key)
+
+    def discard(self, key: str):
+        self._window.pop(key, None)
+        self._main.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        limit = max(int((len(self._window) + len(self._main)) * self._window_share), 1)
+        if not self._main:
+            # до первого вытеснения окно растет без ограничения,
+            # лишние запросы переходят в основную часть без сравнения
+            while len(self._window) > limit:
+                key, _ = self._window.popitem(last=False)
+                self._main[key] = None
+        if not self._main:
+            return next(iter(self._window), None)
+        if not self._window:
+            return next(iter(self._main))
+        if len(self._window) < limit:
+            return next(iter(self._main))
+        candidate = next(iter(self._window))
+        victim = next(iter(self._main))
+        if self._sketch.frequency(candidate) > self._sketch.frequency(victim):
+            del self._window[candidate]
+            self._main[candidate] = None
+            return victim
+        return candidate
+
+    def clear(self):
+        self._sketch.clear()
+        self._window.clear()
+        self._main.clear()
+
+
+class CostPolicy(CachePolicy):
+    """
+        GreedyDual-Size-Frequency. Приоритет запроса - частота обращений,
+        умноженная на время запроса к БД и деленная на размер записей.
+        Вытесняется запрос с наименьшим приоритетом, а его приоритет
+        прибавляется к новым, чтобы давно не используемые запросы тоже вытеснялись.
+    """
+
+    name = 'cost'
+
+    def __init__(self, default_cost: float = DEFAULT_COST):
+        """
+        Args:
+            default_cost (float, optional): Время запроса к БД в секундах, если оно не измерено.
+        """
+        self._default_cost = default_cost
+        self._clock = 0.0
+        # частота обращений и время запроса на байт записей
+        self._entries: Dict[str, List[float]] = {}
+        self._queue = _PriorityQueue()
+
+    def touch(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry[0] += 1
+        self._queue.push(key, self._clock + entry[0] * entry[1])
+
+    def add(
+        self, key: str, value: List, 
+        cost: Optional[float] = None, size: Optional[int] = None
+    ):
+        entry = self._entries.get(key)
+        frequency = entry[0] + 1 if entry else 1
+        if size is None:
+            size = estimate_size(value)
+        weight = (cost or self._default_cost) / max(size, 1)
+        self._entries[key] = [frequency, weight]
+        self._queue.push(key, self._clock + frequency * weight)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+        self._queue.discard(key)
+
+    def victim(self) -> Optional[str]:
+        item = self._queue.peek()
+        if item is None:
+            return None
+        key, self._clock = item
+        return key
+
+    def clear(self):
+        self._clock = 0.0
+        self._entries.clear()
+        self._queue.clear()
+
+
+# lru - вытеснение, которое кеш делает сам
+POLICIES = {
+    'lru': None,
+    'lfu': LFUPolicy,
+    'tinylfu': TinyLFUPolicy,
+    'cost': CostPolicy,
+}
+
+
+def make_policy(policy: Union[str, CachePolicy]) -> Optional[CachePolicy]:
+    """Политика вытеснения по названию.
+
+    Args:
+        policy (Union[str, CachePolicy]): Название политики: `lru`, `lfu`, `tinylfu`, `cost`,
+            либо своя политика.
+
+    Raises:
+        UnknownCachePolicy: Нет такой политики.
+
+    Returns:
+        Optional[CachePolicy]: Политика или ничего для `lru`.
+    """
+    if isinstance(policy, CachePolicy):
+        return policy
+    if policy not in POLICIES:
+        raise UnknownCachePolicy(policy, list(POLICIES))
+    cls = POLICIES[policy]
+    return cls() if cls else None
@@ -0,0 +1,229 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from query_tables.cache.index import split_operator, _like_to_regex, _check
+
+# Больше записей при вставке не сравниваются с запросами в кеше,
+# данные таблицы удаляются из кеша целиком.
+MAX_WRITE_PREDICATES = 100
+_INF = float('inf')
+
+
+def records_predicates(records: List[Dict]) -> Optional[List[Dict]]:
+    """Условия, которым соответствуют добавленные записи.
+
+    Args:
+        records (List[Dict]): Записи для вставки.
+
+    Returns:
+        Optional[List[Dict]]: Условия по каждой записи или ничего,
+            если записей слишком много.
+    """
+    if len(records) > MAX_WRITE_PREDICATES:
+        return None
+    predicates = []
+    for record in records:
+        predicate = {}
+        for field, value in record.items():
+            if value is None:
+                predicate[f'{field}__isnull'] = True
+            else:
+                predicate[field] = value
+        predicates.append(predicate)
+    return predicates
+
+
+def updated_predicates(predicate: Dict, params: Dict) -> List[Dict]:
+    """Условия, которым соответствуют записи до и после обновления.
+
+    Args:
+        predicate (Dict): Условие обновления.
+        params (Dict): Новые значения полей.
+
+    Returns:
+        List[Dict]: Условия для старых и новых значений записей.
+    """
+    after = {
+        key: value for key, value in predicate.items()
+        if split_operator(key)[0] not in params
+    }
+    after.update(records_predicates([params])[0])
+    return [predicate, after]
+
+
+def may_overlap(cached: Optional[Dict], written: Optional[Dict]) -> bool:
+    """Могут ли записи из запроса в кеше пересечься с измененными записями.
+        Если пересечение нельзя исключить, считается, что оно есть.
+
+    Args:
+        cached (Optional[Dict]): Условие запроса в кеше.
+        written (Optional[Dict]): Условие измененных записей.
+
+    Returns:
+        bool: Флаг.
+    """
+    if not cached or not written:
+        return True
+    written_conditions: Dict[str, List[Tuple[str, Any]]] = {}
+    for key, value in written.items():
+        field, operator = split_operator(key)
+        written_conditions.setdefault(field, []).append((operator, value))
+    for key, value in cached.items():
+        field, operator = split_operator(key)
+        for w_operator, w_value in written_conditions.get(field, ()):
+            if _disjoint(operator, value, w_operator, w_value):
+                return False
+    return True
+
+
+def any_overlap(cached: Optional[Dict], written: Iterable[Dict]) -> bool:
+    """Пересекается ли запрос в кеше хотя бы с одним из условий изменения.
+
+    Args:
+        cached (Optional[Dict]): Условие запроса в кеше.
+        written (Iterable[Dict]): Условия измененных записей.
+
+    Returns:
+        bool: Флаг.
+    """
+    return any(may_overlap(cached, predicate) for predicate in written)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _same_kind(a: Any, b: Any) -> bool:
+    """Значения сравниваются одинаково в python и в БД.
+
+    Args:
+        a (Any): Значение.
+        b (Any): Значение.
+
+    Returns:
+        bool: Флаг.
+    """
+    if _is_number(a) and _is_number(b):
+        return True
+    return type(a) is type(b) and isinstance(a, (str, bool))
+
+
+def _values(operator: str, value: Any) -> Optional[List[Any]]:
+    """Конечный список значений условия.
+
+    Args:
+        operator (str): Оператор.
+        value (Any): Значение.
+
+    Returns:
+        Optional[List[Any]]: Значения или ничего, если условие им не выражается.
+    """
+    if operator == '':
+        values = [value]
+    elif operator == 'in' and isinstance(value, (list, tuple)):
+        values = list(value)
+    else:
+        return None
+    if any(item is None for item in values):
+        return None
+    return values
+
+
+def _range(operator: str, value: Any) -> Optional[Tuple[float, bool, float, bool]]:
+    """Числовой диапазон условия.
+
+    Args:
+        operator (str): Оператор.
+        value (Any): Значение.
+
+    Returns:
+        Optional[Tuple[float, bool, float, bool]]: Начало, включено ли начало,
+            конец, включен ли конец. Ничего, если условие не числовой диапазон.
+    """
+    if operator == 'between':
+        if not isinstance(value, (list, tuple)) or len(value) != 2:
+            return None
+        if not (_is_number(value[0]) and _is_number(value[1])):
+            return None
+        return value[0], True, value[1], True
+    if operator not in ('gt', 'gte', 'lt', 'lte') or not _is_number(value):
+        return None
+    if operator in ('gt', 'gte'):
+        return value, operator == 'gte', _INF, False
+    return -_INF, False, value, operator == 'lte'
+
+
+def _excludes(operator: str, value: Any, item: Any) -> bool:
+    """Значение точно не подходит под условие.
+
+    Args:
+        operator (str): Оператор.
+        value (Any): Значение условия.
+        item (Any): Проверяемое значение.
+
+    Returns:
+        bool: Флаг.
+    """
+    if operator == 'notequ':
+        return _same_kind(item, value) and item == value
+    if operator in ('like', 'ilike'):
+        # like в sqlite не учитывает регистр, поэтому сравнение без регистра
+        if not (isinstance(item, str) and isinstance(value, str)):
+            return False
+        return not _like_to_regex(value, re.IGNORECASE).match(item)
+    if _range(operator, value) is not None:
+        return _is_number(item) and not _check(item, operator, value)
+    return False
+
+
+def _disjoint(op1: str, value1: Any, op2: str, value2: Any) -> bool:
+    """Условия по одному полю не могут выполниться одновременно.
+
+    Args:
+        op1 (str): Оператор первого условия.
+        value1 (Any): Значение первого условия.
+        op2 (str): Оператор второго условия.
+        value2 (Any): Значение второго условия.
+
+    Returns:
+        bool: Флаг.
+    """
+    if 'isnull' in (op1, op2):
+        other_op, other_value = (op2, value2) if op1 == 'isnull' else (op1, value1)
+        if other_op == 'isnull':
+            return False
+        if other_op in ('', 'in'):
+            # остальные условия не выполняются для null
+            return _values(other_op, other_value) is not None
+        return True
+    values1 = _values(op1, value1)
+    values2 = _values(op2, value2)
+    if values1 is not None and values2 is not None:
+        return all(
+            _same_kind(a, b) and a != b for a in values1 for b in values2
+        )
+    if values1 is not None:
+        return all(_excludes(op2, value2, item) for item in values1)
+    if values2 is not None:
+        return all(_excludes(op1, value1, item) for item in values2)
+    range1 = _range(op1, value1)
+    range2 = _range(op2, value2)
+    if range1 is None or range2 is None:
+        return False
+    return _ranges_disjoint(range1, range2) or _ranges_disjoint(range2, range1)
+
+
+def _ranges_disjoint(
+    range1: Tuple[float, bool, float, bool], range2: Tuple[float, bool, float, bool]
+) -> bool:
+    """Первый диапазон целиком правее второго.
+
+    Args:
+        range1 (Tuple[float, bool, float, bool]): Первый диапазон.
+        range2 (Tuple[float, bool, float, bool]): Второй диапазон.
+
+    Returns:
+        bool: Флаг.
+    """
+    low, low_incl = range1[0], range1[1]
+    high, high_incl = range2[2], range2[3]
+    return low > high or (low == high and not (low_incl and high_incl))
@@ -1,36 +1,40 @@
-import hashlib
 import redis
 import json
 import datetime
 import logging
 import base64
 import uuid
-from threading import RLock
-from typing import Union, List, Dict, Optional, Iterator, Tuple
+from typing import Union, List, Dict, Optional, Iterator, Tuple, Callable
 from dataclasses import dataclass
 from query_tables.cache import BaseCache, TypeCache
+from query_tables.cache.handle import CacheHandle
+from query_tables.cache.index import scan, split_operator
+from query_tables.cache.predicates import any_overlap
+from query_tables.cache.ttl import query_ttl, is_ttl_enabled
+from query_tables.cache.keys import hash_key, query_hashkey
 from query_tables.exceptions import NoMatchFieldInCache
 from redis.exceptions import ConnectionError, TimeoutError
+from redis.client import PubSub, PubSubWorkerThread
+from query_tables.fork import register_after_fork, orphan
 
 logger = logging.getLogger(__name__)
 
 
-class SyncLockDecorator:
+class RedisErrorDecorator:
     """
-        Обертка для redis в многопоточном приложение.
+        Обертка для записи в лог ошибок соединения с redis.
+        Клиент redis потокобезопасен, поэтому общая блокировка не нужна.
     """    
-    def __init__(self, method, rlock):
+    def __init__(self, method):
         self.method = method
-        self.rlock = rlock
 
     def __call__(self, *args, **kwargs):
-        with self.rlock:
-            try:
-                return self.method(*args, **kwargs)
-            except ConnectionError as e:
-                logger.error(f"Произошла ошибка соединения с Redis: {e}")
-            except TimeoutError as e:
-                logger.error(f"Время ожидания выполнения команды истекло: {e}")
+        try:
+            return self.method(*args, **kwargs)
+        except ConnectionError as e:
+            logger.error(f"Произошла ошибка соединения с Redis: {e}")
+        except TimeoutError as e:
+            logger.error(f"Время ожидания выполнения команды истекло: {e}")
 
 
 @dataclass
@@ -59,8 +63,31 @@ class RedisCache(BaseCache):
     
     type_cache = TypeCache.remote
     
-    def __init__(self, conn: RedisConnect):
+    def __init__(
+        self, conn: RedisConnect, versioned_keys: bool = False,
+        ttl: Union[int, Dict[str, int]] = 0, stale_ttl: int = 0,
+        negative_ttl: int = 0
+    ):
+        """
+        Args:
+            conn (RedisConnect): Параметры подключения к redis.
+            versioned_keys (bool, optional): Ключи запросов включают поколения таблиц.
+                Изменение таблицы только увеличивает ее поколение (один INCR), 
+                а старые записи вытесняются политикой памяти redis.
+            ttl (Union[int, Dict[str, int]], optional): Время жизни ключей запросов в секундах. 
+                Можно задать время по таблицам: `{'country': 86400, 'orders': 5}`. Запрос с несколькими 
+                таблицами живет наименьшее из их времен, таблицы не из словаря не кешируются.
+                По умолчанию 0 - ключи не истекают.
+            stale_ttl (int, optional): Сколько секунд после ttl запись еще отдается из кеша,
+                пока ее обновляет фоновый запрос к БД. По умолчанию 0 - записи не отдаются после ttl.
+            negative_ttl (int, optional): Время жизни пустых результатов запросов с таблицами.
+                Не больше ttl запроса. По умолчанию 0 - пустые результаты не кешируются.
+        """
         self._conn = conn
+        self._versioned_keys = versioned_keys
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl if is_ttl_enabled(ttl) else 0
+        self._negative_ttl = negative_ttl
         self._pool = redis.ConnectionPool(**self._conn.get_conn())
         self._redis = redis.StrictRedis(
             decode_responses=True, 
@@ -69,29 +96,41 @@ class RedisCache(BaseCache):
         self._key_queries = 'queries'
         self._key_tables = 'tables'
         self._key_struct = 'struct_tables'
-        self._res: List[Dict] = []
-        self._hashkey = ''
-        self._filter_params = {}
-        self._rlock = RLock()
-        lock_methods = [
+        self._key_generations = 'generations'
+        self._key_predicates = 'predicates'
+        self._key_fresh = 'fresh'
+        wrapped_methods = [
             self.is_enabled_cache,
             self.clear,
             self.delete_cache_table,
+            self.is_stale,
+            self.lookup,
             self._getitem_,
             self._setitem_,
             self._delitem_,
-            self.filter,
-            self.get,
-            self.insert,
-            self.update,
-            self.delete
+            self._get_records,
+            self._insert_record,
+            self._update_records,
+            self._delete_records
         ]
-        for method in lock_methods:
+        for method in wrapped_methods:
             setattr(
                 self, method.__name__, 
-                SyncLockDecorator(method, self._rlock)
+                RedisErrorDecorator(method)
             )
+        register_after_fork(self._after_fork)
             
+    def _after_fork(self):
+        """
+            В дочернем процессе создается свой пул соединений.
+        """
+        orphan(self._pool)
+        self._pool = redis.ConnectionPool(**self._conn.get_conn())
+        self._redis = redis.StrictRedis(
+            decode_responses=True, 
+            connection_pool=self._pool
+        )
+
     def __del__(self):
         if self._pool:
             self._pool.close()
@@ -113,58 +152,164 @@ class RedisCache(BaseCache):
         """ 
         self._redis.flushdb()
 
-    def delete_cache_table(self, table: str) -> bool:
+    def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
         """Удаление кеша по таблице. Вседу, где использовалась таблица.
             Не связан с конкретным запросом.
 
         Args:
             table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
         
         Returns:
             bool: Флаг успешности.
         """
+        if self._versioned_keys:
+            self._redis.incr(f'{self._key_generations}:{table}')
         hashes = self._redis.lrange(f'{self._key_tables}:{table}', 0, -1)
         if not hashes:
-            return False
-        for hashkey in hashes:
-            _hashkey = hashkey.decode()
-            self._redis.delete(f'{self._key_queries}:{_hashkey}')
+            return self._versioned_keys
+        hashes = [hashkey.decode() for hashkey in hashes]
+        if predicates is not None:
+            hashes = self._get_overlapping_hashes(hashes, table, predicates)
+        for _hashkey in hashes:
+            self._redis.delete(
+                f'{self._key_queries}:{_hashkey}', f'{self._key_predicates}:{_hashkey}',
+                f'{self._key_fresh}:{_hashkey}'
+            )
             self._delete_hashkey_in_tables(_hashkey)
         return True
 
-    def __getitem__(self, query: str) -> 'BaseCache':
-        """Устанавливает контекст SQL запроса.
+    def _get_overlapping_hashes(
+        self, hashes: List[str], table: str, predicates: List[Dict]
+    ) -> List[str]:
+        """Хеши запросов, условия которых могут пересечься с измененными записями.
+
+        Args:
+            hashes (List[str]): Хеши запросов с таблицей.
+            table (str): Название таблицы.
+            predicates (List[Dict]): Условия измененных записей.
+
+        Returns:
+            List[str]: Хеши запросов.
+        """
+        values = self._redis.mget([
+            f'{self._key_predicates}:{hashkey}' for hashkey in hashes
+        ])
+        return [
+            hashkey for hashkey, value in zip(hashes, values)
+            if any_overlap(json.loads(value).get(table) if value else None, predicates)
+        ]
+
+    def is_enabled_negative_cache(self) -> bool:
+        """
+            Сохраняются ли в кеш пустые результаты запросов.
+        """
+        return self._negative_ttl > 0
+
+    def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. Отличает сохраненный пустой результат 
+            от отсутствия запроса в кеше.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата 
+                или ничего, если запроса нет в кеше.
+        """
+        hashkey = self._get_hashkey(query)
+        records = self._load_records(hashkey)
+        if records is None and not self._is_versioned(query):
+            self._delete_hashkey_in_tables(hashkey)
+        return records
+
+    def is_stale(self, query: str) -> bool:
+        """Запись запроса устарела, но еще отдается из кеша до фонового обновления.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """
+        if not self._stale_ttl:
+            return False
+        hashkey = self._get_hashkey(query)
+        return not self._redis.exists(f'{self._key_fresh}:{hashkey}')
+
+    def __getitem__(self, query: str) -> CacheHandle:
+        """Данные SQL запроса в кеше.
 
         Args:
             query (str): SQL Запрос.
 
         Returns:
-            BaseCache: Кеш.
+            CacheHandle: Данные запроса.
         """
         return self._getitem_(query)
     
-    def _getitem_(self, query: str) -> 'BaseCache':
-        self._res = []
-        self._hashkey = self._get_hashkey_query(query)
-        res_str = self._redis.get(f'{self._key_queries}:{self._hashkey}')
-        if res_str:
-            self._res = json.loads(res_str)
-        else:
-            self._delete_hashkey_in_tables(self._hashkey)
-        return self
-    
-    def get(self) -> Union[List[Dict], List]:
+    def _getitem_(self, query: str) -> CacheHandle:
+        return CacheHandle(self, query, self._get_hashkey(query))
+
+    def _load_records(self, hashkey: str) -> Optional[List[Dict]]:
+        """Загружает записи запроса из redis.
+
+        Args:
+            hashkey (str): Ключ запроса.
+
+        Returns:
+            Optional[List[Dict]]: Записи или ничего, если запроса нет в кеше.
+        """
+        res_str = self._redis.get(f'{self._key_queries}:{hashkey}')
+        if not res_str:
+            return None
+        return json.loads(res_str)
+
+    def _save_records(self, hashkey: str, records: List[Dict]):
+        """Сохраняет измененные записи запроса, не меняя время жизни ключа.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи.
+        """
+        self._redis.set(
+            f'{self._key_queries}:{hashkey}', self._encode_data(records), keepttl=True
+        )
+
+    def _check_filter(self, hashkey: str, params: Dict):
+        """Поля условия проверяются при чтении записей, 
+            чтобы не загружать запрос из redis лишний раз.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            params (Dict): Условие выборки.
+        """
+
+    def _get_records(self, hashkey: str, params: Dict) -> Union[List[Dict], List]:
         """Получение данных из кеша по условию или без условия.
 
+        Args:
+            hashkey (str): Ключ запроса.
+            params (Dict): Условие выборки.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
         Returns:
             Union[List[Dict], List]: Записи или пустой список.
         """
-        if not self._filter_params:
-            return self._res
-        else:
-            data = list(self._filtered_data(self._filter_params))
-            self._filter_params.clear()
-            return data
+        records = self._load_records(hashkey)
+        if records is None:
+            if not self._versioned_keys:
+                self._delete_hashkey_in_tables(hashkey)
+            records = []
+        if not params:
+            return records
+        if not self._check_fields_in_cache(records, list(params.keys())):
+            raise NoMatchFieldInCache()
+        return list(self._filtered_data(records, params))
 
     def __setitem__(self, query: str, data: List[Dict]):
         """Сохранить в кеш данные.
@@ -176,10 +321,38 @@ class RedisCache(BaseCache):
         return self._setitem_(query, data)
 
     def _setitem_(self, query: str, data: List[Dict]):
-        hashkey = self._get_hashkey_query(query)
-        tables = self._get_tables_from_fields(data)
-        self._save_hashkey_in_tables(tables, hashkey)
-        self._redis.set(f'{self._key_queries}:{hashkey}', self._encode_data(data))
+        # пустой результат без таблиц нельзя удалить при их изменение
+        if not data and not (self._negative_ttl and getattr(query, 'tables', None)):
+            return None
+        if not self._is_cached(query):
+            return None
+        hashkey = self._get_hashkey(query)
+        expire, fresh_expire = self._get_expire(query, not data)
+        if not self._is_versioned(query):
+            tables = self._get_tables_from_fields(data) if data else list(query.tables)
+            self._save_hashkey_in_tables(tables, hashkey)
+            self._save_predicates(hashkey, getattr(query, 'predicates', None), expire)
+        self._redis.set(f'{self._key_queries}:{hashkey}', self._encode_data(data), ex=expire)
+        if self._stale_ttl:
+            self._redis.set(f'{self._key_fresh}:{hashkey}', 1, ex=fresh_expire)
+
+    def _save_predicates(
+        self, hashkey: str, predicates: Optional[Dict[str, Dict]], 
+        expire: Optional[int] = None
+    ):
+        """Сохраняет условия выборки запроса по таблицам.
+
+        Args:
+            hashkey (str): Хеш от запроса.
+            predicates (Optional[Dict[str, Dict]]): Условия выборки по таблицам.
+            expire (Optional[int], optional): Время жизни в секундах. По умолчанию - не истекают.
+        """
+        if predicates is None:
+            self._redis.delete(f'{self._key_predicates}:{hashkey}')
+        else:
+            self._redis.set(
+                f'{self._key_predicates}:{hashkey}', json.dumps(predicates), ex=expire
+            )
 
     def __delitem__(self, query: str):
         """Удаление из кеша данных.
@@ -190,51 +363,41 @@ class RedisCache(BaseCache):
         return self._delitem_(query)
 
     def _delitem_(self, query: str):
-        hashkey = self._get_hashkey_query(query)
-        self._redis.delete(f'{self._key_queries}:{hashkey}')
-        self._delete_hashkey_in_tables(hashkey)
-
-    def filter(self, params: Dict) -> 'BaseCache':
-        """Условие для выборки записей в кеше.
-        Выборка учитывает точное совпадение значений.
-        
-        Args:
-            Название полей для выборки. К примеру: `.filter({'person.id': 1, 'person.name': 'Anton'})`
-                Название таблицы: person
-                Название поля: id
+        hashkey = self._get_hashkey(query)
+        self._redis.delete(
+            f'{self._key_queries}:{hashkey}', f'{self._key_predicates}:{hashkey}',
+            f'{self._key_fresh}:{hashkey}'
+        )
+        if not self._is_versioned(query):
+            self._delete_hashkey_in_tables(hashkey)
 
-        Returns:
-            BaseCache: Кеш.
-        """
-        if not self._check_fields_in_cache(list(params.keys())):
-            raise NoMatchFieldInCache()
-        self._filter_params.clear()
-        self._filter_params.update(params)
-        return self
-        
-    def insert(self, record: Dict) -> Optional[Dict]:
+    def _insert_record(self, hashkey: str, query: str, record: Dict) -> Optional[Dict]:
         """Добавление записи к кеш.
 
         Args:
-            params (Dict): Запись.
+            hashkey (str): Ключ запроса.
+            query (str): SQL запрос.
+            record (Dict): Запись.
             
         Raises:
             NoMatchFieldInCache: Нет такого поля.
         """
-        if not self._check_fields_identity(list(record.keys())):
+        records = self._load_records(hashkey)
+        if not self._check_fields_identity(records or [], list(record.keys())):
             raise NoMatchFieldInCache()
-        if not self._redis.exists(f'{self._key_queries}:{self._hashkey}'):
-            return None
-        self._res.append(record)
-        self._redis.set(f'{self._key_queries}:{self._hashkey}', self._encode_data(self._res))
+        records.append(record)
+        self._save_records(hashkey, records)
         return record
 
-    def update(self, params: Dict) -> Union[List[Dict], List]:
+    def _update_records(
+        self, hashkey: str, filter_params: Dict, params: Dict
+    ) -> Union[List[Dict], List]:
         """Обновление записей в кеше по условию.
         
         Args:
-            Название полей для обновления. К примеру: `.filter({'person.id': 1}).update({'person.name': 'Anton'})`
-                либо `.update(**params)`
+            hashkey (str): Ключ запроса.
+            filter_params (Dict): Условие выборки.
+            params (Dict): Новые значения полей.
                 
         Raises:
             NoMatchFieldInCache: Нет такого поля.
@@ -242,38 +405,34 @@ class RedisCache(BaseCache):
         Returns:
             Union[List[Dict], List]: Обновленные записи или пустой список.
         """
-        if not self._check_fields_in_cache(list(params.keys())):
+        records = self._load_records(hashkey)
+        if not self._check_fields_in_cache(records or [], list(params.keys())):
             raise NoMatchFieldInCache()
         updateted_records = []
-        if not self._redis.exists(f'{self._key_queries}:{self._hashkey}'):
-            self._filter_params.clear()
-            return updateted_records
-        for record in self._filtered_data(self._filter_params):
-            record.update(params)
-            updateted_records.append(record)
-        self._redis.set(f'{self._key_queries}:{self._hashkey}', self._encode_data(self._res))
-        self._filter_params.clear()
+        for i in self._get_index_records(records, filter_params):
+            records[i].update(params)
+            updateted_records.append(records[i])
+        self._save_records(hashkey, records)
         return updateted_records
 
-    def delete(self) -> Union[List[Dict], List]:
+    def _delete_records(self, hashkey: str, filter_params: Dict) -> Union[List[Dict], List]:
         """Удаление записей из кеша по условию.
         
         Args:
-            Название полей для обновления. К примеру: `.filter({'person.id': 1}).delete()`
+            hashkey (str): Ключ запроса.
+            filter_params (Dict): Условие выборки.
 
         Returns:
             Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
         """
-        deleted = []
-        if not self._redis.exists(f'{self._key_queries}:{self._hashkey}'):
-            self._res = []
-            self._filter_params.clear()
-            return deleted
-        for i in self._get_index_records(self._filter_params):
-            deleted.append(self._res[i])
-            del self._res[i]
-        self._redis.set(f'{self._key_queries}:{self._hashkey}', self._encode_data(self._res))
-        self._filter_params.clear()
+        records = self._load_records(hashkey)
+        if records is None:
+            return []
+        positions = list(self._get_index_records(records, filter_params))
+        deleted = [records[i] for i in positions]
+        for i in reversed(positions):
+            del records[i]
+        self._save_records(hashkey, records)
         return deleted
     
     def _get_data_query(self, query: str) -> Union[List[List], List]:
@@ -310,25 +469,73 @@ class RedisCache(BaseCache):
         hashkey = self._get_hashkey_query(query)
         self._redis.delete(f'{self._key_queries}:{hashkey}')
     
-    def _get_struct_tables(self) -> Optional[Dict[str, List[str]]]:
+    def _publish(self, channel: str, message: str):
+        """Отправляет сообщение в канал redis.
+
+        Args:
+            channel (str): Канал.
+            message (str): Сообщение.
+        """
+        self._redis.publish(channel, message)
+
+    def _subscribe(
+        self, channel: str, 
+        handler: Callable[[Dict], None],
+        exception_handler: Callable[[Exception, PubSub, PubSubWorkerThread], None]
+    ) -> PubSubWorkerThread:
+        """Подписка на канал redis. Сообщения обрабатываются в фоновом потоке.
+
+        Args:
+            channel (str): Канал.
+            handler (Callable[[Dict], None]): Обработчик сообщений.
+            exception_handler (Callable[[Exception, PubSub, PubSubWorkerThread], None]): Обработчик 
+                ошибок соединения.
+
+        Returns:
+            PubSubWorkerThread: Поток подписки.
+        """
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: handler})
+        return pubsub.run_in_thread(
+            sleep_time=1, daemon=True, exception_handler=exception_handler
+        )
+
+    def _get_struct_tables(self, version: str = '') -> Optional[Dict[str, List[str]]]:
         """Получение из кеша структуры таблиц.
+        
+        Args:
+            version (str, optional): Версия схемы БД. Структура другой версии считается устаревшей.
 
         Returns:
             Optional[Dict[str, List[str]]]: Структура таблиц.
         """        
-        res = self._redis.get(self._key_struct)
+        res = self._redis.get(self._get_struct_key(version))
         if not res:
             return None 
         return json.loads(res)
         
-    def _save_struct_tables(self, struct: Dict[str, List[str]]):
+    def _save_struct_tables(self, struct: Dict[str, List[str]], version: str = ''):
         """Сохранение в кеше структуры таблиц.
 
         Args:
             struct (Dict[str, List[str]]): Структура таблиц.
+            version (str, optional): Версия схемы БД.
         """        
         res = json.dumps(struct)
-        self._redis.set(self._key_struct, res)
+        self._redis.set(self._get_struct_key(version), res)
+    
+    def _get_struct_key(self, version: str = '') -> str:
+        """Ключ структуры таблиц с учетом версии схемы БД.
+
+        Args:
+            version (str, optional): Версия схемы БД.
+
+        Returns:
+            str: Ключ.
+        """        
+        if not version:
+            return self._key_struct
+        return f'{self._key_struct}:{version}'
     
     def _encode_data(self, data: List[Dict]) -> str:
         """Кодирование данных перед отправкой в редис.
@@ -355,53 +562,49 @@ class RedisCache(BaseCache):
                 return super().default(o)
         return json.dumps(data, cls=Encoder)
     
-    def _get_index_records(self, params: Dict) -> Iterator[int]:
+    def _get_index_records(self, records: List[Dict], params: Dict) -> Iterator[int]:
         """Получение индексов записей в кеше.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             params (Dict): Параметры выборки.
 
         Yields:
             Iterator: Индекс.
         """
-        for i, record in enumerate(self._res):
-            common_values = record.items() & params.items()
-            if len(params.keys()) == len(common_values):
-                yield i
+        yield from scan(records, params)
     
-    def _check_fields_identity(self, keys: List) -> bool:
+    def _check_fields_identity(self, records: List[Dict], keys: List) -> bool:
         """Проверить чтобы список полей был идентичен.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             keys (List): Список полей.
 
         Returns:
             bool: Флаг.
         """        
-        for record in self._res:
+        for record in records:
             common_values = set(record.keys()) & set(keys)
             if len(common_values) == len(record.keys()):
                 return True
             break
         return False
     
-    def _check_fields_in_cache(self, keys: List) -> bool:
+    def _check_fields_in_cache(self, records: List[Dict], keys: List) -> bool:
         """Проверить поля на существование в записи кеша.
 
         Args:
-            hashkey (str): Ключ запроса.
+            records (List[Dict]): Записи запроса.
             keys (List): Список полей.
 
         Returns:
             bool: Флаг.
         """        
-        for record in self._res:
-            common_values = set(record.keys()) & set(keys)
-            if len(common_values) == len(keys):
-                return True
-            break
+        # у поля может быть оператор фильтрации
+        fields = {split_operator(key)[0] for key in keys}
+        for record in records:
+            return fields <= record.keys()
         return False
     
     def _save_hashkey_in_tables(
@@ -433,19 +636,18 @@ class RedisCache(BaseCache):
                 tables.add(table_field[0])
         return list(tables)
     
-    def _filtered_data(self, params: Dict) -> Iterator[Dict]:
+    def _filtered_data(self, records: List[Dict], params: Dict) -> Iterator[Dict]:
         """Фильтрация данных.
 
         Args:
+            records (List[Dict]): Записи запроса.
             params (Dict): Параметры фильтрации.
 
         Yields:
             Iterator: Отфильтрованный элемент из кеша.
         """        
-        for record in self._res:
-            common_values = record.items() & params.items()
-            if len(params.keys()) == len(common_values):
-                yield record
+        for i in scan(records, params):
+            yield records[i]
     
     def _delete_hashkey_in_tables(self, hashkey: str):
         """ Удаление hashkey из таблиц. """
@@ -455,6 +657,70 @@ class RedisCache(BaseCache):
             _, _table = _table.split(':')
             self._redis.lrem(f'{self._key_tables}:{_table}', 0, hashkey)
     
+    def _is_cached(self, query: str) -> bool:
+        """Кешируется ли запрос. Как и в CacheQuery, при времени кеша по таблицам
+            запросы таблиц, которых нет в словаре, не кешируются.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+
+        Returns:
+            bool: Флаг.
+        """
+        return not isinstance(self._ttl, dict) or query_ttl(self._ttl, query) > 0
+
+    def _get_expire(
+        self, query: str, empty: bool = False
+    ) -> Tuple[Optional[int], Optional[int]]:
+        """Время жизни ключей запроса в redis.
+            Ключ запроса живет ttl + stale_ttl, а отметка свежести - только ttl.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+            empty (bool, optional): Пустой результат запроса. Живет не больше negative_ttl.
+
+        Returns:
+            Tuple[Optional[int], Optional[int]]: Время жизни ключа запроса 
+                и отметки свежести. Ничего, если ключ не истекает.
+        """
+        ttl = query_ttl(self._ttl, query)
+        if empty:
+            ttl = min(ttl, self._negative_ttl) if ttl > 0 else self._negative_ttl
+        if ttl <= 0:
+            return None, None
+        return ttl + self._stale_ttl, ttl
+
+    def _is_versioned(self, query: str) -> bool:
+        """Ключ запроса включает поколения таблиц.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """        
+        return self._versioned_keys and bool(getattr(query, 'tables', None))
+
+    def _get_hashkey(self, query: str) -> str:
+        """Получение ключа запроса. Если запрос передан с таблицами,
+            в ключ добавляются поколения таблиц.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+
+        Returns:
+            str: Ключ запроса.
+        """        
+        if not self._is_versioned(query):
+            return self._get_hashkey_query(query)
+        values = self._redis.mget([
+            f'{self._key_generations}:{table}' for table in query.tables
+        ])
+        generations = ','.join(
+            f'{table}:{int(value or 0)}' for table, value in zip(query.tables, values)
+        )
+        return hash_key(f'{query_hashkey(query)}|{generations}')
+
     def _get_hashkey_query(self, query: str) -> str:
         """Получение кеша от запроса.
 
@@ -464,6 +730,4 @@ class RedisCache(BaseCache):
         Returns:
             str: Хеш от запроса.
         """        
-        query = query.strip().lower().replace(" ", "")
-        hash_object = hashlib.sha256(query.encode('utf-8'))
-        return hash_object.hexdigest()
\ No newline at end of file
+        return query_hashkey(query)
\ No newline at end of file
@@ -0,0 +1,567 @@
+import time
+import pickle
+import logging
+from typing import Union, List, Dict, Optional, Iterator, Tuple, Any
+from query_tables.cache import BaseCache, TypeCache
+from query_tables.cache.handle import CacheHandle
+from query_tables.cache.index import scan, split_operator
+from query_tables.cache.predicates import any_overlap
+from query_tables.cache.ttl import query_ttl, is_ttl_enabled
+from query_tables.cache.keys import query_hashkey
+from query_tables.cache.shared_store import SharedStore
+from query_tables.exceptions import NotQuery, NoMatchFieldInCache
+
+logger = logging.getLogger(__name__)
+
+# Запросы таблицы хранятся группами по первым символам хеша запроса,
+# чтобы при сохранение запроса перезаписывать небольшую группу, а не весь список.
+TABLE_BUCKET_CHARS = 2
+# Число запросов в группе, начиная с которого из нее убираются вытесненные запросы.
+PRUNE_TABLE_KEYS = 16
+
+
+class SharedMemoryCache(BaseCache):
+    """
+        Кеширование данных в общей памяти процессов одного хоста.
+        Воркеры хоста читают одну копию записей без запросов к redis,
+        а запрос, сохраненный одним воркером, не выполняется в БД остальными.
+        Изменение таблицы в любом процессе удаляет ее запросы для всех процессов.
+    """
+
+    type_cache = TypeCache.local
+
+    def __init__(
+        self, path: str,
+        ttl: Union[int, Dict[str, int]] = 0,
+        non_expired: bool = False,
+        size: int = 64 * 1024 * 1024,
+        slots: int = 65536,
+        negative_ttl: int = 0
+    ):
+        """
+        Args:
+            path (str): Путь к файлу общей памяти, например `/dev/shm/query_tables`.
+                Процессы с одним путем используют один кеш.
+            ttl (Union[int, Dict[str, int]], optional): Время кеша запроса. По умолчанию 0 секунд - кеширование отключено.
+                Можно задать время по таблицам: `{'country': 86400, 'orders': 5}`. Запрос с несколькими
+                таблицами живет наименьшее из их времен, таблицы не из словаря не кешируются.
+            non_expired (bool, optional): Если нужен кеш без истечения времени.
+            size (int, optional): Размер памяти под записи в байтах. Когда она заполнена,
+                вытесняются самые старые запросы.
+            slots (int, optional): Наибольшее число ключей в кеше.
+            negative_ttl (int, optional): Время жизни пустых результатов запросов с таблицами.
+                Не больше ttl запроса, а в кеше без истечения времени - ровно negative_ttl.
+                По умолчанию 0 - пустые результаты не кешируются.
+        """
+        self._ttl = ttl
+        self._non_expired = non_expired
+        self._negative_ttl = negative_ttl
+        self._store = SharedStore(path, size, slots)
+        self._key_queries = 'queries'
+        self._key_data = 'data'
+        self._key_tables = 'tables'
+        self._key_struct = 'struct_tables'
+        self._key_predicates = 'predicates'
+
+    def __del__(self):
+        store = getattr(self, '_store', None)
+        if store is not None:
+            store.close()
+
+    def is_enabled_cache(self) -> bool:
+        """
+            Включен ли кеш.
+        """
+        return self._non_expired or is_ttl_enabled(self._ttl)
+
+    def is_enabled_negative_cache(self) -> bool:
+        """
+            Сохраняются ли в кеш пустые результаты запросов.
+        """
+        return self._negative_ttl > 0 and self.is_enabled_cache()
+
+    def clear(self):
+        """
+            Очищение кеша для всех процессов.
+        """
+        if self.is_enabled_cache():
+            self._store.clear()
+
+    def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
+        """Удаление кеша по таблице. Вседу, где использовалась таблица.
+
+        Args:
+            table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        with self._store.lock():
+            buckets = self._load(f'{self._key_tables}:{table}')
+            if not buckets:
+                return False
+            for bucket in buckets:
+                key = f'{self._key_tables}:{table}:{bucket}'
+                hashkeys = self._load(key) or set()
+                for hashkey in list(hashkeys):
+                    if predicates is not None and not any_overlap(
+                        (self._load(f'{self._key_predicates}:{hashkey}') or {}).get(table),
+                        predicates
+                    ):
+                        continue
+                    self._store.delete(f'{self._key_queries}:{hashkey}')
+                    self._store.delete(f'{self._key_predicates}:{hashkey}')
+                    hashkeys.discard(hashkey)
+                self._save(key, hashkeys, keep=True)
+        return True
+
+    def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. Отличает сохраненный пустой результат
+            от отсутствия запроса в кеше.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата
+                или ничего, если запроса нет в кеше.
+        """
+        if not query:
+            raise NotQuery()
+        if not self.is_enabled_cache():
+            return None
+        return self._load_records(self._get_hashkey(query))
+
+    def __getitem__(self, query: str) -> CacheHandle:
+        """Данные SQL запроса в кеше.
+
+        Args:
+            query (str): SQL Запрос.
+
+        Returns:
+            CacheHandle: Данные запроса.
+        """
+        if not query:
+            raise NotQuery()
+        return self._getitem_(query)
+
+    def _getitem_(self, query: str) -> CacheHandle:
+        return CacheHandle(self, query, self._get_hashkey(query))
+
+    def _load_records(self, hashkey: str) -> Optional[List[Dict]]:
+        """Загружает записи запроса из общей памяти.
+
+        Args:
+            hashkey (str): Ключ запроса.
+
+        Returns:
+            Optional[List[Dict]]: Записи или ничего, если запроса нет в кеше.
+        """
+        entry = self._load(f'{self._key_queries}:{hashkey}')
+        if entry is None:
+            return None
+        return entry[1]
+
+    def _save_records(self, hashkey: str, records: List):
+        """Сохраняет измененные записи запроса, не меняя время жизни ключа.
+            Вызывается под блокировкой хранилища.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            records (List): Записи.
+        """
+        key = f'{self._key_queries}:{hashkey}'
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        tables = pickle.loads(entry[0])[0]
+        self._save_query(hashkey, tables, list(records), entry[1])
+
+    def _save_query(self, hashkey: str, tables: List[str], records: List, expires: float) -> bool:
+        """Сохраняет записи запроса вместе с его таблицами.
+            Вызывается под блокировкой хранилища.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            tables (List[str]): Таблицы запроса.
+            records (List): Записи.
+            expires (float): Время истечения по `time.time()`. 0 - не истекает.
+
+        Returns:
+            bool: Сохранены ли записи.
+        """
+        if not self._save(f'{self._key_queries}:{hashkey}', (tables, records), expires):
+            return False
+        # списки запросов таблиц сохраняются после запроса, чтобы быть новее него
+        if not self._save_hashkey_in_tables(tables, hashkey):
+            self._store.delete(f'{self._key_queries}:{hashkey}')
+            self._store.delete(f'{self._key_predicates}:{hashkey}')
+            return False
+        return True
+
+    def _check_filter(self, hashkey: str, params: Dict):
+        """Поля условия проверяются при чтении записей,
+            чтобы не загружать запрос из общей памяти лишний раз.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            params (Dict): Условие выборки.
+        """
+
+    def _get_records(self, hashkey: str, params: Dict) -> Union[List[Dict], List]:
+        """Получение данных из кеша по условию или без условия.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            params (Dict): Условие выборки.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            Union[List[Dict], List]: Записи или пустой список.
+        """
+        if not self.is_enabled_cache():
+            return []
+        records = self._load_records(hashkey)
+        if records is None:
+            return []
+        if not params:
+            return records
+        if not self._check_fields_in_cache(records, list(params.keys())):
+            raise NoMatchFieldInCache()
+        return list(self._filtered_data(records, params))
+
+    def __setitem__(self, query: str, data: List[Dict]):
+        """Сохранить в кеш данные.
+
+        Args:
+            query (str): SQL запрос.
+            data (List[Dict]): Результирующие данные из БД.
+        """
+        return self._setitem_(query, data)
+
+    def _setitem_(self, query: str, data: List[Dict]):
+        if not self.is_enabled_cache():
+            return None
+        # пустой результат без таблиц нельзя удалить при их изменение
+        if not data and not (self._negative_ttl and getattr(query, 'tables', None)):
+            return None
+        hashkey = self._get_hashkey(query)
+        ttl = query_ttl(self._ttl, query)
+        if not data:
+            ttl = self._negative_ttl if self._non_expired else min(ttl, self._negative_ttl)
+        if not self._non_expired and ttl <= 0:
+            return self._delitem_(query)
+        # пустой результат истекает и в кеше без времени жизни
+        expires = 0 if self._non_expired and data else time.time() + ttl
+        tables = self._get_tables_from_fields(data) if data else list(query.tables)
+        predicates = getattr(query, 'predicates', None)
+        with self._store.lock():
+            if predicates is None:
+                self._store.delete(f'{self._key_predicates}:{hashkey}')
+            else:
+                self._save(f'{self._key_predicates}:{hashkey}', predicates, expires)
+            if not self._save_query(hashkey, tables, list(data), expires):
+                logger.debug(f"Результат запроса не поместился в память кеша: {hashkey}")
+
+    def __delitem__(self, query: str):
+        """Удаление из кеша данных.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        return self._delitem_(query)
+
+    def _delitem_(self, query: str):
+        hashkey = self._get_hashkey(query)
+        with self._store.lock():
+            self._store.delete(f'{self._key_queries}:{hashkey}')
+            self._store.delete(f'{self._key_predicates}:{hashkey}')
+
+    def _insert_record(self, hashkey: str, query: str, record: Dict) -> Optional[Dict]:
+        """Добавление записи к кеш.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            query (str): SQL запрос.
+            record (Dict): Запись.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+        """
+        with self._store.lock():
+            records = self._load_records(hashkey)
+            if not self._check_fields_identity(records or [], list(record.keys())):
+                raise NoMatchFieldInCache()
+            records.append(record)
+            self._save_records(hashkey, records)
+        return record
+
+    def _update_records(
+        self, hashkey: str, filter_params: Dict, params: Dict
+    ) -> Union[List[Dict], List]:
+        """Обновление записей в кеше по условию.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            filter_params (Dict): Условие выборки.
+            params (Dict): Новые значения полей.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            Union[List[Dict], List]: Обновленные записи или пустой список.
+        """
+        with self._store.lock():
+            records = self._load_records(hashkey)
+            if not self._check_fields_in_cache(records or [], list(params.keys())):
+                raise NoMatchFieldInCache()
+            updateted_records = []
+            for i in self._get_index_records(records, filter_params):
+                records[i].update(params)
+                updateted_records.append(records[i])
+            self._save_records(hashkey, records)
+        return updateted_records
+
+    def _delete_records(self, hashkey: str, filter_params: Dict) -> Union[List[Dict], List]:
+        """Удаление записей из кеша по условию.
+
+        Args:
+            hashkey (str): Ключ запроса.
+            filter_params (Dict): Условие выборки.
+
+        Returns:
+            Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
+        """
+        with self._store.lock():
+            records = self._load_records(hashkey)
+            if records is None:
+                return []
+            positions = list(self._get_index_records(records, filter_params))
+            deleted = [records[i] for i in positions]
+            for i in reversed(positions):
+                del records[i]
+            self._save_records(hashkey, records)
+        return deleted
+
+    def _get_data_query(self, query: str) -> Union[List[Tuple], List]:
+        """Получает данные из произвольного запроса.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Union[List[List], List]: Данные.
+        """
+        if not self.is_enabled_cache():
+            return []
+        return self._load(f'{self._key_data}:{self._get_hashkey_query(query)}') or []
+
+    def _save_data_query(self, query: str, data: List[Tuple]):
+        """Сохраняет даннные произвольного запроса в кеш.
+
+        Args:
+            query (str): SQL запрос.
+            data (List[Tuple]): Данные.
+        """
+        if not self.is_enabled_cache():
+            return None
+        ttl = query_ttl(self._ttl, query)
+        if not self._non_expired and ttl <= 0:
+            return self._delete_data_query(query)
+        expires = 0 if self._non_expired else time.time() + ttl
+        self._save(f'{self._key_data}:{self._get_hashkey_query(query)}', list(data), expires)
+
+    def _delete_data_query(self, query: str):
+        """Удаляет даннные произвольного запроса из кеша.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        self._store.delete(f'{self._key_data}:{self._get_hashkey_query(query)}')
+
+    def _get_struct_tables(self, version: str = '') -> Optional[Dict[str, List[str]]]:
+        """Получение из кеша структуры таблиц.
+
+        Args:
+            version (str, optional): Версия схемы БД. Структура другой версии считается устаревшей.
+
+        Returns:
+            Optional[Dict[str, List[str]]]: Структура таблиц.
+        """
+        return self._load(f'{self._key_struct}:{version}')
+
+    def _save_struct_tables(self, struct: Dict[str, List[str]], version: str = ''):
+        """Сохранение в кеше структуры таблиц.
+
+        Args:
+            struct (Dict[str, List[str]]): Структура таблиц.
+            version (str, optional): Версия схемы БД.
+        """
+        self._save(f'{self._key_struct}:{version}', struct)
+
+    def _load(self, key: str) -> Optional[Any]:
+        """Значение ключа из общей памяти.
+
+        Args:
+            key (str): Ключ.
+
+        Returns:
+            Optional[Any]: Значение или ничего, если ключа нет.
+        """
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        return pickle.loads(entry[0])
+
+    def _save(self, key: str, value: Any, expires: float = 0, keep: bool = False) -> bool:
+        """Сохраняет значение ключа в общую память.
+
+        Args:
+            key (str): Ключ.
+            value (Any): Значение.
+            expires (float, optional): Время истечения по `time.time()`. 0 - не истекает.
+            keep (bool, optional): Значение не вытесняется из ячейки другими ключами.
+
+        Returns:
+            bool: Сохранено ли значение.
+        """
+        return self._store.set(
+            key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires, keep
+        )
+
+    def _save_hashkey_in_tables(self, tables: List[str], hashkey: str) -> bool:
+        """Сохраняет для каждой таблицы хеш запроса.
+            Вызывается под блокировкой хранилища после сохранения запроса.
+            Списки перезаписываются при каждом сохранение запроса, поэтому они новее
+            всех своих запросов и вытесняются из общей памяти только после них.
+        (В каком запросе участвовала таблица)
+        Args:
+            hashkey (str): Хеш от запроса.
+            tables (List[str]): Список названий таблиц.
+
+        Returns:
+            bool: Сохранены ли списки.
+        """
+        bucket = hashkey[:TABLE_BUCKET_CHARS]
+        for table in tables:
+            key = f'{self._key_tables}:{table}:{bucket}'
+            hashkeys = self._load(key) or set()
+            hashkeys.add(hashkey)
+            count = len(hashkeys)
+            # вытесненные и истекшие запросы убираются, когда группа удваивается
+            if count >= PRUNE_TABLE_KEYS and not count & (count - 1):
+                hashkeys = {
+                    _hashkey for _hashkey in hashkeys
+                    if self._store.get(f'{self._key_queries}:{_hashkey}') is not None
+                }
+            buckets = self._load(f'{self._key_tables}:{table}') or set()
+            buckets.add(bucket)
+            if not (
+                self._save(key, hashkeys, keep=True)
+                and self._save(f'{self._key_tables}:{table}', buckets, keep=True)
+            ):
+                return False
+        return True
+
+    def _get_index_records(self, records: List[Dict], params: Dict) -> Iterator[int]:
+        """Получение индексов записей в кеше.
+
+        Args:
+            records (List[Dict]): Записи запроса.
+            params (Dict): Параметры выборки.
+
+        Yields:
+            Iterator: Индекс.
+        """
+        yield from scan(records, params)
+
+    def _check_fields_identity(self, records: List[Dict], keys: List) -> bool:
+        """Проверить чтобы список полей был идентичен.
+
+        Args:
+            records (List[Dict]): Записи запроса.
+            keys (List): Список полей.
+
+        Returns:
+            bool: Флаг.
+        """
+        for record in records:
+            common_values = set(record.keys()) & set(keys)
+            if len(common_values) == len(record.keys()):
+                return True
+            break
+        return False
+
+    def _check_fields_in_cache(self, records: List[Dict], keys: List) -> bool:
+        """Проверить поля на существование в записи кеша.
+
+        Args:
+            records (List[Dict]): Записи запроса.
+            keys (List): Список полей.
+
+        Returns:
+            bool: Флаг.
+        """
+        # у поля может быть оператор фильтрации
+        fields = {split_operator(key)[0] for key in keys}
+        for record in records:
+            return fields <= record.keys()
+        return False
+
+    def _filtered_data(self, records: List[Dict], params: Dict) -> Iterator[Dict]:
+        """Фильтрация данных.
+
+        Args:
+            records (List[Dict]): Записи запроса.
+            params (Dict): Параметры фильтрации.
+
+        Yields:
+            Iterator: Отфильтрованный элемент из кеша.
+        """
+        for i in scan(records, params):
+            yield records[i]
+
+    def _get_tables_from_fields(self, data: List[Dict]) -> List:
+        """Список таблиц которые участвуют в запросе.
+
+        Args:
+            data (List[Dict]): Данные из БД.
+
+        Returns:
+            List: Список названий таблиц.
+        """
+        tables = set()
+        for field in data[0].keys():
+            table_field = field.split('.')
+            # если в название поля есть таблица
+            if len(table_field) > 1:
+                tables.add(table_field[0])
+        return list(tables)
+
+    def _get_hashkey(self, query: str) -> str:
+        """Получение ключа запроса.
+
+        Args:
+            query (str): SQL запрос или QueryKey.
+
+        Returns:
+            str: Ключ запроса.
+        """
+        return query_hashkey(query)
+
+    def _get_hashkey_query(self, query: str) -> str:
+        """Получение кеша от запроса.
+
+        Args:
+            query (str): SQL Запрос.
+
+        Returns:
+            str: Хеш от запроса.
+        """
+        return query_hashkey(query)
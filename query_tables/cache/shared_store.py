@@ -0,0 +1,326 @@
+import os
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+from contextlib import contextmanager
+from threading import RLock
+from typing import Iterator, Optional, Tuple
+from query_tables.fork import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+# Начало файла общей памяти. Меняется вместе с форматом файла.
+MAGIC = b'QTSHM002'
+# Заголовок: метка, число ячеек, размер области данных,
+# начало свободного места, начало самой старой записи, занятое место.
+_HEADER = struct.Struct('<8sQQQQQ')
+# Ячейка хеш-таблицы: счетчик изменений, состояние, хеш ключа,
+# смещение записи, длина значения, время истечения (0 - не истекает).
+_SLOT = struct.Struct('<II16sQQd')
+# Запись в области данных: номер ячейки и длина значения.
+_RECORD = struct.Struct('<II')
+# Номер ячейки у записи, которая заполняет конец области данных.
+_PADDING = 0xFFFFFFFF
+
+# _KEPT - значение, которое не вытесняется из ячейки другим ключом,
+# а только из кольцевой области данных вместе с более старыми записями.
+_EMPTY, _USED, _DELETED, _KEPT = 0, 1, 2, 3
+_LIVE = (_USED, _KEPT)
+
+# Сколько ячеек подряд просматривается для одного ключа.
+PROBES = 16
+# Сколько раз читатель перечитывает ячейку, которую в этот момент изменяют.
+READ_RETRIES = 64
+
+
+class SharedStore(object):
+    """
+        Хранилище байтовых значений по ключу в файле, отображенном в память
+        всех процессов хоста. Хеш-таблица с открытой адресацией указывает
+        на записи в кольцевой области данных: новые записи вытесняют самые старые.
+        Читатели не берут блокировок: каждая ячейка защищена счетчиком изменений,
+        и прочитанное во время изменения значение перечитывается.
+        Писатели разных процессов и потоков выполняются по очереди
+        под блокировкой файла.
+    """
+
+    def __init__(self, path: str, size: int = 64 * 1024 * 1024, slots: int = 65536):
+        """
+        Args:
+            path (str): Путь к файлу. Для хранения в памяти - в `/dev/shm`.
+            size (int, optional): Размер области данных в байтах.
+            slots (int, optional): Число ячеек хеш-таблицы.
+                Размеры задаются процессом, который создает файл,
+                остальные процессы берут их из файла.
+        """
+        self._path = str(path)
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._rlock = RLock()
+        self._depth = 0 # вложенность блокировки в этом процессе
+        with self.lock():
+            if os.fstat(self._fd).st_size < _HEADER.size:
+                os.ftruncate(self._fd, _HEADER.size + slots * _SLOT.size + size)
+                os.pwrite(self._fd, _HEADER.pack(MAGIC, slots, size, 0, 0, 0), 0)
+            magic, self._slots, self._size, *_ = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+            if magic != MAGIC:
+                os.close(self._fd)
+                raise ValueError(f"Файл '{self._path}' не является файлом кеша в общей памяти.")
+        self._data_start = _HEADER.size + self._slots * _SLOT.size
+        self._mm = mmap.mmap(self._fd, self._data_start + self._size)
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            В дочернем процессе создается своя блокировка потоков.
+            Отображение файла остается общим с родителем.
+        """
+        self._rlock = RLock()
+        self._depth = 0
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+            Блокировка писателей. Повторный вход из того же потока не блокируется.
+        """
+        with self._rlock:
+            if not self._depth:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Значение по ключу без блокировки.
+
+        Args:
+            key (str): Ключ.
+
+        Returns:
+            Optional[Tuple[bytes, float]]: Значение и время истечения или ничего,
+                если ключа нет или он истек.
+        """
+        digest = _digest(key)
+        for index in self._probe(digest):
+            pos = _HEADER.size + index * _SLOT.size
+            for _ in range(READ_RETRIES):
+                seq, state, slot_digest, offset, length, expires = _SLOT.unpack_from(self._mm, pos)
+                if seq & 1:
+                    continue
+                if state not in _LIVE or slot_digest != digest:
+                    value = None
+                else:
+                    start = self._data_start + offset + _RECORD.size
+                    value = self._mm[start:start + length]
+                if _SLOT.unpack_from(self._mm, pos)[0] != seq:
+                    continue
+                if state == _EMPTY:
+                    return None
+                if value is None:
+                    break
+                if expires and expires <= time.time():
+                    return None
+                return value, expires
+            else:
+                # ячейку все время изменяют, считаем это промахом
+                return None
+        return None
+
+    def set(self, key: str, value: bytes, expires: float = 0, keep: bool = False) -> bool:
+        """Сохраняет значение по ключу.
+
+        Args:
+            key (str): Ключ.
+            value (bytes): Значение.
+            expires (float, optional): Время истечения по `time.time()`. 0 - не истекает.
+            keep (bool, optional): Значение не вытесняется из ячейки другими ключами.
+                Из области данных оно вытесняется только после всех записей, 
+                сохраненных раньше него.
+
+        Returns:
+            bool: Сохранено ли значение. Значение больше области данных не сохраняется,
+                как и значение, для которого все ячейки заняты значениями с keep.
+        """
+        digest = _digest(key)
+        with self.lock():
+            index = self._find_slot(digest)
+            if index is None:
+                return False
+            self._write_slot(index, _DELETED, digest, 0, 0, 0)
+            need = _RECORD.size + len(value)
+            if need > self._size:
+                return False
+            offset = self._allocate(need)
+            start = self._data_start + offset
+            _RECORD.pack_into(self._mm, start, index, len(value))
+            self._mm[start + _RECORD.size:start + need] = value
+            self._write_slot(
+                index, _KEPT if keep else _USED, digest, offset, len(value), expires
+            )
+            return True
+
+    def delete(self, key: str):
+        """Удаляет значение по ключу.
+
+        Args:
+            key (str): Ключ.
+        """
+        digest = _digest(key)
+        with self.lock():
+            for index in self._probe(digest):
+                _, state, slot_digest, *_ = self._read_slot(index)
+                if state == _EMPTY:
+                    return None
+                if state in _LIVE and slot_digest == digest:
+                    self._write_slot(index, _DELETED, digest, 0, 0, 0)
+                    return None
+
+    def clear(self):
+        """
+            Удаляет все значения.
+        """
+        with self.lock():
+            for index in range(self._slots):
+                if self._read_slot(index)[1] != _EMPTY:
+                    self._write_slot(index, _EMPTY, bytes(16), 0, 0, 0)
+            self._write_header(0, 0, 0)
+
+    def close(self):
+        """
+            Закрывает файл. Данные остаются для других процессов.
+        """
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+            self._mm = None
+
+    def _probe(self, digest: bytes) -> Iterator[int]:
+        """Ячейки, в которых может лежать ключ.
+
+        Args:
+            digest (bytes): Хеш ключа.
+
+        Returns:
+            Iterator[int]: Номера ячеек.
+        """
+        start = int.from_bytes(digest[:8], 'little') % self._slots
+        return (
+            (start + step) % self._slots
+            for step in range(min(PROBES, self._slots))
+        )
+
+    def _find_slot(self, digest: bytes) -> Optional[int]:
+        """Ячейка для сохранения ключа: ячейка с этим ключом, свободная или истекшая.
+            Если таких нет, вытесняется самое старое значение без keep.
+
+        Args:
+            digest (bytes): Хеш ключа.
+
+        Returns:
+            Optional[int]: Номер ячейки или ничего, если все ячейки заняты значениями с keep.
+        """
+        now = time.time()
+        free = None
+        victim = None
+        victim_age = -1
+        tail = self._read_header()[1]
+        for index in self._probe(digest):
+            _, state, slot_digest, offset, _, expires = self._read_slot(index)
+            if state in _LIVE and slot_digest == digest:
+                return index
+            if state == _EMPTY:
+                return index if free is None else free
+            if free is None and (state == _DELETED or (expires and expires <= now)):
+                free = index
+            if state == _USED:
+                # чем дальше запись от начала самых старых записей, тем она новее
+                age = self._size - (offset - tail) % self._size
+                if age > victim_age:
+                    victim, victim_age = index, age
+        return victim if free is None else free
+
+    def _allocate(self, need: int) -> int:
+        """Место для записи в кольцевой области данных.
+            Самые старые записи вытесняются, пока места не хватит.
+
+        Args:
+            need (int): Размер записи.
+
+        Returns:
+            int: Смещение записи.
+        """
+        head, tail, used = self._read_header()
+        while True:
+            if not used:
+                head = tail = 0
+            if head > tail or not used:
+                if head + need <= self._size:
+                    break
+                # конец области данных не используется, запись начнется сначала
+                if self._size - head >= _RECORD.size:
+                    _RECORD.pack_into(self._mm, self._data_start + head, _PADDING, 0)
+                used += self._size - head
+                head = 0
+                continue
+            if head + need <= tail:
+                break
+            tail, used = self._evict(tail, used)
+        self._write_header(head + need, tail, used + need)
+        return head
+
+    def _evict(self, tail: int, used: int) -> Tuple[int, int]:
+        """Вытесняет самую старую запись.
+
+        Args:
+            tail (int): Смещение самой старой записи.
+            used (int): Занятое место.
+
+        Returns:
+            Tuple[int, int]: Новые смещение самой старой записи и занятое место.
+        """
+        rest = self._size - tail
+        if rest < _RECORD.size:
+            return 0, used - rest
+        index, length = _RECORD.unpack_from(self._mm, self._data_start + tail)
+        if index == _PADDING:
+            return 0, used - rest
+        _, state, digest, offset, *_ = self._read_slot(index)
+        if state in _LIVE and offset == tail:
+            self._write_slot(index, _DELETED, digest, 0, 0, 0)
+        size = _RECORD.size + length
+        return tail + size, used - size
+
+    def _read_slot(self, index: int) -> Tuple[int, int, bytes, int, int, float]:
+        return _SLOT.unpack_from(self._mm, _HEADER.size + index * _SLOT.size)
+
+    def _write_slot(
+        self, index: int, state: int, digest: bytes,
+        offset: int, length: int, expires: float
+    ):
+        """Изменяет ячейку. Пока счетчик изменений нечетный,
+            читатели ждут или перечитывают ячейку.
+        """
+        pos = _HEADER.size + index * _SLOT.size
+        seq = _SLOT.unpack_from(self._mm, pos)[0]
+        struct.pack_into('<I', self._mm, pos, (seq + 1) & 0xFFFFFFFF)
+        _SLOT.pack_into(
+            self._mm, pos, (seq + 1) & 0xFFFFFFFF,
+            state, digest, offset, length, expires
+        )
+        struct.pack_into('<I', self._mm, pos, (seq + 2) & 0xFFFFFFFF)
+
+    def _read_header(self) -> Tuple[int, int, int]:
+        return _HEADER.unpack_from(self._mm, 0)[3:]
+
+    def _write_header(self, head: int, tail: int, used: int):
+        _HEADER.pack_into(self._mm, 0, MAGIC, self._slots, self._size, head, tail, used)
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
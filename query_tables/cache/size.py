@@ -0,0 +1,61 @@
+import sys
+from typing import Any, Dict, List
+from query_tables.cache.index import IndexedRecords
+
+# Сколько записей берется для оценки размера большого результата.
+SAMPLE_RECORDS = 64
+
+
+def estimate_size(records: List[Any]) -> int:
+    """Примерный размер записей запроса в байтах.
+        Для больших результатов размер считается по выборке записей.
+        Названия полей общие у всех записей и не учитываются.
+        У записей с индексами учитываются и индексы.
+
+    Args:
+        records (List[Any]): Записи.
+
+    Returns:
+        int: Размер в байтах.
+    """
+    size = sys.getsizeof(records)
+    if isinstance(records, IndexedRecords):
+        size += records.index_size()
+    count = len(records)
+    if not count:
+        return size
+    step = max(count // SAMPLE_RECORDS, 1)
+    sample = records[::step][:SAMPLE_RECORDS]
+    sample_size = sum(_record_size(record) for record in sample)
+    return size + sample_size * count // len(sample)
+
+
+def _record_size(record: Any) -> int:
+    """Размер записи: словаря полей или строки произвольного запроса.
+
+    Args:
+        record (Any): Запись.
+
+    Returns:
+        int: Размер в байтах.
+    """
+    if isinstance(record, dict):
+        return sys.getsizeof(record) + sum(_value_size(value) for value in record.values())
+    return _value_size(record)
+
+
+def _value_size(value: Any) -> int:
+    """Размер значения поля вместе с вложенными значениями.
+
+    Args:
+        value (Any): Значение.
+
+    Returns:
+        int: Размер в байтах.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_value_size(key) + _value_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_value_size(item) for item in value)
+    return size
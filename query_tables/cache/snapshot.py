@@ -0,0 +1,95 @@
+import os
+import io
+import zlib
+import pickle
+import logging
+import tempfile
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Начало файла снимка кеша. Меняется вместе с форматом снимка.
+MAGIC = b'QTCACHE1'
+# Классы, которые могут быть в записях снимка. Остальные классы не загружаются,
+# чтобы чтение снимка не выполняло произвольный код.
+SAFE_CLASSES = {
+    ('builtins', 'complex'),
+    ('datetime', 'date'),
+    ('datetime', 'datetime'),
+    ('datetime', 'time'),
+    ('datetime', 'timedelta'),
+    ('datetime', 'timezone'),
+    ('decimal', 'Decimal'),
+    ('uuid', 'UUID'),
+    ('uuid', 'SafeUUID'),
+}
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """
+        Загружает из pickle только встроенные типы и классы из SAFE_CLASSES.
+    """
+
+    def find_class(self, module: str, name: str) -> Any:
+        if (module, name) in SAFE_CLASSES:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Класс '{module}.{name}' не загружается из снимка кеша.")
+
+
+def save_snapshot(path: str, snapshot: Dict[str, Any]) -> bool:
+    """Сохраняет снимок кеша в файл: pickle, сжатый zlib.
+        Файл заменяется атомарно, чтобы другие процессы
+        не прочитали его частично.
+
+    Args:
+        path (str): Путь к файлу снимка.
+        snapshot (Dict[str, Any]): Снимок.
+
+    Returns:
+        bool: Флаг успешности.
+    """
+    path = str(path)
+    data = MAGIC + zlib.compress(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+    dir_name = os.path.dirname(os.path.abspath(path))
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить снимок кеша '{path}': {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """Читает снимок кеша из файла. Загружаются только встроенные типы
+        и классы из SAFE_CLASSES, снимок с другими классами не читается.
+
+    Args:
+        path (str): Путь к файлу снимка.
+
+    Returns:
+        Optional[Dict[str, Any]]: Снимок или ничего, если файла нет
+            или у него другой формат.
+    """
+    path = str(path)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать снимок кеша '{path}': {e}")
+        return None
+    if not data.startswith(MAGIC):
+        logger.warning(f"Файл '{path}' не является снимком кеша или имеет другой формат.")
+        return None
+    try:
+        return _SnapshotUnpickler(io.BytesIO(zlib.decompress(data[len(MAGIC):]))).load()
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать снимок кеша '{path}': {e}")
+        return None
@@ -0,0 +1,860 @@
+import json
+import uuid
+import asyncio
+import logging
+from contextlib import contextmanager
+from threading import Lock, RLock
+from typing import Union, List, Dict, Optional, Tuple, Any, Callable, Iterator
+from redis.exceptions import RedisError
+from query_tables.cache import BaseCache, AsyncBaseCache, TypeCache, QueryKey
+from query_tables.cache.cache_query import CacheQuery
+from query_tables.cache.handle import CacheHandle, AsyncCacheHandle
+from query_tables.cache.redis_cache import RedisCache
+from query_tables.cache.async_redis_cache import AsyncRedisCache
+from query_tables.cache.write_through import TableWrite
+from query_tables.fork import register_after_fork, orphan
+
+logger = logging.getLogger(__name__)
+
+# Канал redis, через который процессы сообщают об удалении данных из кеша.
+CHANNEL = 'query_tables:invalidate'
+# Время жизни данных в локальном кеше по умолчанию. Ограничивает, как долго
+# процесс может отдавать устаревшие данные, если сообщение об удалении потеряно.
+L1_TTL = 60
+
+
+class _Invalidation(object):
+    """
+        Сообщения об удалении данных из локального кеша и счетчики удалений.
+        Данные, прочитанные из redis, сохраняются в локальный кеш, только если
+        пока их читали, не было удалений, которые их затрагивают. Иначе 
+        сообщение об удалении применилось бы к локальному кешу раньше,
+        чем в него попали бы устаревшие данные.
+    """
+    def __init__(self, l1: CacheQuery):
+        self._l1 = l1
+        self._sender = uuid.uuid4().hex # свои сообщения уже применены
+        self._lock = RLock()
+        self._total = 0 # все удаления
+        self._epoch = 0 # удаления всего кеша и отдельных запросов
+        self._tables: Dict[str, int] = {} # удаления по таблицам
+
+    def version(self, query: str) -> Tuple[int, ...]:
+        """Счетчики удалений, которые затрагивают запрос.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Tuple[int, ...]: Счетчики. Для запроса без известных таблиц - все удаления.
+        """
+        tables = getattr(query, 'tables', None)
+        if not tables:
+            return (self._total,)
+        return (self._epoch, *(self._tables.get(table, 0) for table in tables))
+
+    @contextmanager
+    def invalidating(self, table: Optional[str] = None) -> Iterator[None]:
+        """Удаление данных из локального кеша.
+
+        Args:
+            table (Optional[str], optional): Таблица, запросы которой удаляются.
+                По умолчанию - удаляется весь кеш или отдельный запрос.
+        """
+        with self._lock:
+            self._total += 1
+            if table is None:
+                self._epoch += 1
+            else:
+                self._tables[table] = self._tables.get(table, 0) + 1
+            yield
+
+    def store(self, query: str, version: Tuple[int, ...], save: Callable[[], Any]) -> bool:
+        """Сохраняет в локальный кеш данные, прочитанные из redis.
+
+        Args:
+            query (str): SQL запрос.
+            version (Tuple[int, ...]): Счетчики удалений до чтения из redis.
+            save (Callable[[], Any]): Сохранение в локальный кеш.
+
+        Returns:
+            bool: Сохранены ли данные.
+        """
+        with self._lock:
+            if self.version(query) != version:
+                return False
+            save()
+            return True
+
+    def encode(self, action: str, **params: Any) -> str:
+        """Сообщение для других процессов.
+
+        Args:
+            action (str): clear, table или query.
+
+        Returns:
+            str: Сообщение в json.
+        """
+        message = dict(sender=self._sender, action=action, **params)
+        try:
+            return json.dumps(message)
+        except (TypeError, ValueError):
+            # условия с датами и другими значениями не в json: удаляется вся таблица
+            message['predicates'] = None
+            return json.dumps(message)
+
+    def apply(self, data: Union[str, bytes]):
+        """Применяет сообщение другого процесса к локальному кешу.
+
+        Args:
+            data (Union[str, bytes]): Сообщение в json.
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+        message: Dict = json.loads(data)
+        if message.get('sender') == self._sender:
+            return
+        action = message.get('action')
+        if action == 'clear':
+            with self.invalidating():
+                self._l1.clear()
+        elif action == 'table':
+            with self.invalidating(message['table']):
+                self._l1.delete_cache_table(message['table'], message.get('predicates'))
+        elif action == 'query':
+            with self.invalidating():
+                del self._l1[QueryKey(message['query'], key=message.get('key'))]
+
+
+class TieredCache(BaseCache):
+    """
+        Двухуровневый кеш: локальный кеш процесса перед redis.
+        Удаление данных рассылается через pub/sub redis, и каждый процесс
+        удаляет свои локальные копии. Пока подписки нет, данные читаются из redis.
+    """
+
+    type_cache = TypeCache.remote
+
+    def __init__(
+        self, l2: RedisCache,
+        l1: Optional[CacheQuery] = None,
+        channel: str = CHANNEL
+    ):
+        """
+        Args:
+            l2 (RedisCache): Кеш redis, общий для всех процессов.
+            l1 (Optional[CacheQuery], optional): Локальный кеш процесса.
+                По умолчанию - CacheQuery со временем жизни 60 секунд.
+            channel (str, optional): Канал redis для сообщений об удалении данных.
+        """
+        self._l2 = l2
+        # пустые результаты хранятся не дольше, чем в redis
+        self._l1 = l1 or CacheQuery(ttl=L1_TTL, negative_ttl=min(l2._negative_ttl, L1_TTL))
+        self._channel = channel
+        self._invalidation = _Invalidation(self._l1)
+        self._listener = None # поток подписки
+        self._listen_lock = Lock()
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            Поток подписки в дочерний процесс не переносится.
+            Подписка создается заново при первом обращение к кешу.
+        """
+        orphan(self._listener)
+        self._listener = None
+        self._listen_lock = Lock()
+
+    def _listen(self) -> bool:
+        """Подписывается на сообщения об удалении данных, если подписки еще нет.
+
+        Returns:
+            bool: Можно ли использовать локальный кеш.
+        """
+        if self._listener is not None and self._listener.is_alive():
+            return True
+        with self._listen_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return True
+            try:
+                self._listener = self._l2._subscribe(
+                    self._channel, self._on_message, self._on_listen_error
+                )
+            except RedisError as e:
+                logger.error(f"Не удалось подписаться на канал {self._channel}: {e}")
+                self._listener = None
+                return False
+            # без подписки сообщения могли быть пропущены
+            with self._invalidation.invalidating():
+                self._l1.clear()
+            return True
+
+    def _on_message(self, message: Dict):
+        try:
+            self._invalidation.apply(message['data'])
+        except Exception as e:
+            logger.error(f"Ошибка при обработке сообщения об удалении данных: {e}")
+
+    def _on_listen_error(self, e: Exception, pubsub, thread):
+        logger.error(f"Подписка на канал {self._channel} прервана: {e}")
+        thread.stop()
+        with self._invalidation.invalidating():
+            self._l1.clear()
+
+    def _broadcast(self, action: str, **params: Any):
+        """Сообщает другим процессам об удалении данных.
+
+        Args:
+            action (str): clear, table или query.
+        """
+        try:
+            self._l2._publish(self._channel, self._invalidation.encode(action, **params))
+        except RedisError as e:
+            logger.error(f"Не удалось отправить сообщение в канал {self._channel}: {e}")
+
+    def is_enabled_cache(self) -> bool:
+        """
+            Включен ли кеш.
+        """
+        return self._l2.is_enabled_cache()
+
+    def clear(self):
+        """
+            Очищение кеша.
+        """
+        self._l2.clear()
+        with self._invalidation.invalidating():
+            self._l1.clear()
+        self._broadcast('clear')
+
+    def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
+        """Удаление кеша по таблице. Вседу, где использовалась таблица.
+
+        Args:
+            table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        res = self._l2.delete_cache_table(table, predicates)
+        with self._invalidation.invalidating(table):
+            self._l1.delete_cache_table(table, predicates)
+        self._broadcast('table', table=table, predicates=predicates)
+        return res
+
+    def write_through(self, write: TableWrite) -> bool:
+        """Применяет изменение таблицы к записям запросов в redis.
+            Локальные копии затронутых запросов удаляются во всех процессах.
+
+        Args:
+            write (TableWrite): Изменение таблицы.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        res = self._l2.write_through(write)
+        predicates = write.predicates()
+        with self._invalidation.invalidating(write.table):
+            self._l1.delete_cache_table(write.table, predicates)
+        self._broadcast('table', table=write.table, predicates=predicates)
+        return res
+
+    def is_enabled_negative_cache(self) -> bool:
+        """
+            Сохраняются ли в кеш пустые результаты запросов.
+        """
+        return self._l2.is_enabled_negative_cache()
+
+    def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. Отличает сохраненный пустой результат 
+            от отсутствия запроса в кеше. Данные из redis сохраняются в локальный кеш.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата 
+                или ничего, если запроса нет в кеше.
+        """
+        if not self._listen():
+            return self._l2.lookup(query)
+        data = self._l1.lookup(query)
+        if data is None:
+            data, _ = self._fill(query)
+        return data
+
+    def _fill(self, query: str) -> Tuple[Optional[List[Dict]], bool]:
+        """Читает запрос из redis и сохраняет его в локальный кеш.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Tuple[Optional[List[Dict]], bool]: Записи или ничего, если запроса нет в redis,
+                и сохранены ли они в локальный кеш.
+        """
+        version = self._invalidation.version(query)
+        data = self._l2.lookup(query)
+        if data is None:
+            return None, False
+        return data, self._invalidation.store(
+            query, version, lambda: self._l1.__setitem__(query, list(data))
+        )
+
+    def is_stale(self, query: str) -> bool:
+        """Запись запроса устарела, но еще отдается из кеша до фонового обновления.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """
+        return self._l2.is_stale(query)
+
+    def __getitem__(self, query: str) -> CacheHandle:
+        """Данные SQL запроса в кеше.
+
+        Args:
+            query (str): SQL Запрос.
+
+        Returns:
+            CacheHandle: Данные запроса.
+        """
+        return self._getitem_(query)
+
+    def _getitem_(self, query: str) -> CacheHandle:
+        # ключ запроса получают оба уровня кеша сами
+        return CacheHandle(self, query, query)
+
+    def _check_filter(self, query: str, params: Dict):
+        """Поля условия проверяет кеш, из которого читаются записи.
+
+        Args:
+            query (str): SQL запрос.
+            params (Dict): Условие выборки.
+        """
+
+    def _get_records(self, query: str, params: Dict) -> Union[List[Dict], List]:
+        """Получение данных из кеша по условию или без условия.
+            Данные из redis сохраняются в локальный кеш.
+
+        Args:
+            query (str): SQL запрос.
+            params (Dict): Условие выборки.
+
+        Returns:
+            Union[List[Dict], List]: Записи или пустой список.
+        """
+        if self._listen():
+            stored = self._l1.lookup(query) is not None
+            if not stored:
+                data, stored = self._fill(query)
+                if not data:
+                    return []
+            if stored:
+                cache = self._l1[query]
+                return cache.filter(params).get() if params else cache.get()
+        # без подписки или данные удалили, пока их читали из redis
+        cache = self._l2[query]
+        return cache.filter(params).get() if params else cache.get()
+
+    def __setitem__(self, query: str, data: List[Dict]):
+        """Сохранить в кеш данные.
+
+        Args:
+            query (str): SQL запрос.
+            data (List[Dict]): Результирующие данные из БД.
+        """
+        return self._setitem_(query, data)
+
+    def _setitem_(self, query: str, data: List[Dict]):
+        self._l2[query] = data
+        if self._listen():
+            self._l1[query] = data
+
+    def __delitem__(self, query: str):
+        """Удаление из кеша данных.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        return self._delitem_(query)
+
+    def _delitem_(self, query: str):
+        del self._l2[query]
+        with self._invalidation.invalidating():
+            del self._l1[query]
+        self._broadcast('query', query=str(query), key=getattr(query, 'key', None))
+
+    def _insert_record(self, hashkey: str, query: str, record: Dict) -> Optional[Dict]:
+        """Добавление записи к кеш.
+
+        Args:
+            hashkey (str): Ключ запроса. Совпадает с запросом.
+            query (str): SQL запрос.
+            record (Dict): Запись.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+        """
+        res = self._l2[query].insert(record)
+        self._drop_query(query)
+        return res
+
+    def _update_records(
+        self, query: str, filter_params: Dict, params: Dict
+    ) -> Union[List[Dict], List]:
+        """Обновление записей в кеше по условию.
+
+        Args:
+            query (str): SQL запрос.
+            filter_params (Dict): Условие выборки.
+            params (Dict): Новые значения полей.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            Union[List[Dict], List]: Обновленные записи или пустой список.
+        """
+        res = self._l2[query].filter(filter_params).update(params)
+        self._drop_query(query)
+        return res
+
+    def _delete_records(self, query: str, filter_params: Dict) -> Union[List[Dict], List]:
+        """Удаление записей из кеша по условию.
+
+        Args:
+            query (str): SQL запрос.
+            filter_params (Dict): Условие выборки.
+
+        Returns:
+            Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
+        """
+        res = self._l2[query].filter(filter_params).delete()
+        self._drop_query(query)
+        return res
+
+    def _drop_query(self, query: str):
+        """Удаляет локальные копии запроса во всех процессах.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        with self._invalidation.invalidating():
+            del self._l1[query]
+        self._broadcast('query', query=str(query), key=getattr(query, 'key', None))
+
+    def _get_data_query(self, query: str) -> Union[List[List], List]:
+        """Получает данные из произвольного запроса.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Union[List[List], List]: Данные.
+        """
+        listen = self._listen()
+        if listen:
+            data = self._l1._get_data_query(query)
+            if data:
+                return data
+        version = self._invalidation.version(query)
+        data = self._l2._get_data_query(query)
+        if listen and data:
+            self._invalidation.store(
+                query, version, lambda: self._l1._save_data_query(query, data)
+            )
+        return data
+
+    def _save_data_query(self, query: str, data: List[Tuple]):
+        """Сохраняет даннные произвольного запроса в кеш.
+
+        Args:
+            query (str): SQL запрос.
+            data (List[Tuple]): Данные.
+        """
+        self._l2._save_data_query(query, data)
+        if self._listen():
+            self._l1._save_data_query(query, data)
+
+    def _delete_data_query(self, query: str):
+        """Удаляет даннные произвольного запроса из кеша.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        self._l2._delete_data_query(query)
+        with self._invalidation.invalidating():
+            self._l1._delete_data_query(query)
+        self._broadcast('query', query=query)
+
+    def _get_struct_tables(self, version: str = '') -> Optional[Dict[str, List[str]]]:
+        return self._l2._get_struct_tables(version)
+
+    def _save_struct_tables(self, struct: Dict[str, List[str]], version: str = ''):
+        return self._l2._save_struct_tables(struct, version)
+
+
+class AsyncTieredCache(AsyncBaseCache):
+    """
+        Двухуровневый кеш в асинхронном режиме: локальный кеш процесса перед redis.
+        Удаление данных рассылается через pub/sub redis, и каждый процесс
+        удаляет свои локальные копии. Пока подписки нет, данные читаются из redis.
+    """
+
+    type_cache = TypeCache.remote
+
+    def __init__(
+        self, l2: AsyncRedisCache,
+        l1: Optional[CacheQuery] = None,
+        channel: str = CHANNEL
+    ):
+        """
+        Args:
+            l2 (AsyncRedisCache): Кеш redis, общий для всех процессов.
+            l1 (Optional[CacheQuery], optional): Локальный кеш процесса.
+                По умолчанию - CacheQuery со временем жизни 60 секунд.
+            channel (str, optional): Канал redis для сообщений об удалении данных.
+        """
+        self._l2 = l2
+        # пустые результаты хранятся не дольше, чем в redis
+        self._l1 = l1 or CacheQuery(
+            ttl=L1_TTL, use_async=True, negative_ttl=min(l2._negative_ttl, L1_TTL)
+        )
+        self._channel = channel
+        self._invalidation = _Invalidation(self._l1)
+        self._listener: Optional[asyncio.Task] = None # задача подписки
+        self._listener_loop: Optional[asyncio.AbstractEventLoop] = None
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        self._listener = None
+        self._listener_loop = None
+
+    async def _listen(self) -> bool:
+        """Подписывается на сообщения об удалении данных, если подписки еще нет.
+
+        Returns:
+            bool: Можно ли использовать локальный кеш.
+        """
+        loop = asyncio.get_running_loop()
+        if (
+            self._listener is not None and not self._listener.done()
+            and self._listener_loop is loop
+        ):
+            return True
+        try:
+            pubsub = await self._l2._subscribe(self._channel)
+        except (RedisError, OSError) as e:
+            logger.error(f"Не удалось подписаться на канал {self._channel}: {e}")
+            return False
+        # без подписки сообщения могли быть пропущены
+        with self._invalidation.invalidating():
+            self._l1.clear()
+        self._listener = loop.create_task(self._read_messages(pubsub))
+        self._listener_loop = loop
+        return True
+
+    async def _read_messages(self, pubsub):
+        """Читает сообщения об удалении данных, пока есть соединение.
+
+        Args:
+            pubsub (PubSub): Подписка.
+        """
+        try:
+            async for message in pubsub.listen():
+                try:
+                    self._invalidation.apply(message['data'])
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке сообщения об удалении данных: {e}")
+        except (RedisError, OSError) as e:
+            logger.error(f"Подписка на канал {self._channel} прервана: {e}")
+        finally:
+            with self._invalidation.invalidating():
+                self._l1.clear()
+            try:
+                await pubsub.aclose()
+            except (RedisError, OSError):
+                pass
+
+    async def _broadcast(self, action: str, **params: Any):
+        """Сообщает другим процессам об удалении данных.
+
+        Args:
+            action (str): clear, table или query.
+        """
+        try:
+            await self._l2._publish(self._channel, self._invalidation.encode(action, **params))
+        except (RedisError, OSError) as e:
+            logger.error(f"Не удалось отправить сообщение в канал {self._channel}: {e}")
+
+    def __getitem__(self, query: str) -> AsyncCacheHandle:
+        """Данные SQL запроса в кеше.
+
+        Args:
+            query (str): SQL Запрос.
+
+        Returns:
+            AsyncCacheHandle: Данные запроса.
+        """
+        return AsyncCacheHandle(self, query)
+
+    async def is_enabled_cache(self) -> bool:
+        """
+            Включен ли кеш.
+        """
+        return await self._l2.is_enabled_cache()
+
+    async def clear(self):
+        """
+            Очищение кеша.
+        """
+        await self._l2.clear()
+        with self._invalidation.invalidating():
+            self._l1.clear()
+        await self._broadcast('clear')
+
+    async def delete_cache_table(self, table: str, predicates: Optional[List[Dict]] = None) -> bool:
+        """Удаление кеша по таблице. Вседу, где использовалась таблица.
+
+        Args:
+            table (str): Название таблицы.
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        res = await self._l2.delete_cache_table(table, predicates)
+        with self._invalidation.invalidating(table):
+            self._l1.delete_cache_table(table, predicates)
+        await self._broadcast('table', table=table, predicates=predicates)
+        return res
+
+    async def write_through(self, write: TableWrite) -> bool:
+        """Применяет изменение таблицы к записям запросов в redis.
+            Локальные копии затронутых запросов удаляются во всех процессах.
+
+        Args:
+            write (TableWrite): Изменение таблицы.
+
+        Returns:
+            bool: Флаг успешности.
+        """
+        res = await self._l2.write_through(write)
+        predicates = write.predicates()
+        with self._invalidation.invalidating(write.table):
+            self._l1.delete_cache_table(write.table, predicates)
+        await self._broadcast('table', table=write.table, predicates=predicates)
+        return res
+
+    def is_enabled_negative_cache(self) -> bool:
+        """
+            Сохраняются ли в кеш пустые результаты запросов.
+        """
+        return self._l2.is_enabled_negative_cache()
+
+    async def lookup(self, query: str) -> Optional[List[Dict]]:
+        """Записи запроса из кеша. Отличает сохраненный пустой результат 
+            от отсутствия запроса в кеше. Данные из redis сохраняются в локальный кеш.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Optional[List[Dict]]: Записи, пустой список для сохраненного пустого результата 
+                или ничего, если запроса нет в кеше.
+        """
+        if not await self._listen():
+            return await self._l2.lookup(query)
+        data = self._l1.lookup(query)
+        if data is None:
+            data, _ = await self._fill(query)
+        return data
+
+    async def _fill(self, query: str) -> Tuple[Optional[List[Dict]], bool]:
+        """Читает запрос из redis и сохраняет его в локальный кеш.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Tuple[Optional[List[Dict]], bool]: Записи или ничего, если запроса нет в redis,
+                и сохранены ли они в локальный кеш.
+        """
+        version = self._invalidation.version(query)
+        data = await self._l2.lookup(query)
+        if data is None:
+            return None, False
+        return data, self._invalidation.store(
+            query, version, lambda: self._l1.__setitem__(query, list(data))
+        )
+
+    async def is_stale(self, query: str) -> bool:
+        """Запись запроса устарела, но еще отдается из кеша до фонового обновления.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            bool: Флаг.
+        """
+        return await self._l2.is_stale(query)
+
+    async def _get_records(self, query: str, params: Dict) -> Union[List[Dict], List]:
+        """Получение данных из кеша по условию или без условия.
+            Данные из redis сохраняются в локальный кеш.
+
+        Args:
+            query (str): SQL запрос.
+            params (Dict): Условие выборки.
+
+        Returns:
+            Union[List[Dict], List]: Записи или пустой список.
+        """
+        if await self._listen():
+            stored = self._l1.lookup(query) is not None
+            if not stored:
+                data, stored = await self._fill(query)
+                if not data:
+                    return []
+            if stored:
+                cache = self._l1[query]
+                return cache.filter(params).get() if params else cache.get()
+        # без подписки или данные удалили, пока их читали из redis
+        cache = self._l2[query]
+        return await (cache.filter(params).get() if params else cache.get())
+
+    async def _set_data(self, query: str, data: List[Dict]):
+        """Сохранить в кеш данные.
+
+        Args:
+            query (str): SQL запрос.
+            data (List[Dict]): Результирующие данные из БД.
+        """
+        await self._l2[query].set_data(data)
+        if await self._listen():
+            self._l1[query] = data
+
+    async def _delete_query(self, query: str):
+        """Удаление из кеша данных.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        await self._l2[query].delete_query()
+        await self._drop_query(query)
+
+    async def _insert_record(self, query: str, record: Dict) -> Optional[Dict]:
+        """Добавление записи к кеш.
+
+        Args:
+            query (str): SQL запрос.
+            record (Dict): Запись.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+        """
+        res = await self._l2[query].insert(record)
+        await self._drop_query(query)
+        return res
+
+    async def _update_records(
+        self, query: str, filter_params: Dict, params: Dict
+    ) -> Union[List[Dict], List]:
+        """Обновление записей в кеше по условию.
+
+        Args:
+            query (str): SQL запрос.
+            filter_params (Dict): Условие выборки.
+            params (Dict): Новые значения полей.
+
+        Raises:
+            NoMatchFieldInCache: Нет такого поля.
+
+        Returns:
+            Union[List[Dict], List]: Обновленные записи или пустой список.
+        """
+        res = await self._l2[query].filter(filter_params).update(params)
+        await self._drop_query(query)
+        return res
+
+    async def _delete_records(self, query: str, filter_params: Dict) -> Union[List[Dict], List]:
+        """Удаление записей из кеша по условию.
+
+        Args:
+            query (str): SQL запрос.
+            filter_params (Dict): Условие выборки.
+
+        Returns:
+            Union[List[Dict], List]: Удаленные записи из кеша или пустой список.
+        """
+        res = await self._l2[query].filter(filter_params).delete()
+        await self._drop_query(query)
+        return res
+
+    async def _drop_query(self, query: str):
+        """Удаляет локальные копии запроса во всех процессах.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        with self._invalidation.invalidating():
+            del self._l1[query]
+        await self._broadcast('query', query=str(query), key=getattr(query, 'key', None))
+
+    async def _get_data_query(self, query: str) -> Union[List[List], List]:
+        """Получает данные из произвольного запроса.
+
+        Args:
+            query (str): SQL запрос.
+
+        Returns:
+            Union[List[List], List]: Данные.
+        """
+        listen = await self._listen()
+        if listen:
+            data = self._l1._get_data_query(query)
+            if data:
+                return data
+        version = self._invalidation.version(query)
+        data = await self._l2._get_data_query(query)
+        if listen and data:
+            self._invalidation.store(
+                query, version, lambda: self._l1._save_data_query(query, data)
+            )
+        return data
+
+    async def _save_data_query(self, query: str, data: List[Tuple]):
+        """Сохраняет даннные произвольного запроса в кеш.
+
+        Args:
+            query (str): SQL запрос.
+            data (List[Tuple]): Данные.
+        """
+        await self._l2._save_data_query(query, data)
+        if await self._listen():
+            self._l1._save_data_query(query, data)
+
+    async def _delete_data_query(self, query: str):
+        """Удаляет даннные произвольного запроса из кеша.
+
+        Args:
+            query (str): SQL запрос.
+        """
+        await self._l2._delete_data_query(query)
+        with self._invalidation.invalidating():
+            self._l1._delete_data_query(query)
+        await self._broadcast('query', query=query)
+
+    async def _get_struct_tables(self, version: str = '') -> Optional[Dict[str, List[str]]]:
+        return await self._l2._get_struct_tables(version)
+
+    async def _save_struct_tables(self, struct: Dict[str, List[str]], version: str = ''):
+        return await self._l2._save_struct_tables(struct, version)
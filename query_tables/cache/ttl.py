@@ -0,0 +1,39 @@
+from typing import Dict, Union
+
+
+def query_ttl(ttl: Union[int, Dict[str, int]], query: str) -> int:
+    """Время жизни запроса в кеше.
+        Время, заданное при вызове запроса, важнее времени по таблицам.
+        Для запроса с несколькими таблицами берется наименьшее время.
+        Таблицы, которых нет в словаре, и запросы без таблиц получают 0.
+
+    Args:
+        ttl (Union[int, Dict[str, int]]): Время кеша или время кеша по таблицам.
+        query (str): SQL запрос или QueryKey.
+
+    Returns:
+        int: Время жизни в секундах.
+    """
+    value = getattr(query, 'ttl', None)
+    if value is not None:
+        return value
+    if not isinstance(ttl, dict):
+        return ttl
+    tables = getattr(query, 'tables', None)
+    if not tables:
+        return 0
+    return min(ttl.get(table, 0) for table in tables)
+
+
+def is_ttl_enabled(ttl: Union[int, Dict[str, int]]) -> bool:
+    """Есть ли хотя бы одно время кеша больше 0.
+
+    Args:
+        ttl (Union[int, Dict[str, int]]): Время кеша или время кеша по таблицам.
+
+    Returns:
+        bool: Флаг.
+    """
+    if isinstance(ttl, dict):
+        return any(value > 0 for value in ttl.values())
+    return bool(ttl)
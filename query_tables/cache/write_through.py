@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from query_tables.cache.index import IndexedRecords, split_operator, _check
+from query_tables.cache.predicates import (
+    records_predicates, updated_predicates,
+    _same_kind, _is_number
+)
+
+
+@dataclass
+class TableWrite:
+    """
+        Изменение записей таблицы, которое нужно применить к кешу.
+    """
+    table: str
+    action: str # insert, update или delete
+    predicate: Dict = field(default_factory=dict) # условие обновления или удаления
+    params: Dict = field(default_factory=dict) # новые значения полей при обновление
+    records: List[Dict] = field(default_factory=list) # записи для вставки
+    rows: Optional[List[Dict]] = None # записи из RETURNING, если он доступен
+
+    def predicates(self) -> Optional[List[Dict]]:
+        """Условия измененных записей.
+
+        Returns:
+            Optional[List[Dict]]: Условия или ничего, если записи неизвестны.
+        """
+        if self.action == 'insert':
+            return records_predicates(self.rows if self.rows is not None else self.records)
+        if self.action == 'update':
+            return updated_predicates(self.predicate, self.params)
+        return [self.predicate]
+
+
+def apply_write(records: IndexedRecords, predicate: Dict, write: TableWrite) -> bool:
+    """Применяет изменение таблицы к записям запроса в кеше.
+        Если изменение нельзя применить точно, записи не меняются.
+
+    Args:
+        records (IndexedRecords): Записи запроса в кеше.
+        predicate (Dict): Условие выборки запроса по таблице.
+        write (TableWrite): Изменение таблицы.
+
+    Returns:
+        bool: Применено ли изменение. Иначе запрос нужно удалить из кеша.
+    """
+    if not records:
+        return False
+    prefix = f'{write.table}.'
+    fields = list(records[0])
+    if not all(name.startswith(prefix) for name in fields):
+        return False
+    new_rows = []
+    if write.rows is not None and write.action != 'delete':
+        for row in write.rows:
+            if not all(name[len(prefix):] in row for name in fields):
+                return False
+            match = _evaluate(predicate, row)
+            if match is None:
+                return False
+            if match:
+                new_rows.append({name: row[name[len(prefix):]] for name in fields})
+    if write.action == 'insert':
+        if write.rows is None:
+            return False
+        for row in new_rows:
+            records.append(row)
+        return True
+    positions = []
+    for i, record in enumerate(records):
+        match = _evaluate(write.predicate, record, prefix)
+        if match is None:
+            return False
+        if match:
+            positions.append(i)
+    if write.action == 'delete':
+        records.delete_records(positions)
+        return True
+    if write.rows is None:
+        # без RETURNING записи не должны перейти в запрос или выйти из него
+        if {split_operator(key)[0] for key in predicate} & set(write.params):
+            return False
+        params = {
+            f'{prefix}{name}': value for name, value in write.params.items()
+            if f'{prefix}{name}' in records[0]
+        }
+        records.update_records(positions, params)
+        return True
+    records.delete_records(positions)
+    for row in new_rows:
+        records.append(row)
+    return True
+
+
+def _evaluate(predicate: Dict, record: Dict, prefix: str = '') -> Optional[bool]:
+    """Проверка записи по условию так же, как в БД.
+
+    Args:
+        predicate (Dict): Условие.
+        record (Dict): Запись.
+        prefix (str, optional): Префикс полей записи, к примеру: `person.`.
+
+    Returns:
+        Optional[bool]: Подходит ли запись. Ничего, если проверить точно нельзя.
+    """
+    unknown = False
+    for key, value in predicate.items():
+        name, operator = split_operator(key)
+        name = f'{prefix}{name}'
+        if name not in record or not _is_exact(operator, value, record[name]):
+            unknown = True
+            continue
+        if not _check(record[name], operator, value):
+            return False
+    return None if unknown else True
+
+
+def _is_exact(operator: str, value: Any, current: Any) -> bool:
+    """Сравнение в python совпадает со сравнением в БД.
+
+    Args:
+        operator (str): Оператор.
+        value (Any): Значение условия.
+        current (Any): Значение записи.
+
+    Returns:
+        bool: Флаг.
+    """
+    if operator in ('isnull', 'isnotnull') or current is None:
+        return True
+    if operator in ('', 'notequ'):
+        return _same_kind(current, value)
+    if operator == 'in':
+        return isinstance(value, (list, tuple)) and all(
+            _same_kind(current, item) for item in value
+        )
+    if operator == 'between':
+        return (
+            isinstance(value, (list, tuple)) and len(value) == 2
+            and _is_number(current) and all(map(_is_number, value))
+        )
+    if operator in ('gt', 'gte', 'lt', 'lte'):
+        return _is_number(current) and _is_number(value)
+    # like зависит от регистра по-разному в разных БД
+    return False
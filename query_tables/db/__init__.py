@@ -1,3 +1,5 @@
+import importlib
+from typing import TYPE_CHECKING
 from query_tables.db.base_db_query import (
     BaseDBQuery, BasePostgreDBQuery, 
     BaseSQLiteDBQuery, DBTypes, 
@@ -5,8 +7,34 @@ from query_tables.db.base_db_query import (
     BaseAsyncPostgreDBQuery,
     BaseAsyncSQLiteDBQuery
 )
-from query_tables.db.db_sqlite import SQLiteQuery, AsyncSQLiteQuery
-from query_tables.db.db_postgres import DBConfigPg, PostgresQuery, AsyncPostgresQuery
+
+if TYPE_CHECKING:
+    from query_tables.db.db_sqlite import SQLiteQuery, AsyncSQLiteQuery
+    from query_tables.db.db_postgres import DBConfigPg, PostgresQuery, AsyncPostgresQuery
+
+# Модули с доступом к БД импортируются при первом обращение,
+# чтобы не загружать драйверы, которые не используются.
+_lazy_imports = {
+    'SQLiteQuery': 'query_tables.db.db_sqlite',
+    'AsyncSQLiteQuery': 'query_tables.db.db_sqlite',
+    'DBConfigPg': 'query_tables.db.db_postgres',
+    'PostgresQuery': 'query_tables.db.db_postgres',
+    'AsyncPostgresQuery': 'query_tables.db.db_postgres',
+}
+
+
+def __getattr__(name: str):
+    module = _lazy_imports.get(name)
+    if module is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_lazy_imports})
+
 
 __all__ = [
     'BaseDBQuery',
@@ -27,4 +55,4 @@ __all__ = [
     
     'DBTypes'
     
-]
\ No newline at end of file
+]
@@ -1,3 +1,4 @@
+import sqlite3
 from typing import List, Any
 from abc import ABC
 from dataclasses import dataclass
@@ -16,6 +17,12 @@ class BaseDBQuery(ABC):
         """        
         ...
     
+    def supports_returning(self) -> bool:
+        """
+            Поддерживает ли БД RETURNING в запросах на изменение.
+        """
+        return False
+    
     def connect(self) -> 'BaseDBQuery':
         """ Открываем соединение с курсором. """
         ...
@@ -58,6 +65,12 @@ class BaseAsyncDBQuery(ABC):
         """        
         ...
     
+    def supports_returning(self) -> bool:
+        """
+            Поддерживает ли БД RETURNING в запросах на изменение.
+        """
+        return False
+    
     async def connect(self) -> 'BaseAsyncDBQuery':
         """ Открываем соединение с курсором. """
         ...
@@ -96,6 +109,9 @@ class BaseSQLiteDBQuery(BaseDBQuery):
     
     def get_type(self):
         return DBTypes.sqlite
+    
+    def supports_returning(self):
+        return sqlite3.sqlite_version_info >= (3, 35, 0)
 
 
 class BasePostgreDBQuery(BaseDBQuery):
@@ -103,14 +119,23 @@ class BasePostgreDBQuery(BaseDBQuery):
     def get_type(self):
         return DBTypes.postgres
     
+    def supports_returning(self):
+        return True
+    
     
 class BaseAsyncSQLiteDBQuery(BaseAsyncDBQuery):
     
     def get_type(self):
         return DBTypes.sqlite
+    
+    def supports_returning(self):
+        return sqlite3.sqlite_version_info >= (3, 35, 0)
 
 
 class BaseAsyncPostgreDBQuery(BaseAsyncDBQuery):
     
     def get_type(self):
-        return DBTypes.postgres
\ No newline at end of file
+        return DBTypes.postgres
+    
+    def supports_returning(self):
+        return True
\ No newline at end of file
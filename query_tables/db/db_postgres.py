@@ -1,12 +1,13 @@
 from typing import List, Any, Dict
 import logging
-from psycopg2.pool import ThreadedConnectionPool
+import threading
+from contextvars import ContextVar
 import time
 from dataclasses import dataclass
-import asyncpg
 import asyncio
 from query_tables.db import BasePostgreDBQuery, BaseAsyncPostgreDBQuery
 from query_tables.exceptions import ErrorConnectDB
+from query_tables.fork import register_after_fork, orphan
 
 logger = logging.getLogger(__name__)
 
@@ -35,8 +36,9 @@ class PostgresQuery(BasePostgreDBQuery):
     def __init__(self, config: DBConfigPg):
         self._config = config
         self._pool = None
-        self._conn = None
-        self._cursor = None
+        # соединение и курсор у каждого потока свои
+        self._local = threading.local()
+        register_after_fork(self._after_fork)
         while True:
             res = self.create_pool()
             if res:
@@ -47,6 +49,7 @@ class PostgresQuery(BasePostgreDBQuery):
         """
             Создаем пул соединений.
         """        
+        from psycopg2.pool import ThreadedConnectionPool
         try:
             self.close_pool()
             self._pool = ThreadedConnectionPool(
@@ -57,9 +60,34 @@ class PostgresQuery(BasePostgreDBQuery):
         except Exception as e:
             logger.error(f"Ошибка при подключении к базе данных: {e}")
             return False
+
+    @property
+    def _conn(self):
+        return getattr(self._local, 'conn', None)
+
+    @_conn.setter
+    def _conn(self, value):
+        self._local.conn = value
+
+    @property
+    def _cursor(self):
+        return getattr(self._local, 'cursor', None)
+
+    @_cursor.setter
+    def _cursor(self, value):
+        self._local.cursor = value
         
     def __del__(self):
         self.close_pool()
+
+    def _after_fork(self):
+        """
+            В дочернем процессе пул создается заново при первом соединение.
+            Соединения родителя не закрываются, чтобы не разорвать их сокеты.
+        """
+        orphan(self._pool, self._local)
+        self._pool = None
+        self._local = threading.local()
         
     def close_pool(self):
         """
@@ -72,6 +100,8 @@ class PostgresQuery(BasePostgreDBQuery):
     def connect(self) -> 'PostgresQuery':
         """ Открываем соединение с курсором. """
         try:
+            if self._pool is None:
+                self.create_pool()
             self._conn = self._pool.getconn()
             self._cursor = self._conn.cursor()
         except Exception as e:
@@ -120,12 +150,44 @@ class AsyncPostgresQuery(BaseAsyncPostgreDBQuery):
     def __init__(self, config: DBConfigPg):
         self._config = config
         self._pool = None
-        self._conn = None
-        self._cursor = None
-        self._res = None
+        self._active = 0 # сколько соединений сейчас взято из пула
+        # соединение и результат у каждой задачи asyncio свои
+        self._conn_var: ContextVar = ContextVar(f'pg_conn_{id(self)}', default=None)
+        self._res_var: ContextVar = ContextVar(f'pg_res_{id(self)}', default=None)
+        self._pool_lock = asyncio.Lock()
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            В дочернем процессе пул создается заново при первом соединение.
+            Пул родителя привязан к его циклу событий и не закрывается.
+        """
+        orphan(self._pool)
+        self._pool = None
+        self._active = 0
+        self._conn_var = ContextVar(f'pg_conn_{id(self)}', default=None)
+        self._res_var = ContextVar(f'pg_res_{id(self)}', default=None)
+        self._pool_lock = asyncio.Lock()
+
+    @property
+    def _conn(self):
+        return self._conn_var.get()
+
+    @_conn.setter
+    def _conn(self, value):
+        self._conn_var.set(value)
+
+    @property
+    def _res(self):
+        return self._res_var.get()
+
+    @_res.setter
+    def _res(self, value):
+        self._res_var.set(value)
         
     async def _create_pool(self):
         """ Создаем пул соединений к БД. """
+        import asyncpg
         try:
             self._pool = await asyncpg.create_pool(
                 **self._config.get_conn(), 
@@ -154,21 +216,27 @@ class AsyncPostgresQuery(BaseAsyncPostgreDBQuery):
     async def connect(self) -> 'AsyncPostgresQuery':
         """ Открываем соединение с курсором. """
         try:
-            if self._pool is None:
-                await self.create_pool()
+            async with self._pool_lock:
+                if self._pool is None:
+                    await self.create_pool()
+                self._active += 1
             self._conn = await self._pool.acquire()
         except Exception as e:
             logger.error(f"Ошибка при открытие соединения с курсором к БД: {e}")
         return self
 
     async def close(self):
-        """ Закрываем соединение с курсором. """
+        """ Закрываем соединение с курсором. 
+            Пул закрывается, когда им больше никто не пользуется. 
+        """
         if self._conn is not None:
             await self._pool.release(self._conn)
             self._conn = None
-        if self._pool is not None:
-            await self._pool.close()
-            self._pool = None
+        async with self._pool_lock:
+            self._active = max(self._active - 1, 0)
+            if self._pool is not None and not self._active:
+                await self._pool.close()
+                self._pool = None
 
     async def execute(self, query: str) -> 'AsyncPostgresQuery':
         """Выполнение запроса.
@@ -1,15 +1,52 @@
-from typing import List, Any
+from typing import List, Any, Optional, TYPE_CHECKING
 import sqlite3
-import aiosqlite
+import threading
+from contextvars import ContextVar
 from query_tables.db import BaseSQLiteDBQuery, BaseAsyncSQLiteDBQuery
+from query_tables.fork import register_after_fork, orphan
+
+if TYPE_CHECKING:
+    import aiosqlite
 
 
 class SQLiteQuery(BaseSQLiteDBQuery):
     
     def __init__(self, path: str):
         self._path = path
-        self.conn = None
-        self.cursor = None
+        # соединение и курсор у каждого потока свои
+        self._local = threading.local()
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            Соединения родителя не переносятся в дочерний процесс.
+        """
+        orphan(self._local)
+        self._local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return getattr(self._local, 'conn', None)
+
+    @conn.setter
+    def conn(self, value: sqlite3.Connection):
+        self._local.conn = value
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        return getattr(self._local, 'cursor', None)
+
+    @cursor.setter
+    def cursor(self, value: sqlite3.Cursor):
+        self._local.cursor = value
+
+    @property
+    def rows(self) -> Optional[List[Any]]:
+        return getattr(self._local, 'rows', None)
+
+    @rows.setter
+    def rows(self, value: Optional[List[Any]]):
+        self._local.rows = value
     
     def connect(self) -> 'SQLiteQuery':
         """ Открываем соединение с курсором. """
@@ -21,8 +58,10 @@ class SQLiteQuery(BaseSQLiteDBQuery):
         """ Закрываем соединение с курсором. """
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.conn:
             self.conn.close()
+            self.conn = None
 
     def execute(self, query: str) -> 'SQLiteQuery':
         """Выполнение запроса.
@@ -30,7 +69,11 @@ class SQLiteQuery(BaseSQLiteDBQuery):
         Args:
             query (str): SQL запрос.
         """        
+        self.rows = None
         self.cursor.execute(query)
+        if self.conn.in_transaction:
+            # строки из RETURNING нужно получить до фиксации транзакции
+            self.rows = self.cursor.fetchall()
         self.conn.commit()
         return self
 
@@ -40,6 +83,9 @@ class SQLiteQuery(BaseSQLiteDBQuery):
         Returns:
             List: Результирующий список.
         """     
+        if self.rows is not None:
+            rows, self.rows = self.rows, None
+            return rows
         return self.cursor.fetchall()
 
 
@@ -47,11 +93,48 @@ class AsyncSQLiteQuery(BaseAsyncSQLiteDBQuery):
     
     def __init__(self, path: str):
         self._path = path
-        self.conn = None
-        self.cursor = None
+        # соединение и курсор у каждой задачи asyncio свои
+        self._conn: ContextVar = ContextVar(f'sqlite_conn_{id(self)}', default=None)
+        self._cursor: ContextVar = ContextVar(f'sqlite_cursor_{id(self)}', default=None)
+        self._rows: ContextVar = ContextVar(f'sqlite_rows_{id(self)}', default=None)
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            Соединения родителя не переносятся в дочерний процесс.
+        """
+        orphan(self.conn)
+        self._conn = ContextVar(f'sqlite_conn_{id(self)}', default=None)
+        self._cursor = ContextVar(f'sqlite_cursor_{id(self)}', default=None)
+        self._rows = ContextVar(f'sqlite_rows_{id(self)}', default=None)
+
+    @property
+    def conn(self) -> 'aiosqlite.Connection':
+        return self._conn.get()
+
+    @conn.setter
+    def conn(self, value: 'aiosqlite.Connection'):
+        self._conn.set(value)
+
+    @property
+    def cursor(self) -> 'aiosqlite.Cursor':
+        return self._cursor.get()
+
+    @cursor.setter
+    def cursor(self, value: 'aiosqlite.Cursor'):
+        self._cursor.set(value)
+
+    @property
+    def rows(self) -> Optional[List[Any]]:
+        return self._rows.get()
+
+    @rows.setter
+    def rows(self, value: Optional[List[Any]]):
+        self._rows.set(value)
     
     async def connect(self) -> 'AsyncSQLiteQuery':
         """ Открываем соединение с курсором. """
+        import aiosqlite
         self.conn = await aiosqlite.connect(self._path)
         self.cursor = await self.conn.cursor()
         return self
@@ -60,8 +143,10 @@ class AsyncSQLiteQuery(BaseAsyncSQLiteDBQuery):
         """ Закрываем соединение с курсором. """
         if self.cursor:
             await self.cursor.close()
+            self.cursor = None
         if self.conn:
             await self.conn.close()
+            self.conn = None
 
     async def execute(self, query: str) -> 'AsyncSQLiteQuery':
         """Выполнение запроса.
@@ -69,7 +154,11 @@ class AsyncSQLiteQuery(BaseAsyncSQLiteDBQuery):
         Args:
             query (str): SQL запрос.
         """        
+        self.rows = None
         await self.cursor.execute(query)
+        if self.conn.in_transaction:
+            # строки из RETURNING нужно получить до фиксации транзакции
+            self.rows = await self.cursor.fetchall()
         await self.conn.commit()
         return self
 
@@ -79,4 +168,7 @@ class AsyncSQLiteQuery(BaseAsyncSQLiteDBQuery):
         Returns:
             List: Результирующий список.
         """     
+        if self.rows is not None:
+            rows, self.rows = self.rows, None
+            return rows
         return await self.cursor.fetchall()
\ No newline at end of file
@@ -62,6 +62,15 @@ class NoMatchFieldInCache(ExceptionTable):
         super().__init__(message)
 
 
+class UnknownCachePolicy(ExceptionTable):
+    """
+        Неизвестная политика вытеснения кеша.
+    """    
+    def __init__(self, policy, policies):
+        message = f"Неизвестная политика вытеснения кеша '{policy}'. Доступные политики: {', '.join(policies)}."
+        super().__init__(message)
+
+
 class ErrorExecuteJoinQuery(ExceptionTable):
     """
         Ошибка изменение таблицы с JOIN.
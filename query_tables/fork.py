@@ -0,0 +1,93 @@
+import os
+import atexit
+import logging
+import weakref
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Методы объектов, которые вызываются в дочернем процессе после fork
+# и при завершение процесса. Методы удаляются вместе со своими объектами.
+_handlers: Dict[weakref.WeakMethod, None] = {}
+_exit_handlers: Dict[weakref.WeakMethod, None] = {}
+# Пулы и соединения родительского процесса. В дочернем процессе их нельзя
+# закрывать - это закроет сокеты родителя, поэтому ссылки хранятся до выхода.
+_orphans: List[Any] = []
+
+
+def register_after_fork(method: Callable[[], None]):
+    """Регистрирует метод объекта, который будет вызван
+        в дочернем процессе после fork. Объект не удерживается от удаления.
+
+    Args:
+        method (Callable[[], None]): Метод объекта.
+    """
+    _register(_handlers, method)
+
+
+def register_at_exit(method: Callable[[], None]):
+    """Регистрирует метод объекта, который будет вызван 
+        при завершение процесса. Объект не удерживается от удаления.
+
+    Args:
+        method (Callable[[], None]): Метод объекта.
+    """
+    _register(_exit_handlers, method)
+
+
+def _register(handlers: Dict[weakref.WeakMethod, None], method: Callable[[], None]):
+    """Добавляет метод объекта в реестр. Когда объект удаляется, 
+        его метод удаляется из реестра, поэтому реестр не растет 
+        в долгоживущем процессе.
+
+    Args:
+        handlers (Dict[weakref.WeakMethod, None]): Реестр методов.
+        method (Callable[[], None]): Метод объекта.
+    """
+    handlers[weakref.WeakMethod(method, lambda ref: handlers.pop(ref, None))] = None
+
+
+def _call_handlers(handlers: Dict[weakref.WeakMethod, None], error: str):
+    """Вызывает живые методы реестра.
+
+    Args:
+        handlers (Dict[weakref.WeakMethod, None]): Реестр методов.
+        error (str): Сообщение при ошибке метода.
+    """
+    # объекты могут удаляться сборщиком мусора во время обхода
+    for ref in list(handlers):
+        method = ref()
+        if method is None:
+            continue
+        try:
+            method()
+        except Exception as e:
+            logger.error(f"{error}: {e}")
+
+
+def orphan(*objs: Any):
+    """Оставляет объекты родительского процесса без закрытия.
+
+    Args:
+        objs (Any): Пулы или соединения.
+    """
+    _orphans.extend(obj for obj in objs if obj is not None)
+
+
+def _after_fork_in_child():
+    """
+        Пересоздает пулы и блокировки зарегистрированных объектов.
+    """
+    _call_handlers(_handlers, "Ошибка при восстановлении объекта после fork")
+
+
+def _at_exit():
+    """
+        Вызывает методы, зарегистрированные на завершение процесса.
+    """
+    _call_handlers(_exit_handlers, "Ошибка при завершение процесса")
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(_at_exit)
@@ -34,6 +34,32 @@ class BaseQuery(ABC):
         """
         ...
 
+    @property
+    def predicates(self) -> Dict[str, Dict]:
+        """Условия выборки по каждой таблице запроса.
+
+        Returns:
+            Dict[str, Dict]: Таблица и параметры фильтрации.
+        """
+        ...
+
+    @property
+    def is_simple(self) -> bool:
+        """
+            Запрос к одной таблице без сортировки и лимита.
+        """
+        ...
+
+    @property
+    def cache_key(self) -> str:
+        """Ключ запроса для кеша. Не зависит от порядка условий,
+            полей выборки и значений в `in`.
+
+        Returns:
+            str: Ключ запроса.
+        """
+        ...
+
     def select(self, fields: Optional[List[str]] = None) -> 'BaseQuery':
         """Устанавливает поля для выборки.
 
@@ -86,6 +112,14 @@ class BaseQuery(ABC):
         """
         ...
 
+    def rebuild(self) -> 'BaseQuery':
+        """Собирает запрос заново по текущим полям таблиц.
+
+        Returns:
+            BaseQuery: Новый экземпляр запроса.
+        """
+        ...
+
     def get(self) -> str:
         """Запрос на получение записей.
         
@@ -136,6 +170,17 @@ class BaseQuery(ABC):
         """        
         ...
 
+    def returning(self, query: str) -> str:
+        """Добавляет к запросу на изменение возврат всех полей измененных записей.
+
+        Args:
+            query (str): SQL запрос на вставку, обновление или удаление.
+
+        Returns:
+            str: SQL запрос.
+        """
+        ...
+
 
 class CommonJoin(BaseQuery):
     def __init__(
@@ -1,5 +1,5 @@
 from markupsafe import escape
-from typing import Union, Any, List, Optional, Dict
+from typing import Union, Any, List, Optional, Dict, Tuple
 from query_tables.query import BaseJoin, BaseQuery
 from query_tables.exceptions import (
     NotFieldQueryTable, 
@@ -30,8 +30,13 @@ class Query(BaseQuery):
         self._insert = f'insert into {self._table_name} '
         self._update = f'update {self._table_name} set '
         self._join = ''
+        self._join_key = '' # join блок для ключа кеша
         self._joined_tables: List[BaseQuery] = []
         self._where = ''
+        self._where_key = '' # where блок для ключа кеша
+        self._filters: Dict[str, Any] = {} # Параметры фильтрации из where блока.
+        # Вызовы конструктора для пересборки запроса по новой структуре таблиц.
+        self._calls: List[Tuple[str, tuple, Dict[str, Any]]] = []
         self._order_by = ''
         self._limit = ''
         self._operators = {
@@ -70,11 +75,56 @@ class Query(BaseQuery):
         Returns:
             List: Список таблиц.
         """  
-        tables = set()
-        for table in self.is_table_joined:
+        tables = {self._table_name}
+        for table in self._joined_tables:
             tables.add(table._table_name)
-        return list(tables)
+        return sorted(tables)
     
+    @property
+    def predicates(self) -> Dict[str, Dict[str, Any]]:
+        """Условия выборки по каждой таблице запроса.
+            Если таблица участвует в запросе несколько раз, 
+            условия по ней не учитываются.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Таблица и параметры фильтрации.
+        """
+        predicates = {self._table_name: dict(self._filters)}
+        repeated = set()
+        for table in self._joined_tables:
+            if table._table_name in predicates:
+                repeated.add(table._table_name)
+            predicates[table._table_name] = dict(table._filters)
+        for table_name in repeated:
+            predicates[table_name] = {}
+        return predicates
+
+    @property
+    def is_simple(self) -> bool:
+        """
+            Запрос к одной таблице без сортировки и лимита.
+        """
+        return not (self.is_table_joined or self._order_by or self._limit)
+
+    @property
+    def cache_key(self) -> str:
+        """Ключ запроса для кеша. Не зависит от порядка условий,
+            полей выборки и значений в `in`, поэтому одинаковые по смыслу 
+            запросы получают одну запись в кеше.
+
+        Returns:
+            str: Ключ запроса.
+        """
+        select = 'select ' + ', '.join(sorted(self._map_select))
+        return (
+            f"{select}"
+            f"{self._from}"
+            f"{self._join_key}"
+            f"{self._where_key}"
+            f"{self._order_by}"
+            f"{self._limit}"
+        ).strip()
+
     @property
     def is_table_joined(self) -> bool:
         """
@@ -103,6 +153,7 @@ class Query(BaseQuery):
         for field in fields:
             self._user_fields.append(field)
             self._map_select.append(f'{self._table_name}.{field}')
+        self._calls.append(('select', (fields,), {}))
         return self
 
     def join(self, table: BaseJoin) -> 'Query':
@@ -134,7 +185,13 @@ class Query(BaseQuery):
             f" {table.join_method} ({table.get()}) as {table_alias} "
             f"on {table_alias}.{table.join_field} = {self._table_name}.{table.ext_field}"
         ) + table._join
+        self._join_key += (
+            f" {table.join_method} ({table.cache_key}) as {table_alias} "
+            f"on {table_alias}.{table.join_field} = {self._table_name}.{table.ext_field}"
+        ) + table._join_key
         table._join = ''
+        table._join_key = ''
+        self._calls.append(('join', (getattr(table, 'join_table', table),), {}))
         return self
 
     def filter(self, **params) -> 'Query':
@@ -147,6 +204,7 @@ class Query(BaseQuery):
             BaseQuery: Экземпляр запроса.
         """
         where = []
+        where_key = []
         for field, value in params.items():
             _field, operator = self._get_operator_by_field(field)
             self._exist_field(_field)
@@ -154,9 +212,17 @@ class Query(BaseQuery):
             where.append(
                 f'{self._table_name}.{_field} {operator} {val}'
             )
+            if operator == 'in' and isinstance(value, list):
+                val = self._convert_in_values_key(value)
+            where_key.append(
+                f'{self._table_name}.{_field} {operator} {val}'
+            )
         if where:
             self._where = ' where '
             self._where += ' and '.join(where)
+            self._where_key = ' where ' + ' and '.join(sorted(where_key))
+            self._filters = dict(params)
+            self._calls.append(('filter', (), dict(params)))
         return self
 
     def order_by(self, **kwargs) -> 'Query':
@@ -173,6 +239,7 @@ class Query(BaseQuery):
         if order_by:
             self._order_by = ' order by '
             self._order_by += ', '.join(order_by)
+            self._calls.append(('order_by', (), dict(kwargs)))
         return self
 
     def limit(self, value: int) -> 'Query':
@@ -185,8 +252,31 @@ class Query(BaseQuery):
             BaseQuery: Экземпляр запроса.
         """
         self._limit = f' limit {value}'
+        self._calls.append(('limit', (value,), {}))
         return self
 
+    def rebuild(self) -> 'Query':
+        """Собирает запрос заново по текущим полям таблиц.
+            Вызовы конструктора повторяются в том же порядке, 
+            присоединенные таблицы тоже собираются заново.
+
+        Raises:
+            NotFieldQueryTable: Поля из запроса больше нет в таблице.
+
+        Returns:
+            Query: Новый экземпляр запроса.
+        """
+        query = self.__class__(self._table_name, self._fields)
+        query.join_field = self.join_field
+        query.ext_field = self.ext_field
+        query.table_alias = self.table_alias
+        query.join_method = self.join_method
+        for name, args, kwargs in self._calls:
+            if name == 'join':
+                args = (args[0].rebuild(),)
+            getattr(query, name)(*args, **kwargs)
+        return query
+
     def get(self) -> str:
         """Запрос на получение записей.
         
@@ -281,6 +371,17 @@ class Query(BaseQuery):
             f'{text_values}'
         ).strip()
 
+    def returning(self, query: str) -> str:
+        """Добавляет к запросу на изменение возврат всех полей измененных записей.
+
+        Args:
+            query (str): SQL запрос на вставку, обновление или удаление.
+
+        Returns:
+            str: SQL запрос.
+        """
+        return f"{query} returning {', '.join(self._fields)}"
+
     def delete(self) -> str:
         """Запрос на удаление записей.
         
@@ -381,6 +482,18 @@ class Query(BaseQuery):
                 return _field, self._operators.get(operator)
         return field, '='
 
+    def _convert_in_values_key(self, values: list) -> str:
+        """Значения `in` для ключа кеша: без повторов и по порядку.
+
+        Args:
+            values (list): Значения.
+
+        Returns:
+            str: Значения в формате sql.
+        """
+        items = {str(self._convert_simple_format_data(item)) for item in values}
+        return "({})".format(','.join(sorted(items)))
+
     def _convert_simple_format_data(
         self, value: Optional[Union[list, tuple, int, float, str, bool]] = None
     ) -> Any:
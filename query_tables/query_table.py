@@ -1,10 +1,15 @@
-from typing import List, Dict, Optional, Type, Union
-from query_tables.cache import BaseCache, AsyncBaseCache
+import time
+from typing import List, Dict, Optional, Type, Union, Callable
+from query_tables.cache import BaseCache, AsyncBaseCache, QueryKey
+from query_tables.cache.write_through import TableWrite
+from query_tables.single_flight import SingleFlight, AsyncSingleFlight
+from query_tables.refresher import BackgroundRefresher, AsyncBackgroundRefresher
 from query_tables.db import BaseDBQuery, BaseAsyncDBQuery
 from query_tables.query import BaseQuery, BaseJoin
 from query_tables.exceptions import (
     ErrorDeleteCacheJoin,
-    DesabledCache
+    DesabledCache,
+    NotFieldQueryTable
 )
 
 
@@ -17,7 +22,11 @@ class QueryTable(BaseQuery):
         table_name: str,
         fields: List[str],
         cache: Union[BaseCache, AsyncBaseCache], 
-        cls_query: Type[BaseQuery]
+        cls_query: Type[BaseQuery],
+        on_unknown_field: Optional[Callable[[str], bool]] = None,
+        write_through: bool = False,
+        single_flight: Optional[Union[SingleFlight, AsyncSingleFlight]] = None,
+        refresher: Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]] = None
     ):
         """
         Args:
@@ -26,12 +35,26 @@ class QueryTable(BaseQuery):
             fields List[str]: Список полей.
             cache (Union[BaseCache, AsyncBaseCache]): Кеш.
             query (Type[BaseQuery]): Класс конструктора запросов.
+            on_unknown_field (Optional[Callable[[str], bool]], optional): Вызывается, 
+                когда в запросе указано неизвестное поле. Если вернет True, 
+                структура таблицы обновлена и запрос собирается повторно.
+            write_through (bool, optional): Изменения таблицы применяются 
+                к записям запросов в кеше, а не только удаляют их.
+            single_flight (Optional[Union[SingleFlight, AsyncSingleFlight]], optional): Объединение 
+                одинаковых запросов при промахе кеша. По умолчанию - нет.
+            refresher (Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]], optional): Фоновое 
+                обновление устаревших записей кеша. По умолчанию - нет.
         """
         self._db: BaseDBQuery = db
         self._table_name: str = table_name
         self._fields: List[str] = fields
         self._cache: Union[BaseCache, AsyncBaseCache] = cache
         self._query: BaseQuery = cls_query(table_name, fields)
+        self._on_unknown_field: Optional[Callable[[str], bool]] = on_unknown_field
+        self._write_through: bool = write_through
+        self._single_flight: Optional[Union[SingleFlight, AsyncSingleFlight]] = single_flight
+        self._refresher: Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]] = refresher
+        self._key: Optional[QueryKey] = None # последний ключ запроса вместе с его хешем
 
     @property
     def cache(self) -> BaseCache:
@@ -45,38 +68,136 @@ class QueryTable(BaseQuery):
         """        
         if not self._cache.is_enabled_cache():
             raise DesabledCache()
-        query = self._query.get()
+        query = self._query_key()
         return self._cache[query]
 
+    def _query_key(self, ttl: Optional[int] = None) -> QueryKey:
+        """SQL запрос вместе с таблицами, которые в нем участвуют.
+
+        Args:
+            ttl (Optional[int], optional): Время жизни запроса в кеше. 
+                По умолчанию - время кеша по таблицам запроса.
+
+        Returns:
+            QueryKey: Ключ запроса для кеша.
+        """
+        sql = self._query.get()
+        # повторный вызов того же запроса не считает хеш ключа заново
+        if self._key is not None and self._key == sql and self._key.ttl == ttl:
+            return self._key
+        self._key = QueryKey(
+            sql, self._query.tables_query, 
+            self._query.predicates, self._query.is_simple, ttl,
+            self._query.cache_key
+        )
+        return self._key
+
+    def _table_write(self, action: str, **kwargs) -> TableWrite:
+        """Изменение таблицы для кеша.
+
+        Args:
+            action (str): insert, update или delete.
+
+        Returns:
+            TableWrite: Изменение таблицы.
+        """
+        return TableWrite(
+            self._table_name, action, 
+            self._query.predicates.get(self._table_name, {}), **kwargs
+        )
+
+    def _use_returning(self, enabled_cache: bool) -> bool:
+        """Нужно ли получать измененные записи через RETURNING.
+
+        Args:
+            enabled_cache (bool): Включен ли кеш.
+
+        Returns:
+            bool: Флаг.
+        """
+        return enabled_cache and self._write_through and self._db.supports_returning()
+
+    def _get_returning_rows(self, rows: Optional[List]) -> Optional[List[Dict]]:
+        """Записи из RETURNING.
+
+        Args:
+            rows (Optional[List]): Строки из БД.
+
+        Returns:
+            Optional[List[Dict]]: Записи или ничего, если RETURNING не использовался.
+        """
+        if rows is None:
+            return None
+        return [dict(zip(self._fields, row)) for row in rows]
+
+    def _write_cache(self, write: TableWrite):
+        """Применяет изменение к кешу или удаляет из кеша затронутые запросы.
+
+        Args:
+            write (TableWrite): Изменение таблицы.
+        """
+        if self._write_through:
+            self._cache.write_through(write)
+        else:
+            self.delete_cache_table(write.predicates())
+
     def delete_cache_query(self):
         """
             Удаление кеша привязанного к запросу. 
         """
         if not self._cache.is_enabled_cache():
             raise DesabledCache()
-        query = self._query.get()
+        query = self._query_key()
         del self._cache[query]
 
-    def delete_cache_table(self):
-        """
-            Удаляет данные из кеша связанные с таблицей.
+    def delete_cache_table(self, predicates: Optional[List[Dict]] = None):
+        """Удаляет данные из кеша связанные с таблицей.
+
+        Args:
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
         """
         if not self._cache.is_enabled_cache():
             raise DesabledCache()
         if self._query.is_table_joined:
             raise ErrorDeleteCacheJoin(self._table_name)
-        self._cache.delete_cache_table(self._table_name)
+        self._cache.delete_cache_table(self._table_name, predicates)
+
+    def _call_query(self, method: Callable, *args, **kwargs):
+        """Вызов метода конструктора запросов. Если в запросе 
+            неизвестное поле, структура таблицы могла измениться -
+            после ее обновления запрос собирается заново 
+            и вызов повторяется один раз.
+
+        Args:
+            method (Callable): Метод конструктора запросов.
+
+        Raises:
+            NotFieldQueryTable: Нет такого поля.
+        """        
+        try:
+            return method(*args, **kwargs)
+        except NotFieldQueryTable:
+            if not self._on_unknown_field:
+                raise
+            if not self._on_unknown_field(self._table_name):
+                raise
+        # поля выборки и присоединенные таблицы собраны по старой структуре
+        self._query = self._query.rebuild()
+        self._key = None
+        return getattr(self._query, method.__name__)(*args, **kwargs)
         
     def select(self, fields: Optional[List[str]] = None) -> 'QueryTable':
-        self._query.select(fields)
+        self._call_query(self._query.select, fields)
         return self
 
     def join(self, table: Union[BaseJoin, BaseQuery]) -> 'QueryTable':
-        self._query.join(table)
+        self._call_query(self._query.join, table)
         return self
 
     def filter(self, **params) -> 'QueryTable':
-        self._query.filter(**params)
+        self._call_query(self._query.filter, **params)
         return self
 
     def order_by(self, **params) -> 'QueryTable':
@@ -87,22 +208,52 @@ class QueryTable(BaseQuery):
         self._query.limit(value)
         return self
 
-    def get(self) -> List[Dict]:
-        """
-            Запрос на получение записей.
+    def get(self, ttl: Optional[int] = None) -> List[Dict]:
+        """Запрос на получение записей.
+
+        Args:
+            ttl (Optional[int], optional): Время жизни результата в кеше. 
+                По умолчанию - время кеша по таблицам запроса.
         """
-        query = self._query.get()
-        if self._cache.is_enabled_cache():
-            cache_data = self._cache[query].get()
-            if cache_data:
+        query = self._query_key(ttl)
+        enabled = self._cache.is_enabled_cache()
+        if enabled:
+            cache_data = self._cache.lookup(query)
+            if cache_data is not None:
+                if self._refresher is not None and self._cache.is_stale(query):
+                    map_fields = list(self._query.map_fields)
+                    self._refresher.submit(
+                        query, lambda: self._fetch(query, enabled, map_fields)
+                    )
                 return cache_data
+            if self._single_flight is not None:
+                return self._single_flight.do(query, lambda: self._fetch(query, enabled))
+        return self._fetch(query, enabled)
+
+    def _fetch(
+        self, query: str, enabled: bool, map_fields: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """Получение записей из БД и сохранение их в кеш.
+
+        Args:
+            query (str): SQL запрос.
+            enabled (bool): Включен ли кеш.
+            map_fields (Optional[List[str]], optional): Поля записей. 
+                По умолчанию - поля текущего запроса.
+
+        Returns:
+            List[Dict]: Записи.
+        """
+        started = time.perf_counter()
         with self._db as db_query:
             db_query.execute(query)
             data = db_query.fetchall()
+        query.cost = time.perf_counter() - started
+        map_fields = map_fields or self._query.map_fields
         res = [
-            dict(zip(self._query.map_fields, row)) for row in data
+            dict(zip(map_fields, row)) for row in data
         ]
-        if self._cache.is_enabled_cache() and res:
+        if enabled and (res or self._cache.is_enabled_negative_cache()):
             self._cache[query] = res
         return res
 
@@ -113,11 +264,18 @@ class QueryTable(BaseQuery):
         Args:
             records (List[Dict]): Записи для вставки в БД.
         """        
-        query = self._query.insert(records)
+        query = self._call_query(self._query.insert, records)
+        enabled = self._cache.is_enabled_cache()
+        returning = self._use_returning(enabled)
+        if returning:
+            query = self._query.returning(query)
         with self._db as db_query:
             db_query.execute(query)
-        if self._cache.is_enabled_cache():
-            self.delete_cache_table()
+            rows = db_query.fetchall() if returning else None
+        if enabled:
+            self._write_cache(self._table_write(
+                'insert', records=records, rows=self._get_returning_rows(rows)
+            ))
 
     def update(self, **params):
         """Обнавляет записи в БД и удаляет 
@@ -126,11 +284,18 @@ class QueryTable(BaseQuery):
         Args:
             params: Параметры обновления.
         """
-        query = self._query.update(**params)
+        query = self._call_query(self._query.update, **params)
+        enabled = self._cache.is_enabled_cache()
+        returning = self._use_returning(enabled)
+        if returning:
+            query = self._query.returning(query)
         with self._db as db_query:
             db_query.execute(query)
-        if self._cache.is_enabled_cache():
-            self.delete_cache_table()
+            rows = db_query.fetchall() if returning else None
+        if enabled:
+            self._write_cache(self._table_write(
+                'update', params=params, rows=self._get_returning_rows(rows)
+            ))
 
     def delete(self):
         """Удаляет записи из БД и удаляет 
@@ -140,7 +305,7 @@ class QueryTable(BaseQuery):
         with self._db as db_query:
             db_query.execute(query)
         if self._cache.is_enabled_cache():
-            self.delete_cache_table()
+            self._write_cache(self._table_write('delete'))
 
 
 class AsyncQueryTable(QueryTable):
@@ -152,7 +317,11 @@ class AsyncQueryTable(QueryTable):
         table_name: str,
         fields: List[str],
         cache: BaseCache, 
-        cls_query: BaseQuery
+        cls_query: BaseQuery,
+        on_unknown_field: Optional[Callable[[str], bool]] = None,
+        write_through: bool = False,
+        single_flight: Optional[Union[SingleFlight, AsyncSingleFlight]] = None,
+        refresher: Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]] = None
     ):
         """
         Args:
@@ -161,6 +330,14 @@ class AsyncQueryTable(QueryTable):
             fields List[str]: Список полей.
             cache (BaseCache): Кеш.
             query (BaseQuery): Класс конструктора запросов.
+            on_unknown_field (Optional[Callable[[str], bool]], optional): Вызывается, 
+                когда в запросе указано неизвестное поле.
+            write_through (bool, optional): Изменения таблицы применяются 
+                к записям запросов в кеше, а не только удаляют их.
+            single_flight (Optional[Union[SingleFlight, AsyncSingleFlight]], optional): Объединение 
+                одинаковых запросов при промахе кеша. По умолчанию - нет.
+            refresher (Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]], optional): Фоновое 
+                обновление устаревших записей кеша. По умолчанию - нет.
         """
         self._db: BaseAsyncDBQuery = None
         self._table_name: str = ''
@@ -169,25 +346,55 @@ class AsyncQueryTable(QueryTable):
         self._query: BaseQuery = None
         super().__init__(
             db, table_name, fields,
-            cache, cls_query
+            cache, cls_query, on_unknown_field, write_through, single_flight, refresher
         )
         
-    async def get(self) -> List[Dict]:
-        """
-            Запрос на получение записей.
+    async def get(self, ttl: Optional[int] = None) -> List[Dict]:
+        """Запрос на получение записей.
+
+        Args:
+            ttl (Optional[int], optional): Время жизни результата в кеше. 
+                По умолчанию - время кеша по таблицам запроса.
         """
-        query = self._query.get()
-        if self._cache.is_enabled_cache():
-            cache_data = self._cache[query].get()
-            if cache_data:
+        query = self._query_key(ttl)
+        enabled = self._cache.is_enabled_cache()
+        if enabled:
+            cache_data = self._cache.lookup(query)
+            if cache_data is not None:
+                if self._refresher is not None and self._cache.is_stale(query):
+                    map_fields = list(self._query.map_fields)
+                    self._refresher.submit(
+                        query, lambda: self._fetch(query, enabled, map_fields)
+                    )
                 return cache_data
+            if self._single_flight is not None:
+                return await self._single_flight.do(query, lambda: self._fetch(query, enabled))
+        return await self._fetch(query, enabled)
+
+    async def _fetch(
+        self, query: str, enabled: bool, map_fields: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """Получение записей из БД и сохранение их в кеш.
+
+        Args:
+            query (str): SQL запрос.
+            enabled (bool): Включен ли кеш.
+            map_fields (Optional[List[str]], optional): Поля записей. 
+                По умолчанию - поля текущего запроса.
+
+        Returns:
+            List[Dict]: Записи.
+        """
+        started = time.perf_counter()
         async with self._db as db_query:
             await db_query.execute(query)
             data = await db_query.fetchall()
+        query.cost = time.perf_counter() - started
+        map_fields = map_fields or self._query.map_fields
         res = [
-            dict(zip(self._query.map_fields, row)) for row in data
+            dict(zip(map_fields, row)) for row in data
         ]
-        if self._cache.is_enabled_cache() and res:
+        if enabled and (res or self._cache.is_enabled_negative_cache()):
             self._cache[query] = res
         return res
 
@@ -198,11 +405,18 @@ class AsyncQueryTable(QueryTable):
         Args:
             records (List[Dict]): Записи для вставки в БД.
         """        
-        query = self._query.insert(records)
+        query = self._call_query(self._query.insert, records)
+        enabled = self._cache.is_enabled_cache()
+        returning = self._use_returning(enabled)
+        if returning:
+            query = self._query.returning(query)
         async with self._db as db_query:
             await db_query.execute(query)
-        if self._cache.is_enabled_cache():
-            self.delete_cache_table()
+            rows = await db_query.fetchall() if returning else None
+        if enabled:
+            self._write_cache(self._table_write(
+                'insert', records=records, rows=self._get_returning_rows(rows)
+            ))
 
     async def update(self, **params):
         """Обнавляет записи в БД и удаляет 
@@ -211,11 +425,18 @@ class AsyncQueryTable(QueryTable):
         Args:
             params: Параметры обновления.
         """
-        query = self._query.update(**params)
+        query = self._call_query(self._query.update, **params)
+        enabled = self._cache.is_enabled_cache()
+        returning = self._use_returning(enabled)
+        if returning:
+            query = self._query.returning(query)
         async with self._db as db_query:
             await db_query.execute(query)
-        if self._cache.is_enabled_cache():
-            self.delete_cache_table()
+            rows = await db_query.fetchall() if returning else None
+        if enabled:
+            self._write_cache(self._table_write(
+                'update', params=params, rows=self._get_returning_rows(rows)
+            ))
 
     async def delete(self):
         """Удаляет записи из БД и удаляет 
@@ -225,7 +446,7 @@ class AsyncQueryTable(QueryTable):
         async with self._db as db_query:
             await db_query.execute(query)
         if self._cache.is_enabled_cache():
-            self.delete_cache_table()
+            self._write_cache(self._table_write('delete'))
             
             
 class AsyncRemoteQueryTable(QueryTable):
@@ -237,7 +458,11 @@ class AsyncRemoteQueryTable(QueryTable):
         table_name: str,
         fields: List[str],
         cache: AsyncBaseCache, 
-        cls_query: BaseQuery
+        cls_query: BaseQuery,
+        on_unknown_field: Optional[Callable[[str], bool]] = None,
+        write_through: bool = False,
+        single_flight: Optional[Union[SingleFlight, AsyncSingleFlight]] = None,
+        refresher: Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]] = None
     ):
         """
         Args:
@@ -246,6 +471,14 @@ class AsyncRemoteQueryTable(QueryTable):
             fields List[str]: Список полей.
             cache (AsyncBaseCache): Кеш.
             query (BaseQuery): Класс конструктора запросов.
+            on_unknown_field (Optional[Callable[[str], bool]], optional): Вызывается, 
+                когда в запросе указано неизвестное поле.
+            write_through (bool, optional): Изменения таблицы применяются 
+                к записям запросов в кеше, а не только удаляют их.
+            single_flight (Optional[Union[SingleFlight, AsyncSingleFlight]], optional): Объединение 
+                одинаковых запросов при промахе кеша. По умолчанию - нет.
+            refresher (Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]], optional): Фоновое 
+                обновление устаревших записей кеша. По умолчанию - нет.
         """
         self._db: BaseAsyncDBQuery = None
         self._table_name: str = ''
@@ -254,7 +487,7 @@ class AsyncRemoteQueryTable(QueryTable):
         self._query: BaseQuery = None
         super().__init__(
             db, table_name, fields,
-            cache, cls_query
+            cache, cls_query, on_unknown_field, write_through, single_flight, refresher
         )
         
     @property
@@ -264,7 +497,7 @@ class AsyncRemoteQueryTable(QueryTable):
         Returns:
             AsyncBaseCache: Кеш.
         """
-        query = self._query.get()
+        query = self._query_key()
         return self._cache[query]
 
     async def delete_cache_query(self):
@@ -274,37 +507,81 @@ class AsyncRemoteQueryTable(QueryTable):
         enabled = await self._cache.is_enabled_cache()
         if not enabled:
             raise DesabledCache()
-        query = self._query.get()
+        query = self._query_key()
         await self._cache[query].delete_query()
 
-    async def delete_cache_table(self):
-        """
-            Удаляет данные из кеша связанные с таблицей.
+    async def delete_cache_table(self, predicates: Optional[List[Dict]] = None):
+        """Удаляет данные из кеша связанные с таблицей.
+
+        Args:
+            predicates (Optional[List[Dict]], optional): Условия измененных записей.
+                Удаляются только запросы, условия которых могут с ними пересечься.
+                По умолчанию - удаляются все запросы с таблицей.
         """
         enabled = await self._cache.is_enabled_cache()
         if not enabled:
             raise DesabledCache()
         if self._query.is_table_joined:
             raise ErrorDeleteCacheJoin(self._table_name)
-        await self._cache.delete_cache_table(self._table_name)
+        await self._cache.delete_cache_table(self._table_name, predicates)
         
-    async def get(self) -> List[Dict]:
+    async def _write_cache(self, write: TableWrite):
+        """Применяет изменение к кешу или удаляет из кеша затронутые запросы.
+
+        Args:
+            write (TableWrite): Изменение таблицы.
         """
-            Запрос на получение записей.
+        if self._write_through:
+            await self._cache.write_through(write)
+        else:
+            await self.delete_cache_table(write.predicates())
+
+    async def get(self, ttl: Optional[int] = None) -> List[Dict]:
+        """Запрос на получение записей.
+
+        Args:
+            ttl (Optional[int], optional): Время жизни результата в кеше. 
+                По умолчанию - время кеша по таблицам запроса.
         """
-        query = self._query.get()
+        query = self._query_key(ttl)
         enabled = await self._cache.is_enabled_cache()
         if enabled:
-            cache_data = await self._cache[query].get()
-            if cache_data:
+            cache_data = await self._cache.lookup(query)
+            if cache_data is not None:
+                if self._refresher is not None and await self._cache.is_stale(query):
+                    map_fields = list(self._query.map_fields)
+                    self._refresher.submit(
+                        query, lambda: self._fetch(query, enabled, map_fields)
+                    )
                 return cache_data
+            if self._single_flight is not None:
+                return await self._single_flight.do(query, lambda: self._fetch(query, enabled))
+        return await self._fetch(query, enabled)
+
+    async def _fetch(
+        self, query: str, enabled: bool, map_fields: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """Получение записей из БД и сохранение их в удаленный кеш.
+
+        Args:
+            query (str): SQL запрос.
+            enabled (bool): Включен ли кеш.
+            map_fields (Optional[List[str]], optional): Поля записей. 
+                По умолчанию - поля текущего запроса.
+
+        Returns:
+            List[Dict]: Записи.
+        """
+        started = time.perf_counter()
         async with self._db as db_query:
             await db_query.execute(query)
             data = await db_query.fetchall()
+        query.cost = time.perf_counter() - started
+        map_fields = map_fields or self._query.map_fields
         res = [
-            dict(zip(self._query.map_fields, row)) for row in data
+            dict(zip(map_fields, row)) for row in data
         ]
-        if enabled and res:
+        if enabled and (res or self._cache.is_enabled_negative_cache()):
             await self._cache[query].set_data(res)
         return res
 
@@ -315,12 +592,12 @@ class AsyncRemoteQueryTable(QueryTable):
         Args:
             records (List[Dict]): Записи для вставки в БД.
         """        
-        query = self._query.insert(records)
+        query = self._call_query(self._query.insert, records)
         async with self._db as db_query:
             await db_query.execute(query)
         enabled = await self._cache.is_enabled_cache()
         if enabled:
-            await self.delete_cache_table()
+            await self._write_cache(self._table_write('insert', records=records))
 
     async def update(self, **params):
         """Обнавляет записи в БД и удаляет 
@@ -329,12 +606,12 @@ class AsyncRemoteQueryTable(QueryTable):
         Args:
             params: Параметры обновления.
         """
-        query = self._query.update(**params)
+        query = self._call_query(self._query.update, **params)
         async with self._db as db_query:
             await db_query.execute(query)
         enabled = await self._cache.is_enabled_cache()
         if enabled:
-            await self.delete_cache_table()
+            await self._write_cache(self._table_write('update', params=params))
 
     async def delete(self):
         """Удаляет записи из БД и удаляет 
@@ -345,4 +622,4 @@ class AsyncRemoteQueryTable(QueryTable):
             await db_query.execute(query)
         enabled = await self._cache.is_enabled_cache()
         if enabled:
-            await self.delete_cache_table()
\ No newline at end of file
+            await self._write_cache(self._table_write('delete'))
\ No newline at end of file
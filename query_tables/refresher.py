@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+from query_tables.fork import register_after_fork, orphan
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresher(object):
+    """
+        Фоновое обновление устаревших записей кеша в пуле потоков.
+        По одному ключу одновременно выполняется только одно обновление.
+    """
+    def __init__(self, max_workers: int = 2):
+        """
+        Args:
+            max_workers (int, optional): Число потоков обновления.
+        """
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._keys: Set[Hashable] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            Потоки пула родителя в дочерний процесс не переносятся.
+        """
+        orphan(self._executor)
+        self._lock = threading.Lock()
+        self._keys = set()
+        self._executor = None
+
+    def submit(self, key: Hashable, func: Callable[[], Any]):
+        """Запускает обновление, если по ключу оно еще не выполняется.
+
+        Args:
+            key (Hashable): Ключ запроса.
+            func (Callable[[], Any]): Функция обновления.
+        """
+        with self._lock:
+            if key in self._keys:
+                return
+            self._keys.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self._max_workers, thread_name_prefix='query_tables_refresh'
+                )
+            executor = self._executor
+        executor.submit(self._run, key, func)
+
+    def _run(self, key: Hashable, func: Callable[[], Any]):
+        try:
+            func()
+        except Exception as e:
+            logger.error(f"Ошибка при фоновом обновлении кеша: {e}")
+        finally:
+            with self._lock:
+                self._keys.discard(key)
+
+
+class AsyncBackgroundRefresher(object):
+    """
+        Фоновое обновление устаревших записей кеша в задачах asyncio.
+        По одному ключу одновременно выполняется только одно обновление.
+    """
+    def __init__(self):
+        self._tasks: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        self._tasks = {}
+
+    def submit(self, key: Hashable, func: Callable[[], Awaitable[Any]]):
+        """Запускает обновление, если по ключу оно еще не выполняется.
+
+        Args:
+            key (Hashable): Ключ запроса.
+            func (Callable[[], Awaitable[Any]]): Асинхронная функция обновления.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        if task_key in self._tasks:
+            return
+        # ссылка на задачу хранится до ее завершения
+        self._tasks[task_key] = loop.create_task(self._run(task_key, func))
+
+    async def _run(self, task_key: Tuple[int, Hashable], func: Callable[[], Awaitable[Any]]):
+        try:
+            await func()
+        except Exception as e:
+            logger.error(f"Ошибка при фоновом обновлении кеша: {e}")
+        finally:
+            self._tasks.pop(task_key, None)
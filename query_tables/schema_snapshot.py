@@ -0,0 +1,74 @@
+import os
+import json
+import logging
+import tempfile
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaSnapshot(object):
+    """
+        Снимок структуры таблиц на диске.
+        Снимок привязан к версии схемы БД и используется,
+        пока версия схемы не изменилась.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Путь к файлу снимка.
+        """
+        self._path = str(path)
+
+    def load(self, version: str, complete: bool = True) -> Optional[Dict[str, List[str]]]:
+        """Загрузка структуры таблиц из снимка.
+
+        Args:
+            version (str): Текущая версия схемы БД.
+            complete (bool, optional): Нужна ли полная структура.
+                При ленивой загрузке подойдет и частичная.
+
+        Returns:
+            Optional[Dict[str, List[str]]]: Структура таблиц или ничего,
+                если снимка нет или он устарел.
+        """
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать снимок структуры таблиц '{self._path}': {e}")
+            return None
+        if snapshot.get('version') != version:
+            return None
+        if complete and not snapshot.get('complete'):
+            return None
+        return snapshot.get('tables') or None
+
+    def save(self, version: str, struct: Dict[str, List[str]], complete: bool = True):
+        """Сохранение структуры таблиц в снимок.
+            Файл заменяется атомарно, чтобы другие процессы
+            не прочитали его частично.
+
+        Args:
+            version (str): Версия схемы БД.
+            struct (Dict[str, List[str]]): Структура таблиц.
+            complete (bool, optional): Полная ли структура.
+        """
+        snapshot = {
+            'version': version,
+            'complete': complete,
+            'tables': struct
+        }
+        dir_name = os.path.dirname(os.path.abspath(self._path))
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить снимок структуры таблиц '{self._path}': {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from query_tables.fork import register_after_fork
+
+
+def _copy_result(result: Any) -> Any:
+    """Копия результата запроса для ожидающего вызова, чтобы изменение 
+        записей одним вызовом не меняло их у других.
+
+    Args:
+        result (Any): Результат запроса.
+
+    Returns:
+        Any: Копия списка записей или сам результат.
+    """
+    if isinstance(result, list):
+        return [dict(item) if isinstance(item, dict) else item for item in result]
+    return result
+
+
+class _Call(object):
+    """
+        Выполняемый запрос, результат которого ждут другие потоки.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(object):
+    """
+        Объединение одинаковых запросов из разных потоков.
+        Запрос по ключу выполняет первый поток, остальные
+        ждут и получают его результат.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        """
+            Потоки, которые выполняли запросы, в дочерний процесс не переносятся.
+        """
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Выполняет функцию или ждет результат уже выполняемой по этому ключу.
+
+        Args:
+            key (Hashable): Ключ запроса.
+            func (Callable[[], Any]): Функция запроса.
+
+        Returns:
+            Any: Результат функции.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return _copy_result(call.result)
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+
+class AsyncSingleFlight(object):
+    """
+        Объединение одинаковых запросов из разных задач asyncio.
+        Запрос по ключу выполняется в отдельной задаче, которую
+        ждут все вызовы. Отмена любого вызова, в том числе первого,
+        не отменяет запрос для остальных.
+    """
+    def __init__(self):
+        self._calls: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        register_after_fork(self._after_fork)
+
+    def _after_fork(self):
+        self._calls = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполняет функцию или ждет результат уже выполняемой по этому ключу.
+
+        Args:
+            key (Hashable): Ключ запроса.
+            func (Callable[[], Awaitable[Any]]): Асинхронная функция запроса.
+
+        Returns:
+            Any: Результат функции.
+        """
+        loop = asyncio.get_running_loop()
+        # задача привязана к циклу событий
+        call_key = (id(loop), key)
+        task = self._calls.get(call_key)
+        if task is None:
+            task = loop.create_task(func())
+            self._calls[call_key] = task
+            task.add_done_callback(lambda done: self._forget(call_key, done))
+        # отмена ожидающей задачи не должна отменять общий запрос
+        return _copy_result(await asyncio.shield(task))
+
+    def _forget(self, call_key: Tuple[int, Hashable], task: asyncio.Task):
+        """Удаляет выполненный запрос. Исключение считается полученным,
+            даже если все ожидавшие задачи были отменены.
+
+        Args:
+            call_key (Tuple[int, Hashable]): Ключ запроса.
+            task (asyncio.Task): Задача запроса.
+        """
+        if self._calls.get(call_key) is task:
+            del self._calls[call_key]
+        if not task.cancelled():
+            task.exception()
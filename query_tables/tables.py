@@ -1,14 +1,24 @@
-
-from typing import List, Optional, Union, Type, Tuple
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import RLock, Thread
+from typing import List, Optional, Union, Type, Tuple, Dict, Iterable
 from query_tables.exceptions import (
     NotTable, ExceptionQueryTable, 
     ErrorLoadingStructTables
 )
 from query_tables.query import Query
-from query_tables.cache import CacheQuery, BaseCache, TypeCache, AsyncBaseCache
+from query_tables.cache import CacheQuery, BaseCache, TypeCache, AsyncBaseCache, CachePolicy
 from query_tables.db import BaseDBQuery, BaseAsyncDBQuery, DBTypes
 from query_tables.query_table import QueryTable, AsyncQueryTable, AsyncRemoteQueryTable
+from query_tables.schema_snapshot import SchemaSnapshot
+from query_tables.fork import register_after_fork, register_at_exit
+from query_tables.single_flight import SingleFlight, AsyncSingleFlight
+from query_tables.refresher import BackgroundRefresher, AsyncBackgroundRefresher
 
+logger = logging.getLogger(__name__)
 
 
 class BaseTables(object):
@@ -20,7 +30,10 @@ class BaseTables(object):
         cls_query_table: Type[Union[QueryTable, AsyncQueryTable]],
         prefix_table: str = '', 
         tables: Optional[List[str]] = None,
-        table_schema: str = 'public'
+        table_schema: str = 'public',
+        lazy: bool = False,
+        schema_snapshot: Optional[str] = None,
+        schema_check_interval: int = 0
     ):
         """
         Args:
@@ -30,6 +43,10 @@ class BaseTables(object):
                 Загружает таблцы по первой части названия, к примеру: common%. Если пустая строка, загрузить все таблицы из схемы.
             tables (Optional[List[str]], optional): Список подключаемых таблиц. По умолчанию - нет.
             table_schema (str, optional): Схема данных. По умолчанию - 'public'.
+            lazy (bool, optional): Загружать структуру таблицы при первом обращение к ней. По умолчанию - выключено.
+            schema_snapshot (Optional[str], optional): Путь к файлу снимка структуры таблиц. По умолчанию - нет.
+            schema_check_interval (int, optional): Как часто в секундах проверять версию схемы БД. 
+                По умолчанию 0 - периодическая проверка отключена.
         """
         self._db: Union[BaseDBQuery, BaseAsyncDBQuery] = db
         self._cls_query_table: Type[Union[QueryTable, AsyncQueryTable]] = cls_query_table
@@ -38,6 +55,20 @@ class BaseTables(object):
         self._tables: Optional[List[str]] = tables
         self._table_schema: str = table_schema
         self._tables_struct: dict[str, list] = {}
+        self._lazy: bool = lazy
+        self._write_through: bool = False
+        self._single_flight: Optional[Union[SingleFlight, AsyncSingleFlight]] = None
+        self._refresher: Optional[Union[BackgroundRefresher, AsyncBackgroundRefresher]] = None
+        self._struct_lock = RLock()
+        self._struct_complete: bool = False # загружена ли структура всех таблиц
+        self._schema_snapshot: Optional[SchemaSnapshot] = (
+            SchemaSnapshot(schema_snapshot) if schema_snapshot else None
+        )
+        self._schema_version: str = '' # отпечаток схемы БД
+        self._cache_snapshot: Optional[str] = None # путь к снимку локального кеша
+        self._schema_check_interval: int = schema_check_interval
+        self._last_schema_check: float = time.monotonic()
+        register_after_fork(self._after_fork)
         
     @property
     def _pg_query_struct(self):
@@ -55,7 +86,210 @@ class BaseTables(object):
         elif self._tables:
             tables = ', '.join(f"'{i}'" for i in self._tables)
             query += f" and it.table_name in ({tables})"
+        query += " order by it.table_name, ic.ordinal_position"
+        return query
+
+    @property
+    def _pg_query_schema_version(self):
+        query = """
+            select md5(coalesce(string_agg(
+                c.relname || '.' || a.attname || '.' || a.attnum, ',' 
+                order by c.relname, a.attnum
+            ), ''))
+            from pg_catalog.pg_attribute a
+            join pg_catalog.pg_class c on c.oid = a.attrelid
+            join pg_catalog.pg_namespace n on n.oid = c.relnamespace
+            where a.attnum > 0 and not a.attisdropped 
+                and c.relkind in ('r', 'p', 'v', 'm', 'f')
+        """
+        if self._table_schema:
+            query += f" and n.nspname = '{self._table_schema}'"
+        if self._prefix_table:
+            query += f" and c.relname like '{self._prefix_table}%%'"
+        elif self._tables:
+            tables = ', '.join(f"'{i}'" for i in self._tables)
+            query += f" and c.relname in ({tables})"
+        return query
+
+    @property
+    def _sqlite_query_schema_version(self):
+        return "PRAGMA schema_version;"
+
+    def _make_schema_version(self, db_version: object) -> str:
+        """Отпечаток схемы с учетом параметров загрузки таблиц.
+
+        Args:
+            db_version (object): Версия схемы из БД.
+
+        Returns:
+            str: Отпечаток схемы.
+        """        
+        params = f'{db_version}|{self._table_schema}|{self._prefix_table}|{self._tables}'
+        return hashlib.md5(params.encode('utf-8')).hexdigest()
+
+    def _set_tables_struct(self, struct: Dict[str, List[str]], complete: bool):
+        """Устанавливает загруженную структуру таблиц.
+
+        Args:
+            struct (Dict[str, List[str]]): Структура таблиц.
+            complete (bool): Структура всех таблиц.
+        """        
+        self._tables_struct.update(struct)
+        self._struct_complete = self._struct_complete or complete
+
+    def _apply_tables_struct(self, struct: Dict[str, Optional[List[str]]]) -> List[str]:
+        """Применяет новую структуру таблиц и возвращает изменившиеся таблицы.
+            Список полей меняется на месте, поэтому уже созданные 
+            запросы тоже видят новые поля.
+
+        Args:
+            struct (Dict[str, Optional[List[str]]]): Новая структура таблиц.
+                Если у таблицы нет полей, она удалена из БД.
+
+        Returns:
+            List[str]: Изменившиеся таблицы.
+        """
+        changed = []
+        for table_name in set(self._tables_struct) | set(struct):
+            old_fields = self._tables_struct.get(table_name)
+            new_fields = struct.get(table_name)
+            if old_fields == new_fields:
+                continue
+            changed.append(table_name)
+            if not new_fields:
+                del self._tables_struct[table_name]
+            elif old_fields is None:
+                self._tables_struct[table_name] = new_fields
+            else:
+                old_fields[:] = new_fields
+        return changed
+
+    def _after_fork(self):
+        """
+            В дочернем процессе создается своя блокировка. 
+            Структура таблиц остается общей с родителем до первого изменения.
+        """
+        self._struct_lock = RLock()
+
+    def _is_time_check_schema(self) -> bool:
+        """Пора ли проверить версию схемы БД.
+
+        Returns:
+            bool: Флаг.
+        """        
+        if not self._schema_check_interval:
+            return False
+        now = time.monotonic()
+        if now - self._last_schema_check < self._schema_check_interval:
+            return False
+        self._last_schema_check = now
+        return True
+
+    def _poll_schema(self):
+        """
+            Проверка версии схемы БД при обращение к таблицам.
+        """
+        ...
+
+    def _on_unknown_field(self, table_name: str) -> bool:
+        """Вызывается, когда в запросе используется неизвестное поле таблицы.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            bool: Была ли обновлена структура таблицы.
+        """        
+        return False
+
+    def _init_cache_snapshot(self):
+        """
+            Загружает локальный кеш из снимка и сохраняет его 
+            в снимок при завершение процесса.
+        """
+        if not self._cache_snapshot:
+            return None
+        if not isinstance(self._cache, CacheQuery):
+            logger.warning("Снимок кеша сохраняется только для локального кеша CacheQuery.")
+            return None
+        count = self._cache.load(self._cache_snapshot, self._schema_version)
+        logger.info(f"Из снимка кеша загружено запросов: {count}")
+        register_at_exit(self._save_cache_snapshot)
+
+    def _save_cache_snapshot(self):
+        """
+            Сохраняет локальный кеш в снимок на диске.
+        """
+        self._cache.snapshot(self._cache_snapshot, self._schema_version)
+
+    def _save_schema_snapshot(self):
+        """
+            Сохраняет структуру таблиц в снимок на диске.
+        """        
+        if self._schema_snapshot and self._schema_version:
+            self._schema_snapshot.save(
+                self._schema_version, self._tables_struct, 
+                self._struct_complete
+            )
+
+    def _pg_query_table_struct(self, table_name: str) -> str:
+        """SQL запрос на получение полей одной таблицы из postgres.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            str: SQL запрос.
+        """        
+        table_name = table_name.replace("'", "''")
+        query = f"""
+            select ic.column_name
+            from information_schema.columns ic
+            where ic.table_name = '{table_name}'
+        """
+        if self._table_schema:
+            query += f" and ic.table_schema = '{self._table_schema}'"
+        query += " order by ic.ordinal_position"
         return query
+
+    def _sqlite_query_table_struct(self, table_name: str) -> str:
+        """SQL запрос на получение полей одной таблицы из sqlite.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            str: SQL запрос.
+        """        
+        table_name = table_name.replace('"', '""')
+        return f'PRAGMA table_info("{table_name}");'
+
+    def _is_table_allowed(self, table_name: str) -> bool:
+        """Проверка, что таблицу можно подключить 
+            с учетом префикса и списка таблиц.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            bool: Флаг.
+        """        
+        if self._prefix_table:
+            return table_name.startswith(self._prefix_table)
+        if self._tables:
+            return table_name in self._tables
+        return True
+
+    def _get_table_fields(self, table_name: str) -> Optional[List[str]]:
+        """Получение полей таблицы из загруженной структуры.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            Optional[List[str]]: Поля таблицы.
+        """        
+        return self._tables_struct.get(table_name)
         
     def __getitem__(self, table_name: str) -> QueryTable:
         """Получение экземпляра для запроса.
@@ -69,14 +303,18 @@ class BaseTables(object):
         Returns:
             QueryTable: Экземпляр запроса.
         """        
-        try:
-            fields: list = self._tables_struct[table_name]
-        except Exception as e:
+        self._poll_schema()
+        fields: Optional[list] = self._get_table_fields(table_name)
+        if not fields:
             raise NotTable(table_name)
         try:
             return self._cls_query_table(
                 self._db, table_name, fields, 
-                self._cache, Query
+                self._cache, Query,
+                on_unknown_field=self._on_unknown_field,
+                write_through=self._write_through,
+                single_flight=self._single_flight,
+                refresher=self._refresher
             )
         except Exception as e:
             raise ExceptionQueryTable(table_name, e)
@@ -95,10 +333,23 @@ class Tables(BaseTables):
         prefix_table: str = '', 
         tables: Optional[List[str]] = None,
         table_schema:str = 'public',
-        cache_ttl: int = 0,
+        cache_ttl: Union[int, Dict[str, int]] = 0,
         non_expired: bool = False,
         cache_maxsize: int = 1024,
-        cache: Optional[BaseCache] = None
+        cache: Optional[BaseCache] = None,
+        lazy: bool = False,
+        prefetch_tables: Optional[List[str]] = None,
+        schema_snapshot: Optional[str] = None,
+        schema_check_interval: int = 0,
+        cache_versioned_keys: bool = False,
+        cache_write_through: bool = False,
+        cache_max_bytes: int = 0,
+        cache_max_entry_bytes: int = 0,
+        cache_single_flight: bool = True,
+        cache_stale_ttl: int = 0,
+        cache_negative_ttl: int = 0,
+        cache_policy: Union[str, CachePolicy] = 'lru',
+        cache_snapshot: Optional[str] = None
     ):
         """
         Args:
@@ -107,29 +358,111 @@ class Tables(BaseTables):
                 Загружает таблцы по первой части названия, к примеру: common%. Если пустая строка, загрузить все таблицы из схемы.
             tables (Optional[List[str]], optional): Список подключаемых таблиц. По умолчанию - нет.
             table_schema (str, optional): Схема данных. По умолчанию - 'public'.
-            cache_ttl (int, optional): Время кеширования данных. По умолчанию 0 секунд - кеширование отключено.
+            cache_ttl (Union[int, Dict[str, int]], optional): Время кеширования данных. По умолчанию 0 секунд - кеширование отключено.
+                Можно задать время по таблицам: `{'country': 86400, 'orders': 5}`. Запрос с несколькими 
+                таблицами живет наименьшее из их времен, таблицы не из словаря не кешируются.
             non_expired (bool, optional): Вечный кеш без времени истечения. По умолчанию - выключен.
                 Если включить, будет использоваться вне зависимости от cache_ttl.
                 При non_expired=False и cache_ttl=0 - кеш отключен.
             cache_maxsize (int, optional): Размер элементов в кеше.
             cache (BaseCache, optional): Пользовательская реализация кеша.
+            lazy (bool, optional): Ленивая загрузка структуры таблиц. Структура таблицы 
+                загружается при первом обращение к ней. По умолчанию - выключена.
+            prefetch_tables (Optional[List[str]], optional): Таблицы, структура которых 
+                загружается в фоне при ленивой загрузке. По умолчанию - нет.
+            schema_snapshot (Optional[str], optional): Путь к файлу снимка структуры таблиц.
+                Структура берется из снимка, пока не изменилась версия схемы БД. По умолчанию - нет.
+            schema_check_interval (int, optional): Как часто в секундах проверять версию схемы БД.
+                Если схема изменилась, структура изменившихся таблиц перезагружается, 
+                а их данные удаляются из кеша. По умолчанию 0 - периодическая проверка отключена.
+            cache_versioned_keys (bool, optional): Ключи локального кеша включают поколения таблиц.
+                Изменение таблицы увеличивает ее поколение, а старые записи 
+                вытесняются по времени жизни или размеру кеша. По умолчанию - выключены.
+            cache_write_through (bool, optional): Изменения таблиц через `insert`, `update` и `delete`
+                применяются к записям простых запросов в кеше вместо их удаления. По умолчанию - выключено.
+            cache_max_bytes (int, optional): Размер локального кеша в байтах. Если задан, 
+                используется вместо cache_maxsize. По умолчанию 0 - не задан.
+            cache_max_entry_bytes (int, optional): Максимальный размер результата одного запроса 
+                в локальном кеше в байтах. По умолчанию 0 - без ограничения.
+            cache_single_flight (bool, optional): При промахе кеша одинаковые запросы 
+                из разных потоков или задач выполняются в БД один раз. По умолчанию - включено.
+            cache_stale_ttl (int, optional): Сколько секунд после cache_ttl запись еще отдается 
+                из локального кеша, пока ее обновляет фоновый запрос к БД. По умолчанию 0 - выключено.
+            cache_negative_ttl (int, optional): Сколько секунд локальный кеш хранит пустые результаты 
+                запросов, но не дольше cache_ttl. По умолчанию 0 - пустые результаты не кешируются.
+            cache_policy (Union[str, CachePolicy], optional): Политика вытеснения запросов 
+                из локального кеша: `lru`, `lfu`, `tinylfu` или `cost`. По умолчанию - `lru`.
+            cache_snapshot (Optional[str], optional): Путь к файлу снимка локального кеша.
+                Кеш загружается из снимка при запуске, если не изменилась версия схемы БД,
+                и сохраняется в снимок при завершение процесса. По умолчанию - нет.
         """
         super().__init__(
             db, QueryTable, 
-            prefix_table, tables, table_schema
+            prefix_table, tables, table_schema, 
+            lazy, schema_snapshot, schema_check_interval
         )
-        self._cache = cache or CacheQuery(cache_ttl, cache_maxsize, False, non_expired)
-        if TypeCache.remote == self._cache.type_cache:
-            _tables_struct = self._cache._get_struct_tables()
+        self._cache = cache or CacheQuery(
+            cache_ttl, cache_maxsize, False, non_expired, cache_versioned_keys,
+            cache_max_bytes, cache_max_entry_bytes, cache_stale_ttl,
+            negative_ttl=cache_negative_ttl, policy=cache_policy
+        )
+        self._write_through = cache_write_through
+        self._cache_snapshot = cache_snapshot
+        self._single_flight = SingleFlight() if cache_single_flight else None
+        self._refresher = BackgroundRefresher()
+        self._init_tables_struct(prefetch_tables)
+
+    def _init_tables_struct(self, prefetch_tables: Optional[List[str]] = None):
+        """Загружает структуру таблиц из снимка, удаленного кеша или БД.
+
+        Args:
+            prefetch_tables (Optional[List[str]], optional): Таблицы для фоновой загрузки.
+        """        
+        remote = TypeCache.remote == self._cache.type_cache
+        if remote or self._schema_snapshot or self._schema_check_interval or self._cache_snapshot:
+            self._schema_version = self._get_schema_version()
+        self._init_cache_snapshot()
+        if self._schema_snapshot:
+            _tables_struct = self._schema_snapshot.load(self._schema_version, not self._lazy)
             if _tables_struct:
-                self._tables_struct = _tables_struct
+                self._set_tables_struct(_tables_struct, not self._lazy)
+                if not self._lazy:
+                    return
+        if remote:
+            _tables_struct = self._cache._get_struct_tables(self._schema_version)
+            if _tables_struct:
+                self._set_tables_struct(_tables_struct, True)
+                self._save_schema_snapshot()
                 return
-        if DBTypes.postgres == db.get_type():
-            self._fill_tables_pg_struct()
-        elif DBTypes.sqlite == db.get_type():
-            self._fill_tables_sqlite_struct()
-        if TypeCache.remote == self._cache.type_cache:
-            self._cache._save_struct_tables(self._tables_struct)
+        if self._lazy:
+            if prefetch_tables:
+                Thread(
+                    target=self._prefetch_tables_struct, 
+                    args=(prefetch_tables,), daemon=True
+                ).start()
+            return
+        self._set_tables_struct(self._fetch_tables_struct(), True)
+        if remote:
+            self._cache._save_struct_tables(self._tables_struct, self._schema_version)
+        self._save_schema_snapshot()
+
+    def _get_schema_version(self) -> str:
+        """Получение отпечатка схемы БД.
+
+        Returns:
+            str: Отпечаток схемы.
+        """        
+        if DBTypes.postgres == self._db.get_type():
+            query = self._pg_query_schema_version
+        else:
+            query = self._sqlite_query_schema_version
+        try:
+            with self._db as db_query:
+                db_query.execute(query)
+                data = db_query.fetchall()
+        except Exception as e:
+            raise ErrorLoadingStructTables(e)
+        return self._make_schema_version(data[0][0] if data else '')
             
     def query(
         self, sql: str,
@@ -160,36 +493,239 @@ class Tables(BaseTables):
             self._cache._save_data_query(sql, data)
         return data
 
-    def _fill_tables_pg_struct(self):
+    def warm(
+        self, queries: Iterable[Union[QueryTable, str]], 
+        concurrency: int = 4
+    ) -> int:
+        """Прогрев кеша перед началом работы. Запросы выполняются 
+            в БД параллельно, и их результаты сохраняются в кеш.
+
+        Args:
+            queries (Iterable[Union[QueryTable, str]]): Запросы, построенные через `tables[...]`, 
+                или SQL запросы, которые потом читаются через `query(sql, cache=True)`.
+            concurrency (int, optional): Сколько запросов выполняется одновременно. По умолчанию 4.
+
+        Returns:
+            int: Сколько запросов сохранено в кеш.
+        """
+        if not self._cache.is_enabled_cache():
+            return 0
+        queries = [query for query in queries if not isinstance(query, str) or query.strip()]
+        if not queries:
+            return 0
+        with ThreadPoolExecutor(
+            max(concurrency, 1), thread_name_prefix='query_tables_warm'
+        ) as executor:
+            return sum(executor.map(self._warm_query, queries))
+
+    def _warm_query(self, query: Union[QueryTable, str]) -> bool:
+        """Выполняет запрос для прогрева кеша.
+
+        Args:
+            query (Union[QueryTable, str]): Запрос.
+
+        Returns:
+            bool: Сохранен ли результат в кеш.
+        """
+        try:
+            if isinstance(query, str):
+                self.query(query.strip(), cache=True)
+            else:
+                query.get()
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при прогреве кеша: {e}")
+            return False
+
+    def _get_table_fields(self, table_name: str) -> Optional[List[str]]:
+        """Получение полей таблицы. При ленивой загрузке 
+            структура таблицы получается из БД при первом обращение.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            Optional[List[str]]: Поля таблицы.
+        """        
+        fields = self._tables_struct.get(table_name)
+        if fields is None and self._lazy:
+            fields = self._load_table_struct(table_name)
+        return fields
+
+    def _load_table_struct(self, table_name: str) -> Optional[List[str]]:
+        """Загружает структуру одной таблицы из БД.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            Optional[List[str]]: Поля таблицы или ничего, если таблицы нет.
+        """        
+        with self._struct_lock:
+            if table_name in self._tables_struct:
+                return self._tables_struct[table_name]
+            if not self._is_table_allowed(table_name):
+                return None
+            fields = self._fetch_table_struct(table_name)
+            if not fields:
+                return None
+            self._tables_struct[table_name] = fields
+            self._save_schema_snapshot()
+            return fields
+
+    def _prefetch_tables_struct(self, tables: List[str]):
+        """Фоновая загрузка структуры часто используемых таблиц.
+
+        Args:
+            tables (List[str]): Список таблиц.
+        """        
+        for table_name in tables:
+            try:
+                self._load_table_struct(table_name)
+            except Exception as e:
+                logger.error(f"Ошибка при фоновой загрузке структуры таблицы '{table_name}': {e}")
+
+    def check_schema(self) -> List[str]:
+        """Проверяет версию схемы БД. Если схема изменилась, 
+            перезагружает структуру изменившихся таблиц.
+
+        Returns:
+            List[str]: Изменившиеся таблицы.
+        """
+        self._last_schema_check = time.monotonic()
+        version = self._get_schema_version()
+        if version == self._schema_version:
+            return []
+        return self.reload_schema(version)
+
+    def reload_schema(self, version: str = '') -> List[str]:
+        """Перезагружает структуру таблиц из БД. Данные изменившихся 
+            таблиц удаляются из кеша.
+
+        Args:
+            version (str, optional): Версия схемы БД, если она уже известна.
+
+        Returns:
+            List[str]: Изменившиеся таблицы.
+        """
+        remote = TypeCache.remote == self._cache.type_cache
+        with self._struct_lock:
+            version = version or self._get_schema_version()
+            struct = None
+            if remote:
+                struct = self._cache._get_struct_tables(version)
+            if not struct and self._lazy and not self._struct_complete:
+                struct = {
+                    table_name: self._fetch_table_struct(table_name)
+                    for table_name in list(self._tables_struct)
+                }
+            elif not struct:
+                struct = self._fetch_tables_struct()
+                if remote:
+                    self._cache._save_struct_tables(struct, version)
+            changed = self._apply_tables_struct(struct)
+            self._schema_version = version
+            self._save_schema_snapshot()
+        if changed and self._cache.is_enabled_cache():
+            for table_name in changed:
+                self._cache.delete_cache_table(table_name)
+        if changed:
+            logger.info(f"Перезагружена структура таблиц: {', '.join(changed)}")
+        return changed
+
+    def _poll_schema(self):
+        """
+            Проверка версии схемы БД при обращение к таблицам.
+        """
+        if not self._is_time_check_schema():
+            return
+        try:
+            self.check_schema()
+        except Exception as e:
+            logger.error(f"Ошибка при проверке версии схемы БД: {e}")
+
+    def _on_unknown_field(self, table_name: str) -> bool:
+        """Вызывается, когда в запросе используется неизвестное поле таблицы.
+            Проверяет схему БД не чаще раза в секунду, 
+            даже если периодическая проверка отключена.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            bool: Была ли обновлена структура таблицы.
+        """        
+        if time.monotonic() - self._last_schema_check < 1:
+            return False
+        return table_name in self.check_schema()
+
+    def _fetch_table_struct(self, table_name: str) -> Optional[List[str]]:
+        """Получает поля одной таблицы из БД.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            Optional[List[str]]: Поля таблицы или ничего, если таблицы нет.
+        """        
+        if DBTypes.postgres == self._db.get_type():
+            query = self._pg_query_table_struct(table_name)
+            field_index = 0
+        else:
+            query = self._sqlite_query_table_struct(table_name)
+            field_index = 1
+        try:
+            with self._db as db_query:
+                db_query.execute(query)
+                data = db_query.fetchall()
+        except Exception as e:
+            raise ErrorLoadingStructTables(e)
+        return [row[field_index] for row in data or []] or None
+
+    def _fetch_tables_struct(self) -> Dict[str, List[str]]:
+        """Получает структуру всех таблиц из БД.
+
+        Returns:
+            Dict[str, List[str]]: Структура таблиц.
+        """        
+        if DBTypes.postgres == self._db.get_type():
+            return self._fetch_tables_pg_struct()
+        return self._fetch_tables_sqlite_struct()
+
+    def _fetch_tables_pg_struct(self) -> Dict[str, List[str]]:
         """
             Получает таблицы и название колоннок из postgres.
         """
+        tables_struct = {}
         with self._db as db_query:
             db_query.execute(self._pg_query_struct)
             data = db_query.fetchall()
         for row in data:
-            if row[0] in self._tables_struct:
-                self._tables_struct[row[0]].append(row[1])
+            if row[0] in tables_struct:
+                tables_struct[row[0]].append(row[1])
             else:
-                self._tables_struct[row[0]] = [row[1]]
+                tables_struct[row[0]] = [row[1]]
+        return tables_struct
                 
-    def _fill_tables_sqlite_struct(self):
+    def _fetch_tables_sqlite_struct(self) -> Dict[str, List[str]]:
         """
             Получает таблицы и название колоннок из sqlite.
         """
+        tables_struct = {}
         try:
             db_query = self._db.connect()
             db_query.execute("select name from sqlite_master where type='table';")
             for row in db_query.fetchall():
-                self._tables_struct[row[0]] = []
-            for table in self._tables_struct.keys():
+                tables_struct[row[0]] = []
+            for table in tables_struct.keys():
                 db_query.execute(f"PRAGMA table_info({table});")
                 for row in db_query.fetchall():
-                    self._tables_struct[table].append(row[1])
+                    tables_struct[table].append(row[1])
         except Exception as e:
             raise ErrorLoadingStructTables(e)
         finally:
             self._db.close()
+        return tables_struct
 
 
 class TablesAsync(BaseTables):
@@ -202,10 +738,23 @@ class TablesAsync(BaseTables):
         prefix_table: str = '', 
         tables: Optional[List[str]] = None,
         table_schema:str = 'public',
-        cache_ttl: int = 0,
+        cache_ttl: Union[int, Dict[str, int]] = 0,
         non_expired: bool = False,
         cache_maxsize: int = 1024,
-        cache: Optional[Union[BaseCache, AsyncBaseCache]] = None
+        cache: Optional[Union[BaseCache, AsyncBaseCache]] = None,
+        lazy: bool = False,
+        prefetch_tables: Optional[List[str]] = None,
+        schema_snapshot: Optional[str] = None,
+        schema_check_interval: int = 0,
+        cache_versioned_keys: bool = False,
+        cache_write_through: bool = False,
+        cache_max_bytes: int = 0,
+        cache_max_entry_bytes: int = 0,
+        cache_single_flight: bool = True,
+        cache_stale_ttl: int = 0,
+        cache_negative_ttl: int = 0,
+        cache_policy: Union[str, CachePolicy] = 'lru',
+        cache_snapshot: Optional[str] = None
     ):
         """
         Args:
@@ -214,34 +763,113 @@ class TablesAsync(BaseTables):
                 Загружает таблцы по первой части названия, к примеру: common%. Если пустая строка, загрузить все таблицы из схемы.
             tables (Optional[List[str]], optional): Список подключаемых таблиц. По умолчанию - нет.
             table_schema (str, optional): Схема данных. По умолчанию - 'public'.
-            cache_ttl (int, optional): Время кеширования данных. По умолчанию 0 секунд - кеширование отключено.
+            cache_ttl (Union[int, Dict[str, int]], optional): Время кеширования данных. По умолчанию 0 секунд - кеширование отключено.
+                Можно задать время по таблицам: `{'country': 86400, 'orders': 5}`. Запрос с несколькими 
+                таблицами живет наименьшее из их времен, таблицы не из словаря не кешируются.
             non_expired (bool, optional): Вечный кеш без времени истечения. По умолчанию - выключен.
                 Если включить, будет использоваться вне зависимости от cache_ttl.
                 При non_expired=False и cache_ttl=0 - кеш отключен.
             cache_maxsize (int, optional): Размер элементов в кеше.
             cache (AsyncBaseCache, optional): Пользовательская реализация кеша.
+            lazy (bool, optional): Ленивая загрузка структуры таблиц. Таблицы загружаются 
+                через `load_tables` или в фоне из `prefetch_tables`. По умолчанию - выключена.
+            prefetch_tables (Optional[List[str]], optional): Таблицы, структура которых 
+                загружается в фоне при ленивой загрузке. По умолчанию - нет.
+            schema_snapshot (Optional[str], optional): Путь к файлу снимка структуры таблиц.
+                Структура берется из снимка, пока не изменилась версия схемы БД. По умолчанию - нет.
+            schema_check_interval (int, optional): Как часто в секундах проверять версию схемы БД.
+                Если схема изменилась, структура изменившихся таблиц перезагружается, 
+                а их данные удаляются из кеша. По умолчанию 0 - периодическая проверка отключена.
+            cache_versioned_keys (bool, optional): Ключи локального кеша включают поколения таблиц.
+                Изменение таблицы увеличивает ее поколение, а старые записи 
+                вытесняются по времени жизни или размеру кеша. По умолчанию - выключены.
+            cache_write_through (bool, optional): Изменения таблиц через `insert`, `update` и `delete`
+                применяются к записям простых запросов в кеше вместо их удаления. По умолчанию - выключено.
+            cache_max_bytes (int, optional): Размер локального кеша в байтах. Если задан, 
+                используется вместо cache_maxsize. По умолчанию 0 - не задан.
+            cache_max_entry_bytes (int, optional): Максимальный размер результата одного запроса 
+                в локальном кеше в байтах. По умолчанию 0 - без ограничения.
+            cache_single_flight (bool, optional): При промахе кеша одинаковые запросы 
+                из разных потоков или задач выполняются в БД один раз. По умолчанию - включено.
+            cache_stale_ttl (int, optional): Сколько секунд после cache_ttl запись еще отдается 
+                из локального кеша, пока ее обновляет фоновый запрос к БД. По умолчанию 0 - выключено.
+            cache_negative_ttl (int, optional): Сколько секунд локальный кеш хранит пустые результаты 
+                запросов, но не дольше cache_ttl. По умолчанию 0 - пустые результаты не кешируются.
+            cache_policy (Union[str, CachePolicy], optional): Политика вытеснения запросов 
+                из локального кеша: `lru`, `lfu`, `tinylfu` или `cost`. По умолчанию - `lru`.
+            cache_snapshot (Optional[str], optional): Путь к файлу снимка локального кеша.
+                Кеш загружается из снимка при запуске, если не изменилась версия схемы БД,
+                и сохраняется в снимок при завершение процесса. По умолчанию - нет.
         """
         cls_query_table = AsyncQueryTable
         if cache and (TypeCache.remote == cache.type_cache):
             cls_query_table = AsyncRemoteQueryTable
         super().__init__(
             db, cls_query_table, 
-            prefix_table, tables, table_schema
+            prefix_table, tables, table_schema, 
+            lazy, schema_snapshot, schema_check_interval
         )
-        self._cache = cache or CacheQuery(cache_ttl, cache_maxsize, True, non_expired)
+        self._cache = cache or CacheQuery(
+            cache_ttl, cache_maxsize, True, non_expired, cache_versioned_keys,
+            cache_max_bytes, cache_max_entry_bytes, cache_stale_ttl,
+            negative_ttl=cache_negative_ttl, policy=cache_policy
+        )
+        self._write_through = cache_write_through
+        self._cache_snapshot = cache_snapshot
+        self._single_flight = AsyncSingleFlight() if cache_single_flight else None
+        self._refresher = AsyncBackgroundRefresher()
+        self._prefetch_tables: Optional[List[str]] = prefetch_tables
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._schema_task: Optional[asyncio.Task] = None
     
     async def init(self):
-        if TypeCache.remote == self._cache.type_cache:
-            _tables_struct = await self._cache._get_struct_tables()
+        """
+            Загружает структуру таблиц из снимка, удаленного кеша или БД.
+        """
+        remote = TypeCache.remote == self._cache.type_cache
+        if remote or self._schema_snapshot or self._schema_check_interval or self._cache_snapshot:
+            self._schema_version = await self._get_schema_version()
+        self._init_cache_snapshot()
+        if self._schema_snapshot:
+            _tables_struct = self._schema_snapshot.load(self._schema_version, not self._lazy)
             if _tables_struct:
-                self._tables_struct = _tables_struct
+                self._set_tables_struct(_tables_struct, not self._lazy)
+                if not self._lazy:
+                    return
+        if remote:
+            _tables_struct = await self._cache._get_struct_tables(self._schema_version)
+            if _tables_struct:
+                self._set_tables_struct(_tables_struct, True)
+                self._save_schema_snapshot()
                 return
+        if self._lazy:
+            if self._prefetch_tables:
+                self._prefetch_task = asyncio.ensure_future(
+                    self._prefetch_tables_struct(self._prefetch_tables)
+                )
+            return
+        self._set_tables_struct(await self._fetch_tables_struct(), True)
+        if remote:
+            await self._cache._save_struct_tables(self._tables_struct, self._schema_version)
+        self._save_schema_snapshot()
+
+    async def _get_schema_version(self) -> str:
+        """Получение отпечатка схемы БД.
+
+        Returns:
+            str: Отпечаток схемы.
+        """        
         if DBTypes.postgres == self._db.get_type():
-            await self._fill_tables_pg_struct()
-        elif DBTypes.sqlite == self._db.get_type():
-            await self._fill_tables_sqlite_struct()
-        if TypeCache.remote == self._cache.type_cache:
-            await self._cache._save_struct_tables(self._tables_struct)
+            query = self._pg_query_schema_version
+        else:
+            query = self._sqlite_query_schema_version
+        try:
+            async with self._db as db_query:
+                await db_query.execute(query)
+                data = await db_query.fetchall()
+        except Exception as e:
+            raise ErrorLoadingStructTables(e)
+        return self._make_schema_version(data[0][0] if data else '')
             
     async def query(
         self, sql: str,
@@ -280,6 +908,58 @@ class TablesAsync(BaseTables):
             else:
                 self._cache._save_data_query(sql, data)
         return data
+
+    async def warm(
+        self, queries: Iterable[Union[AsyncQueryTable, str]], 
+        concurrency: int = 4
+    ) -> int:
+        """Прогрев кеша перед началом работы. Запросы выполняются 
+            в БД параллельно, и их результаты сохраняются в кеш.
+
+        Args:
+            queries (Iterable[Union[AsyncQueryTable, str]]): Запросы, построенные через `tables[...]`, 
+                или SQL запросы, которые потом читаются через `query(sql, cache=True)`.
+            concurrency (int, optional): Сколько запросов выполняется одновременно. По умолчанию 4.
+
+        Returns:
+            int: Сколько запросов сохранено в кеш.
+        """
+        if TypeCache.remote == self._cache.type_cache:
+            enabled = await self._cache.is_enabled_cache()
+        else:
+            enabled = self._cache.is_enabled_cache()
+        if not enabled:
+            return 0
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        res = await asyncio.gather(*[
+            self._warm_query(query, semaphore) for query in queries
+            if not isinstance(query, str) or query.strip()
+        ])
+        return sum(res)
+
+    async def _warm_query(
+        self, query: Union[AsyncQueryTable, str], 
+        semaphore: asyncio.Semaphore
+    ) -> bool:
+        """Выполняет запрос для прогрева кеша.
+
+        Args:
+            query (Union[AsyncQueryTable, str]): Запрос.
+            semaphore (asyncio.Semaphore): Ограничение одновременных запросов.
+
+        Returns:
+            bool: Сохранен ли результат в кеш.
+        """
+        async with semaphore:
+            try:
+                if isinstance(query, str):
+                    await self.query(query.strip(), cache=True)
+                else:
+                    await query.get()
+                return True
+            except Exception as e:
+                logger.error(f"Ошибка при прогреве кеша: {e}")
+                return False
             
     async def clear_cache(self):
         """
@@ -289,36 +969,226 @@ class TablesAsync(BaseTables):
             await self._cache.clear()
         else:
             self._cache.clear()
+
+    async def load_tables(self, *tables_name: str):
+        """Загружает структуру таблиц при ленивой загрузке.
+            После загрузки таблицы доступны через `tables[table_name]`.
+
+        Args:
+            tables_name (str): Названия таблиц.
+            
+        Raises:
+            NotTable: Такой таблице нет.
+        """
+        for table_name in tables_name:
+            fields = await self._load_table_struct(table_name)
+            if not fields:
+                raise NotTable(table_name)
+
+    async def _load_table_struct(self, table_name: str) -> Optional[List[str]]:
+        """Загружает структуру одной таблицы из БД.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            Optional[List[str]]: Поля таблицы или ничего, если таблицы нет.
+        """        
+        if table_name in self._tables_struct:
+            return self._tables_struct[table_name]
+        if not self._is_table_allowed(table_name):
+            return None
+        fields = await self._fetch_table_struct(table_name)
+        if not fields:
+            return None
+        self._tables_struct[table_name] = fields
+        self._save_schema_snapshot()
+        return fields
+
+    async def _prefetch_tables_struct(self, tables: List[str]):
+        """Фоновая загрузка структуры часто используемых таблиц.
+
+        Args:
+            tables (List[str]): Список таблиц.
+        """        
+        for table_name in tables:
+            try:
+                await self._load_table_struct(table_name)
+            except Exception as e:
+                logger.error(f"Ошибка при фоновой загрузке структуры таблицы '{table_name}': {e}")
+
+    async def check_schema(self) -> List[str]:
+        """Проверяет версию схемы БД. Если схема изменилась, 
+            перезагружает структуру изменившихся таблиц.
+
+        Returns:
+            List[str]: Изменившиеся таблицы.
+        """
+        self._last_schema_check = time.monotonic()
+        version = await self._get_schema_version()
+        if version == self._schema_version:
+            return []
+        return await self.reload_schema(version)
+
+    async def reload_schema(self, version: str = '') -> List[str]:
+        """Перезагружает структуру таблиц из БД. Данные изменившихся 
+            таблиц удаляются из кеша.
+
+        Args:
+            version (str, optional): Версия схемы БД, если она уже известна.
+
+        Returns:
+            List[str]: Изменившиеся таблицы.
+        """
+        remote = TypeCache.remote == self._cache.type_cache
+        version = version or await self._get_schema_version()
+        struct = None
+        if remote:
+            struct = await self._cache._get_struct_tables(version)
+        if not struct and self._lazy and not self._struct_complete:
+            struct = {
+                table_name: await self._fetch_table_struct(table_name)
+                for table_name in list(self._tables_struct)
+            }
+        elif not struct:
+            struct = await self._fetch_tables_struct()
+            if remote:
+                await self._cache._save_struct_tables(struct, version)
+        changed = self._apply_tables_struct(struct)
+        self._schema_version = version
+        self._save_schema_snapshot()
+        if changed and self._cache.is_enabled_cache():
+            for table_name in changed:
+                if remote:
+                    await self._cache.delete_cache_table(table_name)
+                else:
+                    self._cache.delete_cache_table(table_name)
+        if changed:
+            logger.info(f"Перезагружена структура таблиц: {', '.join(changed)}")
+        return changed
+
+    def _poll_schema(self):
+        """
+            Проверка версии схемы БД при обращение к таблицам.
+            Проверка запускается в фоне в текущем цикле событий.
+        """
+        if self._schema_task and not self._schema_task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if not self._is_time_check_schema():
+            return
+        self._schema_task = asyncio.ensure_future(self._check_schema_task())
+
+    def _after_fork(self):
+        """
+            Фоновые задачи родителя в дочернем процессе не выполняются.
+        """
+        super()._after_fork()
+        self._prefetch_task = None
+        self._schema_task = None
+
+    def _on_unknown_field(self, table_name: str) -> bool:
+        """Вызывается, когда в запросе используется неизвестное поле таблицы.
+            Проверка схемы БД запускается в фоне не чаще раза в секунду, 
+            даже если периодическая проверка отключена, 
+            поэтому текущий запрос не повторяется.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            bool: Была ли обновлена структура таблицы.
+        """        
+        if self._schema_task and not self._schema_task.done():
+            return False
+        if time.monotonic() - self._last_schema_check < 1:
+            return False
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._last_schema_check = time.monotonic()
+        self._schema_task = asyncio.ensure_future(self._check_schema_task())
+        return False
+
+    async def _check_schema_task(self):
+        """
+            Фоновая проверка версии схемы БД.
+        """
+        try:
+            await self.check_schema()
+        except Exception as e:
+            logger.error(f"Ошибка при проверке версии схемы БД: {e}")
+
+    async def _fetch_table_struct(self, table_name: str) -> Optional[List[str]]:
+        """Получает поля одной таблицы из БД.
+
+        Args:
+            table_name (str): Название таблицы.
+
+        Returns:
+            Optional[List[str]]: Поля таблицы или ничего, если таблицы нет.
+        """        
+        if DBTypes.postgres == self._db.get_type():
+            query = self._pg_query_table_struct(table_name)
+            field_index = 0
+        else:
+            query = self._sqlite_query_table_struct(table_name)
+            field_index = 1
+        try:
+            async with self._db as db_query:
+                await db_query.execute(query)
+                data = await db_query.fetchall()
+        except Exception as e:
+            raise ErrorLoadingStructTables(e)
+        return [row[field_index] for row in data or []] or None
+
+    async def _fetch_tables_struct(self) -> Dict[str, List[str]]:
+        """Получает структуру всех таблиц из БД.
+
+        Returns:
+            Dict[str, List[str]]: Структура таблиц.
+        """        
+        if DBTypes.postgres == self._db.get_type():
+            return await self._fetch_tables_pg_struct()
+        return await self._fetch_tables_sqlite_struct()
     
-    async def _fill_tables_pg_struct(self):
+    async def _fetch_tables_pg_struct(self) -> Dict[str, List[str]]:
         """
             Получает таблицы и название колоннок из postgres.
         """
+        tables_struct = {}
         async with self._db as db_query:
             await db_query.execute(self._pg_query_struct)
             data = await db_query.fetchall()
         for row in data:
-            if row[0] in self._tables_struct:
-                self._tables_struct[row[0]].append(row[1])
+            if row[0] in tables_struct:
+                tables_struct[row[0]].append(row[1])
             else:
-                self._tables_struct[row[0]] = [row[1]]
+                tables_struct[row[0]] = [row[1]]
+        return tables_struct
                 
-    async def _fill_tables_sqlite_struct(self):
+    async def _fetch_tables_sqlite_struct(self) -> Dict[str, List[str]]:
         """
             Получает таблицы и название колоннок из sqlite.
         """
+        tables_struct = {}
         try:
             db_query = await self._db.connect()
             await db_query.execute("select name from sqlite_master where type='table';")
             rows = await db_query.fetchall()
             for row in rows:
-                self._tables_struct[row[0]] = []
-            for table in self._tables_struct.keys():
+                tables_struct[row[0]] = []
+            for table in tables_struct.keys():
                 await db_query.execute(f"PRAGMA table_info({table});")
                 rows = await db_query.fetchall()
                 for row in rows:
-                    self._tables_struct[table].append(row[1])
+                    tables_struct[table].append(row[1])
         except Exception as e:
             raise ErrorLoadingStructTables(e)
         finally:
-            await self._db.close()
\ No newline at end of file
+            await self._db.close()
+        return tables_struct
@@ -14,13 +14,22 @@ setup(
     package_data={"": ["LICENSE", ]},
     packages=find_packages(),
     install_requires=[
-        'cachetools<=6.0.0',
-        'aiosqlite<=0.21.0',
-        'psycopg2<=2.9.10',
-        'asyncpg<=0.30.0',
-        'redis<=6.2.0',
+        # expire() возвращает удаленные элементы начиная с 5.4.0
+        'cachetools>=5.4.0,<=6.0.0',
         'MarkupSafe<=3.0.2'
     ],
+    # Драйверы БД и кеша ставятся отдельно: pip install query_tables[postgres,redis]
+    extras_require={
+        'sqlite': ['aiosqlite<=0.21.0'],
+        'postgres': ['psycopg2<=2.9.10', 'asyncpg<=0.30.0'],
+        'redis': ['redis<=6.2.0'],
+        'all': [
+            'aiosqlite<=0.21.0',
+            'psycopg2<=2.9.10',
+            'asyncpg<=0.30.0',
+            'redis<=6.2.0'
+        ]
+    },
     python_requires=">=3.9",
     author='Антон Глызин',
     author_email='tosha.glyzin@mail.ru',
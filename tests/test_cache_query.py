@@ -1,8 +1,11 @@
-from settings import logger, BaseTest
-from threading import Thread, RLock
+from settings import logger, BaseTest, tests_dir
+from threading import Thread, RLock, Event
 import time
 from query_tables.cache.cache_query import CacheQuery, SyncLockDecorator
-from query_tables.exceptions import NoMatchFieldInCache
+from query_tables.cache import QueryKey, TableWrite
+from query_tables.cache.predicates import records_predicates, updated_predicates
+from query_tables.cache.size import estimate_size
+from query_tables.exceptions import NoMatchFieldInCache, UnknownCachePolicy
 
 rlock = RLock()
 
@@ -44,6 +47,19 @@ class TestCacheQuery(BaseTest):
         self.assertFalse(cache[query2].get())
         self.assertListEqual(cache[query3].get(), [{ 'company.id': 1, 'company.name': 'SD', 'address.id': 1, 'address.name': '33' }])
         
+        logger.info('----Чтение возвращает копию списка записей.')
+        records = cache[query3].get()
+        records.append({ 'company.id': 2, 'company.name': 'AB', 'address.id': 2, 'address.name': '44' })
+        self.assertEqual(len(cache[query3].get()), 1)
+        
+        logger.info('----Данные произвольного запроса читаются и изменяются под блокировкой.')
+        for method in (cache._get_data_query, cache._save_data_query, cache._delete_data_query):
+            self.assertIsInstance(method, SyncLockDecorator)
+        cache._save_data_query('select 1', [(1,)])
+        self.assertEqual(cache._get_data_query('select 1'), [(1,)])
+        cache._delete_data_query('select 1')
+        self.assertEqual(cache._get_data_query('select 1'), [])
+        
         logger.info('----Удаление закешированную запись по sql запросу.')
         del cache[query3]
         self.assertFalse(cache[query3].get())
@@ -193,6 +209,675 @@ class TestCacheQuery(BaseTest):
             cache[query1].insert({ 'person.id': 5 })
         logger.info("-------------------------------------------------------")
 
+    def test_case_6(self):
+        logger.info('6. Индексы по полям при выборке из кеша.')
+        cache = CacheQuery(non_expired=True)
+        query1 = "очень длинная строка sql запроса 1"
+        cache[query1] = [
+            { 'person.id': i, 'person.age': i % 3, 'person.tags': [i] }
+            for i in range(9)
+        ]
+        logger.info('----Выборка по нескольким полям и по нехешируемому значению.')
+        res = cache[query1].filter({ 'person.age': 1, 'person.id': 4 }).get()
+        self.assertListEqual(res, [{ 'person.id': 4, 'person.age': 1, 'person.tags': [4] }])
+        res = cache[query1].filter({ 'person.tags': [5] }).get()
+        self.assertEqual(res[0]['person.id'], 5)
+        
+        logger.info('----Индекс поддерживается при обновление и добавление.')
+        cache[query1].filter({ 'person.age': 0 }).update({ 'person.age': 1 })
+        self.assertFalse(cache[query1].filter({ 'person.age': 0 }).get())
+        self.assertEqual(len(cache[query1].filter({ 'person.age': 1 }).get()), 6)
+        cache[query1].insert({ 'person.id': 9, 'person.age': 1, 'person.tags': [9] })
+        self.assertEqual(len(cache[query1].filter({ 'person.age': 1 }).get()), 7)
+        
+        logger.info('----Удаление нескольких записей.')
+        deleted = cache[query1].filter({ 'person.age': 1 }).delete()
+        self.assertEqual([r['person.id'] for r in deleted], [0, 1, 3, 4, 6, 7, 9])
+        self.assertListEqual(
+            [r['person.id'] for r in cache[query1].get()], [2, 5, 8]
+        )
+        self.assertEqual(len(cache[query1].filter({ 'person.age': 2 }).get()), 3)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_7(self):
+        logger.info('7. Фильтрация в кеше по операторам.')
+        cache = CacheQuery(non_expired=True)
+        query1 = "очень длинная строка sql запроса 1"
+        cache[query1] = [
+            { 'person.id': 1, 'person.name': 'Anton', 'person.age': 30 },
+            { 'person.id': 2, 'person.name': 'anna', 'person.age': 25 },
+            { 'person.id': 3, 'person.name': 'Bob', 'person.age': None },
+            { 'person.id': 4, 'person.name': 'Tony', 'person.age': 41 }
+        ]
+        def ids(params):
+            return [r['person.id'] for r in cache[query1].filter(params).get()]
+        
+        logger.info('----Сравнения и диапазоны.')
+        self.assertListEqual(ids({ 'person.age__gt': 25 }), [1, 4])
+        self.assertListEqual(ids({ 'person.age__gte': 25, 'person.age__lt': 41 }), [1, 2])
+        self.assertListEqual(ids({ 'person.age__lte': 30 }), [1, 2])
+        self.assertListEqual(ids({ 'person.age__between': (26, 41) }), [1, 4])
+        
+        logger.info('----Списки, шаблоны и null.')
+        self.assertListEqual(ids({ 'person.id__in': [4, 2, 9] }), [2, 4])
+        self.assertListEqual(ids({ 'person.id__in': 4 }), [4])
+        self.assertListEqual(ids({ 'person.name__in': 'Antony' }), [])
+        self.assertListEqual(ids({ 'person.name__in': 'Bob', 'person.age__isnull': None }), [3])
+        self.assertListEqual(ids({ 'person.name__like': 'An%' }), [1])
+        self.assertListEqual(ids({ 'person.name__ilike': 'an%' }), [1, 2])
+        self.assertListEqual(ids({ 'person.age__isnull': None }), [3])
+        self.assertListEqual(ids({ 'person.age__isnotnull': None }), [1, 2, 4])
+        self.assertListEqual(ids({ 'person.age__notequ': 30 }), [2, 4])
+        
+        logger.info('----Индекс поддерживается при изменение данных.')
+        cache[query1].filter({ 'person.age__lt': 30 }).update({ 'person.age': 50 })
+        cache[query1].insert({ 'person.id': 5, 'person.name': 'Kate', 'person.age': 20 })
+        self.assertListEqual(ids({ 'person.age__gt': 35 }), [2, 4])
+        cache[query1].filter({ 'person.age__gte': 41 }).delete()
+        self.assertListEqual(ids({ 'person.age__lte': 30 }), [1, 5])
+        
+        logger.info('----Индексы строятся заново после обновления многих записей.')
+        query2 = "очень длинная строка sql запроса 2"
+        cache[query2] = [{ 'person.id': i, 'person.age': i % 10 } for i in range(200)]
+        def ids2(params):
+            return [r['person.id'] for r in cache[query2].filter(params).get()]
+        self.assertEqual(len(ids2({ 'person.age': 3 })), 20)
+        self.assertEqual(len(ids2({ 'person.age__gte': 5 })), 100)
+        cache[query2].filter({ 'person.id__lt': 150 }).update({ 'person.age': 3 })
+        self.assertEqual(len(ids2({ 'person.age': 3 })), 155)
+        self.assertEqual(len(ids2({ 'person.age__gte': 5 })), 25)
+        cache[query2].filter({ 'person.id': 199 }).update({ 'person.age': 3 })
+        self.assertListEqual(ids2({ 'person.age': 3 })[-2:], [193, 199])
+        with self.assertRaises(NoMatchFieldInCache):
+            cache[query1].filter({ 'person.email__gt': 1 })
+        logger.info("-------------------------------------------------------")
+
+    def test_case_8(self):
+        logger.info('8. Зависимости таблиц и запросов в кеше.')
+        cache = CacheQuery(ttl=300, maxsize=2)
+        query1 = "очень длинная строка sql запроса 1"
+        query2 = "очень длинная строка sql запроса 2"
+        query3 = "очень длинная строка sql запроса 3"
+        cache[query1] = [
+            { 'person.id': 1, 'company.id': 1, 'address.id': 1 }
+        ]
+        logger.info('----Зависимости не теряются, если таблиц больше размера кеша.')
+        self.assertTrue(cache.delete_cache_table('address'))
+        self.assertFalse(cache[query1].get())
+        self.assertEqual(len(cache._tables), 0)
+        
+        logger.info('----Вытесненный запрос удаляется из зависимостей.')
+        cache[query1] = [{ 'person.id': 1 }]
+        cache[query2] = [{ 'person.id': 2 }]
+        cache[query3] = [{ 'company.id': 3 }]
+        self.assertSetEqual(cache._tables.get('person'), {cache._get_hashkey_query(query2)})
+        self.assertEqual(len(cache._tables), 2)
+        
+        logger.info('----Истекший запрос удаляется из зависимостей.')
+        cache = CacheQuery(ttl=1)
+        cache[query1] = [{ 'person.id': 1 }]
+        time.sleep(1.1)
+        cache[query2] = [{ 'company.id': 2 }]
+        self.assertIsNone(cache._tables.get('person'))
+        self.assertEqual(len(cache._tables), 1)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_9(self):
+        logger.info('9. Ключи запросов с поколениями таблиц.')
+        cache = CacheQuery(ttl=300, versioned_keys=True)
+        query1 = QueryKey("очень длинная строка sql запроса 1", ['person', 'company'])
+        query2 = QueryKey("очень длинная строка sql запроса 2", ['address'])
+        cache[query1] = [{ 'person.id': 1, 'company.id': 1 }]
+        cache[query2] = [{ 'address.id': 1 }]
+        self.assertEqual(len(cache._tables), 0)
+        self.assertEqual(cache[query1].get(), [{ 'person.id': 1, 'company.id': 1 }])
+        
+        logger.info('----Изменение таблицы увеличивает ее поколение.')
+        self.assertTrue(cache.delete_cache_table('company'))
+        self.assertEqual(cache._generations['company'], 1)
+        self.assertFalse(cache[query1].get())
+        self.assertEqual(cache[query2].get(), [{ 'address.id': 1 }])
+        
+        logger.info('----Запрос с новым поколением кешируется заново.')
+        cache[query1] = [{ 'person.id': 2, 'company.id': 1 }]
+        self.assertEqual(cache[query1].get(), [{ 'person.id': 2, 'company.id': 1 }])
+        
+        logger.info('----Запрос без таблиц использует зависимости.')
+        query3 = "очень длинная строка sql запроса 3"
+        cache[query3] = [{ 'person.id': 3 }]
+        self.assertTrue(cache.delete_cache_table('person'))
+        self.assertFalse(cache[query3].get())
+        self.assertFalse(cache[query1].get())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_10(self):
+        logger.info('10. Удаление из кеша только пересекающихся запросов.')
+        cache = CacheQuery(ttl=300)
+        queries = {
+            'id1': QueryKey("sql запрос 1", ['person'], {'person': {'id': 1}}),
+            'id2': QueryKey("sql запрос 2", ['person'], {'person': {'id__in': [2, 4]}}),
+            'age': QueryKey("sql запрос 3", ['person'], {'person': {'age__gt': 40}}),
+            'name': QueryKey("sql запрос 4", ['person'], {'person': {'name__like': 'Ant%'}}),
+            'all': "sql запрос 5",
+        }
+        for name, query in queries.items():
+            cache[query] = [{ 'person.id': 1, 'person.name': name }]
+        
+        logger.info('----Вставка записей.')
+        self.assertTrue(cache.delete_cache_table('person', records_predicates([
+            {'id': 3, 'name': 'Bob', 'age': 20}, {'id': 5, 'name': 'Tom', 'age': None}
+        ])))
+        self.assertTrue(cache[queries['id1']].get())
+        self.assertTrue(cache[queries['id2']].get())
+        self.assertTrue(cache[queries['age']].get())
+        self.assertTrue(cache[queries['name']].get())
+        self.assertFalse(cache[queries['all']].get())
+        
+        logger.info('----Изменение записи по ключу.')
+        cache.delete_cache_table('person', [{'id': 1}])
+        self.assertFalse(cache[queries['id1']].get())
+        self.assertTrue(cache[queries['id2']].get())
+        self.assertFalse(cache[queries['age']].get())
+        cache[queries['age']] = [{ 'person.id': 1, 'person.name': 'age' }]
+        
+        logger.info('----Обновление учитывает новые значения.')
+        cache.delete_cache_table('person', updated_predicates({'id': 3}, {'age': 50}))
+        self.assertFalse(cache[queries['age']].get())
+        self.assertTrue(cache[queries['id2']].get())
+        
+        logger.info('----Без условий удаляется все по таблице.')
+        cache.delete_cache_table('person')
+        self.assertEqual(len(cache._tables), 0)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_11(self):
+        logger.info('11. Применение изменений таблицы к записям в кеше.')
+        cache = CacheQuery(ttl=300)
+        simple = QueryKey("sql запрос 1", ['person'], {'person': {'age__gte': 30}}, True)
+        ordered = QueryKey("sql запрос 2", ['person'], {'person': {'age__gte': 30}})
+        records = [
+            { 'person.id': 1, 'person.name': 'Anton', 'person.age': 31 },
+            { 'person.id': 2, 'person.name': 'Mix', 'person.age': 40 }
+        ]
+        cache[simple] = [dict(record) for record in records]
+        cache[ordered] = [dict(record) for record in records]
+        
+        logger.info('----Обновление без RETURNING.')
+        cache.write_through(TableWrite('person', 'update', {'id': 1}, {'name': 'Tom'}))
+        self.assertEqual(cache[simple].filter({'person.id': 1}).get()[0]['person.name'], 'Tom')
+        self.assertFalse(cache[ordered].get())
+        
+        logger.info('----Вставка записей из RETURNING.')
+        cache.write_through(TableWrite('person', 'insert', rows=[
+            {'id': 3, 'name': 'Bob', 'age': 35, 'login': 'bob'},
+            {'id': 4, 'name': 'Kid', 'age': 10, 'login': 'kid'}
+        ]))
+        self.assertEqual(
+            [record['person.id'] for record in cache[simple].get()], [1, 2, 3]
+        )
+        
+        logger.info('----Запись выходит из запроса после обновления.')
+        cache.write_through(TableWrite(
+            'person', 'update', {'id': 2}, {'age': 20}, 
+            rows=[{'id': 2, 'name': 'Mix', 'age': 20, 'login': 'mix'}]
+        ))
+        self.assertEqual(
+            [record['person.id'] for record in cache[simple].get()], [1, 3]
+        )
+        
+        logger.info('----Удаление записей.')
+        cache.write_through(TableWrite('person', 'delete', {'id__in': [1, 2]}))
+        self.assertEqual(cache[simple].get(), [{ 'person.id': 3, 'person.name': 'Bob', 'person.age': 35 }])
+        
+        logger.info('----Условие, которое нельзя проверить в кеше.')
+        cache.write_through(TableWrite('person', 'delete', {'name__like': 'B%'}))
+        self.assertFalse(cache[simple].get())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_12(self):
+        logger.info('12. Размер кеша в байтах.')
+        records = [{ 'person.id': i, 'person.name': f'Anton {i}' } for i in range(1000)]
+        size = estimate_size(records)
+        self.assertGreater(size, estimate_size(records[:100]) * 5)
+        cache = CacheQuery(non_expired=True, max_bytes=size * 2, max_entry_bytes=size // 2)
+        
+        logger.info('----Большой результат не кешируется.')
+        cache["sql запрос"] = records
+        self.assertFalse(cache["sql запрос"].get())
+        self.assertEqual(len(cache._tables), 0)
+        
+        logger.info('----Вытеснение по размеру записей, а не по числу запросов.')
+        for i in range(30):
+            cache[f"sql запрос {i}"] = records[:100]
+        self.assertLessEqual(cache._cache.currsize, size * 2)
+        self.assertLess(len(cache._cache), 30)
+        self.assertEqual(len(cache._tables), len(cache._cache))
+        self.assertTrue(cache["sql запрос 29"].get())
+        self.assertFalse(cache["sql запрос 0"].get())
+
+        logger.info('----Размер пересчитывается после изменения записей и построения индекса.')
+        for policy in ('lru', 'lfu'):
+            cache = CacheQuery(ttl=300, max_bytes=size * 2, max_entry_bytes=size // 2, policy=policy)
+            cache["sql запрос"] = records[:10]
+            for record in records[10:100]:
+                cache["sql запрос"].insert(dict(record))
+            cached = lambda: cache._cache[cache._get_hashkey("sql запрос")]
+            self.assertEqual(cache._cache.currsize, estimate_size(cached()))
+            cache["sql запрос"].filter({'person.id__gte': 50}).get()
+            self.assertGreater(cached().index_size(), 0)
+            self.assertEqual(cache._cache.currsize, estimate_size(cached()))
+            cache["sql запрос"].filter({'person.id': 1}).update({'person.name': 'A' * 1000})
+            self.assertEqual(cache._cache.currsize, estimate_size(cached()))
+            cache["sql запрос"].filter({'person.id__gte': 50}).delete()
+            self.assertEqual(cache._cache.currsize, estimate_size(cached()))
+            self.assertEqual(len(cache["sql запрос"].get()), 50)
+            self.assertEqual(len(cache._tables), 1)
+
+        logger.info('----Записи, которые выросли больше лимита, удаляются.')
+        for record in records[100:600]:
+            if cache.lookup("sql запрос") is None:
+                break
+            cache["sql запрос"].insert(dict(record))
+        self.assertIsNone(cache.lookup("sql запрос"))
+        self.assertEqual(cache._cache.currsize, 0)
+        self.assertEqual(len(cache._tables), 0)
+
+    def test_case_13(self):
+        logger.info('13. Устаревшие записи отдаются из кеша до обновления.')
+        cache = CacheQuery(ttl=1, stale_ttl=100)
+        records = [{ 'person.id': 1, 'person.name': 'Anton' }]
+        cache["sql запрос"] = records
+        self.assertFalse(cache.is_stale("sql запрос"))
+        
+        logger.info('----После ttl запись устарела, но еще в кеше.')
+        time.sleep(1.1)
+        self.assertTrue(cache.is_stale("sql запрос"))
+        self.assertEqual(cache["sql запрос"].get(), records)
+        
+        logger.info('----Новые данные снова свежие.')
+        cache["sql запрос"] = records
+        self.assertFalse(cache.is_stale("sql запрос"))
+        
+        logger.info('----Без stale_ttl запись удаляется по ttl.')
+        cache = CacheQuery(ttl=1)
+        cache["sql запрос"] = records
+        time.sleep(1.1)
+        self.assertFalse(cache.is_stale("sql запрос"))
+        self.assertFalse(cache["sql запрос"].get())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_14(self):
+        logger.info('14. Время кеша по таблицам и для отдельного запроса.')
+        cache = CacheQuery(ttl={'country': 100, 'orders': 1})
+        records = [{ 'country.id': 1, 'country.name': 'Russia' }]
+        country = QueryKey("sql запрос country", ['country'])
+        orders = QueryKey("sql запрос orders", ['orders'])
+        joined = QueryKey("sql запрос country orders", ['country', 'orders'])
+        person = QueryKey("sql запрос person", ['person'])
+        override = QueryKey("sql запрос country ttl", ['country'], ttl=1)
+        for query in (country, orders, joined, person, override):
+            cache[query] = records
+        self.assertTrue(cache.is_enabled_cache())
+        
+        logger.info('----Таблица не из словаря не кешируется.')
+        self.assertFalse(cache[person].get())
+        self.assertTrue(cache[orders].get())
+        
+        logger.info('----Запросы истекают по своему времени.')
+        time.sleep(1.1)
+        self.assertEqual(cache[country].get(), records)
+        self.assertFalse(cache[orders].get())
+        self.assertFalse(cache[joined].get())
+        self.assertFalse(cache[override].get())
+        
+        logger.info('----Время запроса важнее общего времени кеша.')
+        cache = CacheQuery(ttl=100)
+        cache[QueryKey("sql запрос", ['country'], ttl=1)] = records
+        cache[QueryKey("sql запрос без кеша", ['country'], ttl=0)] = records
+        self.assertTrue(cache["sql запрос"].get())
+        self.assertFalse(cache["sql запрос без кеша"].get())
+        time.sleep(1.1)
+        self.assertFalse(cache["sql запрос"].get())
+        self.assertEqual(len(cache._tables), 0)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_15(self):
+        logger.info('15. Условия выборки из разных потоков не смешиваются.')
+        cache = CacheQuery(ttl=300)
+        query = "sql запрос person"
+        cache[query] = [
+            { 'person.id': i, 'person.name': f'Anton {i}' } for i in range(20)
+        ]
+        
+        logger.info('----У каждого обращения к запросу свое условие.')
+        first = cache[query].filter({'person.id': 1})
+        second = cache[query].filter({'person.id': 2})
+        self.assertEqual(first.get()[0]['person.id'], 1)
+        self.assertEqual(second.get()[0]['person.id'], 2)
+        self.assertEqual(len(cache[query].get()), 20)
+        
+        logger.info('----Потоки выбирают свои записи.')
+        errors = []
+        def worker(i: int):
+            for _ in range(200):
+                res = cache[query].filter({'person.id': i}).get()
+                if len(res) != 1 or res[0]['person.id'] != i:
+                    errors.append(i)
+        threads = [Thread(target=worker, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(errors)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_16(self):
+        logger.info('16. Блокировки по сегментам кеша.')
+        cache = CacheQuery(ttl=300, segments=4)
+        queries = [f"sql запрос person {i}" for i in range(20)]
+        for i, query in enumerate(queries):
+            cache[query] = [{ 'person.id': i }]
+        hashkeys = [cache._get_hashkey(query) for query in queries]
+        busy = queries[0]
+        other = next(
+            query for query, hashkey in zip(queries, hashkeys)
+            if cache._segment(hashkey) is not cache._segment(hashkeys[0])
+        )
+        
+        logger.info('----Выборка по запросу из другого сегмента не ждет блокировку.')
+        locked, release = Event(), Event()
+        def hold():
+            with cache._segment(hashkeys[0]):
+                locked.set()
+                release.wait()
+        thread = Thread(target=hold)
+        thread.start()
+        locked.wait()
+        start = time.monotonic()
+        self.assertEqual(len(cache[other].filter({'person.id': queries.index(other)}).get()), 1)
+        self.assertEqual(cache[busy].get(), [{ 'person.id': 0 }])
+        self.assertLess(time.monotonic() - start, 0.5)
+        
+        logger.info('----Выборка по запросу из занятого сегмента не ждет блокировку, а изменение ждет.')
+        try:
+            self.assertEqual(cache[busy].filter({'person.id': 0}).get(), [{ 'person.id': 0 }])
+            result = []
+            writer = Thread(target=lambda: result.append(
+                cache[busy].filter({'person.id': 0}).update({'person.id': 100})
+            ))
+            writer.start()
+            writer.join(0.2)
+            self.assertFalse(result)
+            self.assertEqual(cache[busy].get(), [{ 'person.id': 0 }])
+        finally:
+            release.set()
+        writer.join()
+        thread.join()
+        self.assertEqual(result, [[{ 'person.id': 100 }]])
+        self.assertEqual(cache[busy].get(), [{ 'person.id': 100 }])
+        
+        logger.info('----Записи изменяются копией, прочитанные записи не меняются.')
+        cache["sql запрос"] = [{ 'person.id': i, 'person.age': i % 5 } for i in range(100)]
+        before = cache["sql запрос"].filter({'person.age': 1}).get()
+        errors = []
+        def read():
+            try:
+                for _ in range(200):
+                    self.assertEqual(len(cache["sql запрос"].filter({'person.age__gte': 0}).get()), 100)
+            except Exception as e:
+                errors.append(e)
+        readers = [Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for i in range(100):
+            cache["sql запрос"].filter({'person.id': i}).update({'person.age': (i + 1) % 5})
+        for reader in readers:
+            reader.join()
+        self.assertFalse(errors)
+        self.assertEqual([record['person.age'] for record in before], [1] * 20)
+        self.assertEqual(len(cache["sql запрос"].filter({'person.age': 2}).get()), 20)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_17(self):
+        logger.info('17. Ключи запросов.')
+        cache = CacheQuery(ttl=300)
+        
+        logger.info('----Разные строковые значения дают разные ключи.')
+        query1 = "select * from person where person.name = 'a b'"
+        query2 = "select * from person where person.name = 'ab'"
+        query3 = "select * from person where person.name = 'AB'"
+        cache[query1] = [{ 'person.name': 'a b' }]
+        cache[query2] = [{ 'person.name': 'ab' }]
+        self.assertEqual(cache[query1].get(), [{ 'person.name': 'a b' }])
+        self.assertEqual(cache[query2].get(), [{ 'person.name': 'ab' }])
+        self.assertFalse(cache[query3].get())
+        
+        logger.info('----Хеш QueryKey считается один раз.')
+        key = QueryKey(query1, ['person'])
+        self.assertIs(key.hashkey, key.hashkey)
+        self.assertEqual(cache._get_hashkey(key), cache._get_hashkey(query1))
+        self.assertEqual(len(key.hashkey), 32)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_18(self):
+        logger.info('18. Кеширование пустых результатов.')
+        cache = CacheQuery(ttl=300, negative_ttl=1)
+        query = QueryKey('select * from person where person.id = 0', ['person'])
+        self.assertTrue(cache.is_enabled_negative_cache())
+        
+        logger.info('----Запроса нет в кеше.')
+        self.assertIsNone(cache.lookup(query))
+        
+        logger.info('----Пустой результат сохраняется в кеш.')
+        cache[query] = []
+        self.assertEqual(cache.lookup(query), [])
+        
+        logger.info('----Пустой результат удаляется при изменение таблицы.')
+        cache.delete_cache_table('person')
+        self.assertIsNone(cache.lookup(query))
+        
+        logger.info('----Пустой результат живет negative_ttl.')
+        cache[query] = []
+        time.sleep(1.1)
+        self.assertIsNone(cache.lookup(query))
+        
+        logger.info('----Пустой результат без таблиц не кешируется.')
+        query = 'select * from person where person.id = 0'
+        cache[query] = []
+        self.assertIsNone(cache.lookup(query))
+        
+        logger.info('----Без negative_ttl пустые результаты не кешируются.')
+        cache = CacheQuery(ttl=300)
+        self.assertFalse(cache.is_enabled_negative_cache())
+        query = QueryKey('select * from person where person.id = 0', ['person'])
+        cache[query] = []
+        self.assertIsNone(cache.lookup(query))
+        
+        logger.info('----В кеше без истечения времени пустые результаты не кешируются.')
+        cache = CacheQuery(non_expired=True, negative_ttl=1)
+        self.assertFalse(cache.is_enabled_negative_cache())
+        cache[query] = []
+        self.assertIsNone(cache.lookup(query))
+        logger.info("-------------------------------------------------------")
+
+    def test_case_19(self):
+        logger.info('19. Политики вытеснения.')
+        def query(i):
+            return QueryKey(f'select * from person where person.id = {i}', ['person'])
+        
+        logger.info('----lfu вытесняет редко используемый запрос.')
+        cache = CacheQuery(ttl=300, maxsize=3, policy='lfu')
+        for i in range(3):
+            cache[query(i)] = [{ 'person.id': i }]
+        for _ in range(2):
+            cache[query(0)].get()
+            cache[query(2)].get()
+        cache[query(3)] = [{ 'person.id': 3 }]
+        self.assertIsNone(cache.lookup(query(1)))
+        self.assertEqual(cache.lookup(query(0)), [{ 'person.id': 0 }])
+        self.assertNotIn(cache._get_hashkey(query(1)), cache._tables.get('person'))
+        
+        logger.info('----tinylfu не пускает разовые запросы вместо частых.')
+        cache = CacheQuery(ttl=300, maxsize=10, policy='tinylfu')
+        for i in range(10):
+            cache.lookup(query(i))
+            cache[query(i)] = [{ 'person.id': i }]
+            cache.lookup(query(i))
+        for i in range(100, 150):
+            cache.lookup(query(i))
+            cache[query(i)] = [{ 'person.id': i }]
+        hits = sum(cache.lookup(query(i)) is not None for i in range(10))
+        self.assertGreaterEqual(hits, 9)
+        self.assertEqual(len(cache._cache), 10)
+        
+        logger.info('----cost вытесняет запрос с наименьшим временем в БД.')
+        cache = CacheQuery(ttl=300, maxsize=2, policy='cost')
+        for i, cost in enumerate([1.0, 0.001]):
+            key = query(i)
+            key.cost = cost
+            cache[key] = [{ 'person.id': i }]
+        cache[query(2)] = [{ 'person.id': 2 }]
+        self.assertIsNone(cache.lookup(query(1)))
+        self.assertEqual(cache.lookup(query(0)), [{ 'person.id': 0 }])
+        
+        logger.info('----Очищение кеша очищает политику.')
+        cache.clear()
+        cache[query(3)] = [{ 'person.id': 3 }]
+        self.assertEqual(cache.lookup(query(3)), [{ 'person.id': 3 }])
+        
+        logger.info('----Неизвестная политика.')
+        with self.assertRaises(UnknownCachePolicy):
+            CacheQuery(ttl=300, policy='fifo')
+        logger.info("-------------------------------------------------------")
+
+    def test_case_20(self):
+        logger.info('20. Снимок кеша.')
+        path = tests_dir / 'test_cache_query.snapshot'
+        query = QueryKey(
+            'select * from person where person.id = 1', ['person'], 
+            {'person': {'person.id': 1}}, True
+        )
+        records = [{ 'person.id': 1, 'person.name': 'Anton' }]
+        try:
+            logger.info('----Записи загружаются с таблицами и оставшимся временем жизни.')
+            cache = CacheQuery(ttl=2)
+            cache[query] = records
+            cache._save_data_query('select 1', [(1,)])
+            self.assertEqual(cache.snapshot(path, 'v1'), 2)
+            cache = CacheQuery(ttl=300)
+            self.assertEqual(cache.load(path, 'v2'), 0)
+            self.assertEqual(cache.load(path, 'v1'), 2)
+            self.assertEqual(cache[query].filter({'person.id': 1}).get(), records)
+            self.assertEqual(cache._get_data_query('select 1'), [(1,)])
+            self.assertTrue(cache.delete_cache_table('person'))
+            self.assertIsNone(cache.lookup(query))
+            time.sleep(2.1)
+            self.assertEqual(cache._get_data_query('select 1'), [])
+            
+            logger.info('----Истекшие записи не загружаются.')
+            cache = CacheQuery(ttl=300)
+            self.assertEqual(cache.load(path, 'v1'), 0)
+            
+            logger.info('----Записи изменившихся таблиц не загружаются.')
+            for versioned_keys in (False, True):
+                cache = CacheQuery(ttl=300, versioned_keys=versioned_keys)
+                cache[query] = records
+                cache.snapshot(path)
+                cache = CacheQuery(ttl=300, versioned_keys=versioned_keys)
+                cache.delete_cache_table('person')
+                cache.load(path)
+                self.assertIsNone(cache.lookup(query))
+                cache = CacheQuery(ttl=300, versioned_keys=versioned_keys)
+                self.assertEqual(cache.load(path), 1)
+                self.assertEqual(cache.lookup(query), records)
+            
+            logger.info('----Файл другого формата.')
+            path.write_bytes(b'not a snapshot')
+            self.assertEqual(CacheQuery(ttl=300).load(path), 0)
+
+            logger.info('----Вечный кеш не сохраняется и не загружается.')
+            cache = CacheQuery(non_expired=True)
+            cache[query] = records
+            self.assertEqual(cache.snapshot(path), 0)
+            cache = CacheQuery(ttl=300)
+            cache[query] = records
+            cache.snapshot(path)
+            cache = CacheQuery(non_expired=True)
+            self.assertEqual(cache.load(path), 0)
+            self.assertIsNone(cache.lookup(query))
+
+            logger.info('----Сохранение снимка не считается обращением к записям.')
+            cache = CacheQuery(ttl=300, policy='tinylfu')
+            cache[query] = records
+            counts = dict(cache._policy._sketch._counts)
+            self.assertEqual(cache.snapshot(path), 1)
+            self.assertEqual(cache._policy._sketch._counts, counts)
+
+            logger.info('----Снимок с другими классами не загружается.')
+            import pickle, zlib
+            from query_tables.cache.snapshot import MAGIC
+            cache = CacheQuery(ttl=300)
+            cache[query] = records
+            cache.snapshot(path)
+            snapshot = pickle.loads(zlib.decompress(path.read_bytes()[len(MAGIC):]))
+            snapshot['call'] = time.sleep
+            path.write_bytes(MAGIC + zlib.compress(pickle.dumps(snapshot)))
+            self.assertEqual(CacheQuery(ttl=300).load(path), 0)
+        finally:
+            path.unlink(missing_ok=True)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_21(self):
+        logger.info('21. Объединение одинаковых запросов.')
+        import asyncio
+        from query_tables.single_flight import SingleFlight, AsyncSingleFlight
+        records = [{ 'person.id': 1, 'person.name': 'Anton' }]
+
+        logger.info('----Ожидающие вызовы получают копии записей.')
+        flight = SingleFlight()
+        started, release = Event(), Event()
+        results = []
+        def load():
+            started.set()
+            release.wait()
+            return records
+        leader = Thread(target=lambda: results.append(flight.do('key', load)))
+        leader.start()
+        started.wait()
+        follower = Thread(target=lambda: results.append(flight.do('key', load)))
+        follower.start()
+        time.sleep(0.1)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results[0], results[1])
+        results[1][0]['person.name'] = 'Bob'
+        self.assertEqual(records[0]['person.name'], 'Anton')
+
+        logger.info('----Отмена первого вызова не отменяет запрос для остальных.')
+        async def main():
+            flight = AsyncSingleFlight()
+            calls = 0
+            async def load():
+                nonlocal calls
+                calls += 1
+                await asyncio.sleep(0.1)
+                return [{ 'person.id': 1, 'person.name': 'Anton' }]
+            leader = asyncio.ensure_future(flight.do('key', load))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do('key', load))
+            await asyncio.sleep(0)
+            leader.cancel()
+            self.assertEqual(await follower, records)
+            self.assertTrue(leader.cancelled())
+            self.assertEqual(calls, 1)
+            first, second = await asyncio.gather(flight.do('key', load), flight.do('key', load))
+            first[0]['person.name'] = 'Bob'
+            self.assertEqual(second, records)
+            self.assertEqual(calls, 2)
+        asyncio.run(main())
+        logger.info("-------------------------------------------------------")
+
 
 if __name__ == "__main__":
     TestCacheQuery.start()
\ No newline at end of file
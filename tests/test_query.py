@@ -172,6 +172,32 @@ class TestQuery(BaseTest):
         res = self.cursor.execute(query)
         self.assertEqual(res.rowcount , 1)
         logger.info("-------------------------------------------------------")
+
+    def test_case_3(self):
+        logger.info('3. Ключ запроса для кеша.')
+        
+        logger.info('----Порядок условий, полей и значений in не меняет ключ.')
+        query1 = Query(*self.person).select(['id', 'name']).filter(id__in=[3, 1, 2], age__gte=30)
+        query2 = Query(*self.person).select(['name', 'id']).filter(age__gte=30, id__in=[1, 2, 3, 1])
+        self.assertNotEqual(query1.get(), query2.get())
+        self.assertEqual(query1.cache_key, query2.cache_key)
+        
+        logger.info('----Условия join таблиц тоже приводятся к одному порядку.')
+        query1 = Query(*self.person).join(
+            Join(Query(*self.address).filter(id=1, building=10), 'id', 'ref_address')
+        )
+        query2 = Query(*self.person).join(
+            Join(Query(*self.address).filter(building=10, id=1), 'id', 'ref_address')
+        )
+        self.assertEqual(query1.cache_key, query2.cache_key)
+        
+        logger.info('----Разные запросы дают разные ключи.')
+        query1 = Query(*self.person).filter(id__in=[1, 2]).order_by(id='asc', age='desc')
+        query2 = Query(*self.person).filter(id__in=[1, 2]).order_by(age='desc', id='asc')
+        query3 = Query(*self.person).filter(id__in=[1, 3]).order_by(id='asc', age='desc')
+        self.assertNotEqual(query1.cache_key, query2.cache_key)
+        self.assertNotEqual(query1.cache_key, query3.cache_key)
+        logger.info("-------------------------------------------------------")
         
 if __name__ == "__main__":
     TestQuery.start()
\ No newline at end of file
@@ -1,6 +1,10 @@
 from settings import logger, BaseTest
 import asyncio
-from query_tables.cache import RedisCache, RedisConnect, AsyncRedisCache
+import time
+from query_tables.cache import (
+    RedisCache, RedisConnect, AsyncRedisCache, 
+    TieredCache, AsyncTieredCache, QueryKey
+)
 
 from query_tables.exceptions import NoMatchFieldInCache
 
@@ -173,6 +177,101 @@ class TestRedisQuery(BaseTest):
         
         self.loop.run_until_complete(test1())
         self.loop.run_until_complete(test2())
+        
+    def test_case_3(self):
+        logger.info('3. Локальный кеш перед redis и удаление копий через pub/sub.')
+        connect = RedisConnect()
+        cache1 = TieredCache(RedisCache(connect))
+        cache2 = TieredCache(RedisCache(connect))
+        query = QueryKey("очень длинная строка sql запроса 1", ['person'], {'person': {'person.id': 1}})
+        records = [{ 'person.id': 1, 'person.name': 'Anton' }]
+        
+        logger.info('----Данные из redis сохраняются в локальный кеш.')
+        cache1[query] = records
+        self.assertListEqual(cache2[query].get(), records)
+        self.assertListEqual(cache2._l1[query].get(), records)
+        
+        logger.info('----Удаление по таблице удаляет локальные копии в других процессах.')
+        cache1.delete_cache_table('person')
+        time.sleep(0.2)
+        self.assertFalse(cache2._l1[query].get())
+        self.assertFalse(cache2[query].get())
+        
+        logger.info('----Изменение записей в кеше удаляет локальные копии.')
+        cache1[query] = records
+        cache2[query].get()
+        cache1[query].filter({ 'person.id': 1 }).update({ 'person.name': 'Tony' })
+        time.sleep(0.2)
+        self.assertEqual(cache2[query].get()[0]['person.name'], 'Tony')
+        
+        logger.info('----Асинхронный режим.')
+        async def test():
+            cache1 = AsyncTieredCache(AsyncRedisCache(connect))
+            cache2 = AsyncTieredCache(AsyncRedisCache(connect))
+            await cache1[query].set_data(records)
+            self.assertListEqual(await cache2[query].get(), records)
+            await cache1[query].delete_query()
+            await asyncio.sleep(0.2)
+            self.assertFalse(cache2._l1[query].get())
+            self.assertFalse(await cache2[query].get())
+        self.loop.run_until_complete(test())
+        self.cache.clear()
+        logger.info("-------------------------------------------------------")
+
+    def test_case_4(self):
+        logger.info('4. Удаление данных во время чтения из redis.')
+        connect = RedisConnect()
+        cache1 = TieredCache(RedisCache(connect))
+        cache2 = TieredCache(RedisCache(connect, negative_ttl=10))
+        query = QueryKey("очень длинная строка sql запроса 2", ['person'], {'person': {'person.id': 1}})
+        records = [{ 'person.id': 1, 'person.name': 'Anton' }]
+        
+        logger.info('----Прочитанные данные не сохраняются в локальный кеш, если их уже удалили.')
+        cache1[query] = records
+        lookup = cache2._l2.lookup
+        def racing(q):
+            data = lookup(q)
+            cache2._invalidation.apply(cache1._invalidation.encode('table', table='person'))
+            return data
+        cache2._l2.lookup = racing
+        self.assertListEqual(cache2[query].filter({ 'person.id': 1 }).get(), records)
+        self.assertIsNone(cache2._l1.lookup(query))
+        del cache2._l2.lookup
+        self.assertListEqual(cache2[query].get(), records)
+        self.assertListEqual(cache2._l1.lookup(query), records)
+        
+        logger.info('----Пустой результат в локальном кеше не перечитывается из redis.')
+        cache2.clear()
+        cache2[query] = []
+        self.assertListEqual(cache2._l1.lookup(query), [])
+        cache2._l2.lookup = lambda q: self.fail('чтение из redis')
+        self.assertListEqual(cache2[query].get(), [])
+        del cache2._l2.lookup
+        self.cache.clear()
+        logger.info("-------------------------------------------------------")
+
+    def test_case_5(self):
+        logger.info('5. Время жизни ключей по таблицам.')
+        connect = RedisConnect()
+        cache = RedisCache(connect, ttl={'person': 60})
+        async_cache = AsyncRedisCache(connect, ttl={'person': 60})
+        query1 = QueryKey("очень длинная строка sql запроса 3", ['person'], {'person': {}})
+        query2 = QueryKey("очень длинная строка sql запроса 4", ['company'], {'company': {}})
+        
+        logger.info('----Запросы таблиц не из словаря не кешируются.')
+        cache[query1] = [{ 'person.id': 1 }]
+        cache[query2] = [{ 'company.id': 1 }]
+        self.assertListEqual(cache.lookup(query1), [{ 'person.id': 1 }])
+        self.assertIsNone(cache.lookup(query2))
+        self.assertTrue(0 < cache._redis.ttl(f'{cache._key_queries}:{cache._get_hashkey(query1)}') <= 60)
+        
+        logger.info('----Асинхронный режим.')
+        async def test():
+            await async_cache[query2].set_data([{ 'company.id': 1 }])
+            self.assertIsNone(await async_cache.lookup(query2))
+        self.loop.run_until_complete(test())
+        self.cache.clear()
+        logger.info("-------------------------------------------------------")
    
     
     
@@ -0,0 +1,151 @@
+from settings import logger, BaseTest, tests_dir
+import os
+import time
+from query_tables.cache import SharedMemoryCache, QueryKey
+from query_tables.cache.index import IndexedRecords
+
+from query_tables.exceptions import NoMatchFieldInCache
+
+
+class TestSharedMemoryCache(BaseTest):
+
+    @classmethod
+    def filename_test(cls):
+        return 'test_cache_shared.log'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.path = tests_dir / 'test_shared_cache.shm'
+        cls.cache = SharedMemoryCache(cls.path, non_expired=True, size=1024 * 1024, slots=4096)
+        cls.cache.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.cache.clear()
+        del cls.cache
+        os.remove(cls.path)
+
+    def test_case_1(self):
+        logger.info('1. Получение, изменение и удаление данных в кеше общей памяти.')
+
+        logger.info('----Запись в кеш.')
+        query1 = "очень длинная строка sql запроса 1"
+        self.cache[query1] = [
+            { 'person.id': 1, 'person.name': 'Anton 1' },
+            { 'person.id': 2, 'person.name': 'Anton 2' }
+        ]
+        query2 = "очень длинная строка sql запроса 2"
+        self.cache[query2] = [
+            { 'company.id': 1, 'company.name': 'SD' }
+        ]
+        self.assertListEqual(self.cache[query1].filter({'person.id': 2}).get(), [{ 'person.id': 2, 'person.name': 'Anton 2' }])
+        with self.assertRaises(NoMatchFieldInCache):
+            self.cache[query1].filter({'person.age': 2}).get()
+
+        logger.info('----Изменение записей в кеше.')
+        self.cache[query1].filter({'person.id': 2}).update({'person.name': 'Anton 3'})
+        self.cache[query1].insert({ 'person.id': 3, 'person.name': 'Anton 4' })
+        self.cache[query1].filter({'person.id': 1}).delete()
+        self.assertListEqual(self.cache[query1].get(), [
+            { 'person.id': 2, 'person.name': 'Anton 3' },
+            { 'person.id': 3, 'person.name': 'Anton 4' }
+        ])
+
+        logger.info('----Выборка с операторами перебором, без индексов на каждый вызов.')
+        self.assertListEqual(self.cache[query1].filter({'person.id__gte': 3}).get(), [
+            { 'person.id': 3, 'person.name': 'Anton 4' }
+        ])
+        self.assertNotIsInstance(self.cache.lookup(query1), IndexedRecords)
+
+        logger.info('----Удаление закешированные записи связанные с таблицей person.')
+        self.cache.delete_cache_table('person')
+        self.assertIsNone(self.cache.lookup(query1))
+        self.assertListEqual(self.cache[query2].get(), [{ 'company.id': 1, 'company.name': 'SD' }])
+
+        logger.info('----Удаление закешированную запись по sql запросу.')
+        del self.cache[query2]
+        self.assertFalse(self.cache[query2].get())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_2(self):
+        logger.info('2. Кеш общей памяти у нескольких процессов.')
+
+        logger.info('----Дочерний процесс сохраняет запрос и удаляет запросы таблицы.')
+        query1 = "очень длинная строка sql запроса 1"
+        self.cache[query1] = [{ 'person.id': 1, 'person.name': 'Anton' }]
+        query2 = "очень длинная строка sql запроса 2"
+        pid = os.fork()
+        if pid == 0:
+            cache = SharedMemoryCache(self.path, non_expired=True)
+            cache[query2] = [{ 'company.id': 1, 'company.name': 'SD' }]
+            cache.delete_cache_table('person')
+            os._exit(0)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+
+        logger.info('----Родительский процесс видит изменения дочернего.')
+        self.assertListEqual(self.cache[query2].get(), [{ 'company.id': 1, 'company.name': 'SD' }])
+        self.assertIsNone(self.cache.lookup(query1))
+        self.cache.clear()
+        logger.info("-------------------------------------------------------")
+
+    def test_case_3(self):
+        logger.info('3. Время жизни и вытеснение запросов из кеша общей памяти.')
+
+        logger.info('----Пустой результат запроса живет negative_ttl.')
+        cache = SharedMemoryCache(self.path, ttl=10, negative_ttl=1)
+        query = QueryKey("select * from person where id = 0", tables=['person'])
+        cache[query] = []
+        self.assertListEqual(cache.lookup(query), [])
+        time.sleep(1.1)
+        self.assertIsNone(cache.lookup(query))
+
+        logger.info('----В кеше без истечения времени пустой результат тоже живет negative_ttl.')
+        cache = SharedMemoryCache(self.path, non_expired=True, negative_ttl=1)
+        cache[query] = []
+        self.assertListEqual(cache.lookup(query), [])
+        time.sleep(1.1)
+        self.assertIsNone(cache.lookup(query))
+
+        logger.info('----Старые запросы вытесняются, когда память заполнена.')
+        for i in range(2000):
+            self.cache[f"select {i}"] = [{ 'person.id': i, 'person.name': 'A' * 500 }]
+        self.assertListEqual(self.cache["select 1999"].get(), [{ 'person.id': 1999, 'person.name': 'A' * 500 }])
+        self.assertIsNone(self.cache.lookup("select 0"))
+        self.cache.delete_cache_table('person')
+        self.assertIsNone(self.cache.lookup("select 1999"))
+        logger.info("-------------------------------------------------------")
+
+    def test_case_4(self):
+        logger.info('4. Удаление запросов таблицы после вытеснения из кеша общей памяти.')
+        path = tests_dir / 'test_shared_cache_small.shm'
+        cache = SharedMemoryCache(path, non_expired=True, size=64 * 1024, slots=4096)
+        try:
+            query = "select * from person"
+            cache[query] = [{ 'person.id': 1, 'person.name': 'old' }]
+            logger.info('----Запрос сохраняется повторно, пока старые записи вытесняются.')
+            for i in range(60):
+                cache[f"select {i}"] = [{ 'company.id': i, 'company.name': 'C' * 1000 }]
+                if i == 30:
+                    cache[query] = [{ 'person.id': 1, 'person.name': 'old' }]
+            self.assertIsNotNone(cache.lookup(query))
+            logger.info('----Удаление запросов таблицы person.')
+            self.assertTrue(cache.delete_cache_table('person'))
+            self.assertIsNone(cache.lookup(query))
+
+            logger.info('----Ячейки хеш-таблицы заняты другими запросами.')
+            small = SharedMemoryCache(tests_dir / 'test_shared_cache_slots.shm', non_expired=True, size=64 * 1024, slots=16)
+            small[query] = [{ 'person.id': 1, 'person.name': 'old' }]
+            for i in range(100):
+                small[f"select {i}"] = [{ 'company.id': i }]
+                small[query] = [{ 'person.id': 1, 'person.name': 'old' }]
+            small.delete_cache_table('person')
+            self.assertIsNone(small.lookup(query))
+            del small
+        finally:
+            del cache
+            os.remove(path)
+            os.remove(tests_dir / 'test_shared_cache_slots.shm')
+        logger.info("-------------------------------------------------------")
@@ -5,7 +5,7 @@ from settings import logger, BaseTest, tests_dir
 from query_tables.db import SQLiteQuery, AsyncSQLiteQuery, AsyncPostgresQuery, DBConfigPg, PostgresQuery
 from query_tables.tables import Tables, TablesAsync
 from query_tables.query import Join, LeftJoin
-from query_tables.exceptions import DesabledCache, ErrorExecuteJoinQuery
+from query_tables.exceptions import DesabledCache, ErrorExecuteJoinQuery, NotTable, NotFieldQueryTable
 from query_tables.cache import RedisCache, RedisConnect, AsyncRedisCache
 
 
@@ -1117,6 +1117,473 @@ class TestTables(BaseTest):
         self.loop.run_until_complete(case6_remotecache())
         logger.info("-------------------------------------------------------")
         
+    def test_case_7(self):
+        logger.info("7. Ленивая загрузка структуры таблиц.")
+        sqlite = SQLiteQuery(tests_dir / 'test_tables.db')
+        tables = Tables(sqlite, lazy=True)
+        self.assertDictEqual(tables._tables_struct, {})
+        
+        logger.info("----Структура загружается при первом обращение.")
+        res = tables['person'].filter(id=2).get()
+        self.assertEqual(res[0]['person.name'], 'Anton 2')
+        self.assertListEqual(list(tables._tables_struct.keys()), ['person'])
+        
+        with self.assertRaises(NotTable):
+            tables['not_exist_table']
+            
+        logger.info("----Асинхронная загрузка с фоновой загрузкой таблиц.")
+        async_sqlite = AsyncSQLiteQuery(tests_dir / 'test_tables_async.db')
+        async def case7():
+            tables = TablesAsync(async_sqlite, lazy=True, prefetch_tables=['company'])
+            await tables.init()
+            await tables.load_tables('person')
+            res = await tables['person'].filter(id=2).get()
+            self.assertEqual(res[0]['person.name'], 'Anton 2')
+            await tables._prefetch_task
+            self.assertIn('company', tables._tables_struct)
+            with self.assertRaises(NotTable):
+                await tables.load_tables('not_exist_table')
+        self.loop.run_until_complete(case7())
+        logger.info("-------------------------------------------------------")
+        
+    def test_case_8(self):
+        logger.info("8. Снимок структуры таблиц на диске.")
+        import json
+        import sqlite3
+        shutil.copy(tests_dir.joinpath('backup', 'test.db'), tests_dir / 'test_snapshot.db')
+        snapshot = tests_dir / 'test_snapshot.json'
+        try:
+            sqlite = SQLiteQuery(tests_dir / 'test_snapshot.db')
+            tables = Tables(sqlite, schema_snapshot=snapshot)
+            with open(snapshot, encoding='utf-8') as f:
+                data = json.load(f)
+            self.assertDictEqual(data['tables'], tables._tables_struct)
+            
+            logger.info("----Структура берется из снимка.")
+            with open(snapshot, 'w', encoding='utf-8') as f:
+                data['tables']['person'].append('from_snapshot')
+                json.dump(data, f)
+            tables = Tables(sqlite, schema_snapshot=snapshot)
+            self.assertIn('from_snapshot', tables._tables_struct['person'])
+            
+            logger.info("----После изменения схемы структура загружается из БД.")
+            conn = sqlite3.connect(tests_dir / 'test_snapshot.db')
+            conn.execute('alter table person add column email text')
+            conn.commit()
+            conn.close()
+            tables = Tables(sqlite, schema_snapshot=snapshot)
+            self.assertNotIn('from_snapshot', tables._tables_struct['person'])
+            self.assertIn('email', tables._tables_struct['person'])
+        finally:
+            os.remove(tests_dir / 'test_snapshot.db')
+            os.remove(snapshot)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_9(self):
+        logger.info("9. Перезагрузка структуры таблиц при изменении схемы БД.")
+        import sqlite3
+        shutil.copy(tests_dir.joinpath('backup', 'test.db'), tests_dir / 'test_schema.db')
+        try:
+            sqlite = SQLiteQuery(tests_dir / 'test_schema.db')
+            tables = Tables(sqlite, cache_ttl=100, schema_check_interval=100)
+            tables['person'].filter(id=1).get()
+            self.assertEqual(tables.check_schema(), [])
+            
+            logger.info("----Изменившиеся таблицы перезагружаются, их кеш удаляется.")
+            conn = sqlite3.connect(tests_dir / 'test_schema.db')
+            conn.execute('alter table person add column email text')
+            conn.commit()
+            conn.close()
+            self.assertEqual(tables.check_schema(), ['person'])
+            self.assertIn('email', tables._tables_struct['person'])
+            self.assertFalse(tables._cache._tables.get('person'))
+            
+            logger.info("----Неизвестное поле вызывает проверку схемы.")
+            conn = sqlite3.connect(tests_dir / 'test_schema.db')
+            conn.execute('alter table person add column phone text')
+            conn.commit()
+            conn.close()
+            tables._last_schema_check -= 1
+            query = tables['person'].filter(phone='1')
+            self.assertIn('phone', tables._tables_struct['person'])
+            self.assertEqual(query.get(), [])
+            tables._last_schema_check -= 1
+            with self.assertRaises(NotFieldQueryTable):
+                tables['person'].filter(not_field='1')
+            
+            logger.info("----Запрос собирается заново с новыми полями таблиц.")
+            query = tables['person'].join(Join(tables['address'], 'id', 'ref_address'))
+            conn = sqlite3.connect(tests_dir / 'test_schema.db')
+            conn.execute('alter table person add column code text')
+            conn.execute('alter table address add column zip text')
+            conn.execute("update person set code = 'a' where id = 1")
+            conn.commit()
+            conn.close()
+            tables._last_schema_check -= 1
+            records = query.filter(code='a').get()
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0]['person.code'], 'a')
+            self.assertIn('address.zip', records[0])
+            
+            logger.info("----Неизвестное поле вызывает проверку схемы и без периодической проверки.")
+            tables = Tables(sqlite, cache_ttl=100)
+            conn = sqlite3.connect(tests_dir / 'test_schema.db')
+            conn.execute('alter table person add column city text')
+            conn.commit()
+            conn.close()
+            tables._last_schema_check -= 1
+            self.assertEqual(tables['person'].filter(city='a').get(), [])
+            self.assertIn('city', tables._tables_struct['person'])
+            with self.assertRaises(NotFieldQueryTable):
+                tables['person'].filter(street='a')
+        finally:
+            os.remove(tests_dir / 'test_schema.db')
+        logger.info("-------------------------------------------------------")
+
+    def test_case_10(self):
+        logger.info("10. Драйверы БД и кеша импортируются при первом обращение.")
+        import sys
+        import subprocess
+        code = (
+            "import sys, query_tables;"
+            "from query_tables.db import SQLiteQuery;"
+            "print(','.join(m for m in ('redis', 'asyncpg', 'psycopg2', 'aiosqlite') if m in sys.modules))"
+        )
+        res = subprocess.run(
+            [sys.executable, '-c', code], cwd=tests_dir.parent,
+            capture_output=True, text=True, check=True
+        )
+        self.assertEqual(res.stdout.strip(), '')
+        
+        logger.info("----Модуль загружается при обращение к классу.")
+        code = (
+            "import sys; from query_tables.cache import RedisCache;"
+            "print('redis' in sys.modules)"
+        )
+        res = subprocess.run(
+            [sys.executable, '-c', code], cwd=tests_dir.parent,
+            capture_output=True, text=True, check=True
+        )
+        self.assertEqual(res.stdout.strip(), 'True')
+        logger.info("-------------------------------------------------------")
+
+    def test_case_11(self):
+        logger.info("11. Пересоздание блокировок и соединений после fork.")
+        import threading
+        if not hasattr(os, 'fork'):
+            self.skipTest('fork не поддерживается')
+        sqlite = SQLiteQuery(tests_dir / 'test_tables.db')
+        tables = Tables(sqlite, cache_ttl=100)
+        data = tables['person'].filter(id=1).get()
+        self.assertTrue(data)
+        
+        logger.info("----Блокировки захвачены другим потоком в момент fork.")
+        locked, release = threading.Event(), threading.Event()
+        def hold():
+            with tables._cache._rlock, tables._struct_lock:
+                locked.set()
+                release.wait()
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                import signal
+                signal.alarm(5)
+                cache_data = tables['person'].filter(id=1).cache.get()
+                with tables._struct_lock:
+                    db_data = tables['person'].filter(id=2).get()
+                code = 0 if cache_data == data and db_data else 1
+            finally:
+                os._exit(code)
+        release.set()
+        thread.join()
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        
+        logger.info("----Удаленные объекты не остаются в реестре методов после fork.")
+        import gc
+        from query_tables import fork
+        gc.collect()
+        count = len(fork._handlers)
+        for _ in range(100):
+            Tables(SQLiteQuery(tests_dir / 'test_tables.db'), cache_ttl=100)
+        gc.collect()
+        self.assertLessEqual(len(fork._handlers), count)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_12(self):
+        logger.info("12. Изменение записей удаляет из кеша только пересекающиеся запросы.")
+        sqlite = SQLiteQuery(tests_dir / 'test_tables.db')
+        tables = Tables(sqlite, non_expired=True)
+        person1 = tables['person'].filter(id=1).get()
+        person2 = tables['person'].filter(id=2).get()
+        tables['person'].filter(age__gte=31).get()
+        self.assertTrue(tables['person'].filter(id=1).cache.get())
+        
+        logger.info("----Обновление одной записи.")
+        tables['person'].filter(id=1).update(age=person1[0]['person.age'])
+        self.assertFalse(tables['person'].filter(id=1).cache.get())
+        self.assertFalse(tables['person'].filter(age__gte=31).cache.get())
+        self.assertEqual(tables['person'].filter(id=2).cache.get(), person2)
+        
+        logger.info("----Удаление записей, которых нет в кеше.")
+        tables['person'].filter(id=1).get()
+        tables['person'].filter(id__in=[100, 101]).delete()
+        self.assertTrue(tables['person'].filter(id=1).cache.get())
+        tables['person'].delete_cache_table()
+        self.assertFalse(tables['person'].filter(id=2).cache.get())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_13(self):
+        logger.info("13. Применение изменений таблицы к записям в кеше.")
+        sqlite = SQLiteQuery(tests_dir / 'test_tables.db')
+        tables = Tables(sqlite, non_expired=True, cache_write_through=True)
+        db_tables = Tables(sqlite)
+        addresses = tables['address'].filter(id__gt=0).get()
+        tables['address'].filter(id__gt=0).order_by(id='desc').limit(1).get()
+        
+        logger.info("----Вставка записи.")
+        tables['address'].insert([dict(street='write through', building=500)])
+        cache_data = tables['address'].filter(id__gt=0).cache.get()
+        self.assertEqual(len(cache_data), len(addresses) + 1)
+        self.assertEqual(cache_data, db_tables['address'].filter(id__gt=0).get())
+        self.assertFalse(tables['address'].filter(id__gt=0).order_by(id='desc').limit(1).cache.get())
+        new_id = cache_data[-1]['address.id']
+        
+        logger.info("----Обновление записи.")
+        tables['address'].filter(id=new_id).update(building=501)
+        cache_data = tables['address'].filter(id__gt=0).cache.get()
+        self.assertEqual(cache_data[-1]['address.building'], 501)
+        self.assertEqual(cache_data, db_tables['address'].filter(id__gt=0).get())
+        
+        logger.info("----Удаление записи.")
+        tables['address'].filter(id=new_id).delete()
+        self.assertEqual(tables['address'].filter(id__gt=0).cache.get(), addresses)
+        logger.info("-------------------------------------------------------")
+
+    def test_case_14(self):
+        logger.info("14. Одинаковые запросы при промахе кеша выполняются в БД один раз.")
+        import threading
+        import time
+        
+        class CountSQLiteQuery(SQLiteQuery):
+            count = 0
+            def execute(self, query):
+                CountSQLiteQuery.count += 1
+                time.sleep(0.2)
+                return super().execute(query)
+        
+        class CountAsyncSQLiteQuery(AsyncSQLiteQuery):
+            count = 0
+            async def execute(self, query):
+                CountAsyncSQLiteQuery.count += 1
+                await asyncio.sleep(0.2)
+                return await super().execute(query)
+        
+        logger.info("----Потоки.")
+        tables = Tables(CountSQLiteQuery(tests_dir / 'test_tables.db'), cache_ttl=100)
+        CountSQLiteQuery.count = 0
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(tables['person'].filter(id=1).get()))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(CountSQLiteQuery.count, 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(res == results[0] and res for res in results))
+        
+        logger.info("----Задачи asyncio.")
+        async def get_async():
+            tables = TablesAsync(CountAsyncSQLiteQuery(tests_dir / 'test_tables.db'), cache_ttl=100)
+            await tables.init()
+            CountAsyncSQLiteQuery.count = 0
+            return await asyncio.gather(*[
+                tables['person'].filter(id=1).get() for _ in range(5)
+            ])
+        results = self.loop.run_until_complete(get_async())
+        self.assertEqual(CountAsyncSQLiteQuery.count, 1)
+        self.assertTrue(all(res == results[0] and res for res in results))
+        logger.info("-------------------------------------------------------")
+
+    def test_case_15(self):
+        logger.info("15. Устаревшие записи отдаются из кеша и обновляются в фоне.")
+        import time
+        
+        class CountSQLiteQuery(SQLiteQuery):
+            count = 0
+            def execute(self, query):
+                CountSQLiteQuery.count += 1
+                time.sleep(0.2)
+                return super().execute(query)
+        
+        class CountAsyncSQLiteQuery(AsyncSQLiteQuery):
+            count = 0
+            async def execute(self, query):
+                CountAsyncSQLiteQuery.count += 1
+                await asyncio.sleep(0.2)
+                return await super().execute(query)
+        
+        logger.info("----Пул потоков.")
+        tables = Tables(
+            CountSQLiteQuery(tests_dir / 'test_tables.db'), cache_ttl=1, cache_stale_ttl=100
+        )
+        CountSQLiteQuery.count = 0
+        res = tables['person'].filter(id=1).get()
+        self.assertTrue(res)
+        self.assertEqual(CountSQLiteQuery.count, 1)
+        time.sleep(1.1)
+        start = time.monotonic()
+        self.assertEqual(tables['person'].filter(id=1).get(), res)
+        self.assertEqual(tables['person'].filter(id=1).get(), res)
+        self.assertLess(time.monotonic() - start, 0.2)
+        for _ in range(20):
+            if not tables._cache.is_stale(tables['person'].filter(id=1)._query_key()):
+                break
+            time.sleep(0.1)
+        self.assertEqual(CountSQLiteQuery.count, 2)
+        self.assertEqual(tables['person'].filter(id=1).get(), res)
+        self.assertEqual(CountSQLiteQuery.count, 2)
+        
+        logger.info("----Задачи asyncio.")
+        async def get_async():
+            tables = TablesAsync(
+                CountAsyncSQLiteQuery(tests_dir / 'test_tables.db'), 
+                cache_ttl=1, cache_stale_ttl=100
+            )
+            await tables.init()
+            CountAsyncSQLiteQuery.count = 0
+            res = await tables['person'].filter(id=1).get()
+            await asyncio.sleep(1.1)
+            stale = await asyncio.gather(*[
+                tables['person'].filter(id=1).get() for _ in range(3)
+            ])
+            self.assertTrue(all(item == res for item in stale))
+            self.assertEqual(CountAsyncSQLiteQuery.count, 1)
+            await asyncio.sleep(0.5)
+            self.assertEqual(CountAsyncSQLiteQuery.count, 2)
+            self.assertEqual(await tables['person'].filter(id=1).get(), res)
+            self.assertEqual(CountAsyncSQLiteQuery.count, 2)
+        self.loop.run_until_complete(get_async())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_16(self):
+        logger.info("16. Время кеша по таблицам и для отдельного запроса.")
+        import time
+        tables = Tables(
+            SQLiteQuery(tests_dir / 'test_tables.db'), 
+            cache_ttl={'person': 100, 'address': 1}
+        )
+        
+        logger.info("----Запросы кешируются по времени своих таблиц.")
+        person = tables['person'].filter(id=1)
+        person.get()
+        self.assertTrue(person.cache.get())
+        address = tables['address']
+        address.get()
+        self.assertTrue(address.cache.get())
+        joined = tables['person'].join(Join(tables['address'], 'id', 'ref_address'))
+        joined.get()
+        self.assertTrue(joined.cache.get())
+        company = tables['company']
+        self.assertTrue(company.get())
+        self.assertFalse(company.cache.get())
+        
+        logger.info("----Время, заданное при вызове запроса.")
+        persons = tables['person'].filter(id=2)
+        persons.get(ttl=1)
+        self.assertTrue(persons.cache.get())
+        time.sleep(1.1)
+        self.assertTrue(person.cache.get())
+        self.assertFalse(address.cache.get())
+        self.assertFalse(joined.cache.get())
+        self.assertFalse(persons.cache.get())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_17(self):
+        logger.info("17. Прогрев кеша.")
+        
+        class CountSQLiteQuery(SQLiteQuery):
+            count = 0
+            def execute(self, query):
+                CountSQLiteQuery.count += 1
+                return super().execute(query)
+        
+        logger.info("----Запросы и SQL выполняются в БД один раз при прогреве.")
+        tables = Tables(CountSQLiteQuery(tests_dir / 'test_tables.db'), cache_ttl=100)
+        sql = 'select id from person'
+        queries = [
+            tables['person'].filter(id=1),
+            tables['address'],
+            sql, ' ',
+        ]
+        CountSQLiteQuery.count = 0
+        self.assertEqual(tables.warm(queries, concurrency=2), 3)
+        self.assertEqual(CountSQLiteQuery.count, 3)
+        self.assertTrue(tables['person'].filter(id=1).get())
+        self.assertTrue(tables['address'].get())
+        self.assertTrue(tables.query(sql, cache=True))
+        self.assertEqual(CountSQLiteQuery.count, 3)
+        
+        logger.info("----Без кеша прогрев не выполняется.")
+        tables = Tables(CountSQLiteQuery(tests_dir / 'test_tables.db'))
+        self.assertEqual(tables.warm([tables['person']]), 0)
+        
+        logger.info("----Задачи asyncio.")
+        async def warm_async():
+            tables = TablesAsync(AsyncSQLiteQuery(tests_dir / 'test_tables.db'), cache_ttl=100)
+            await tables.init()
+            res = await tables.warm([tables['person'].filter(id=1), sql], concurrency=2)
+            self.assertEqual(res, 2)
+            self.assertTrue(tables['person'].filter(id=1).cache.get())
+        self.loop.run_until_complete(warm_async())
+        logger.info("-------------------------------------------------------")
+
+    def test_case_18(self):
+        logger.info("18. Снимок локального кеша.")
+        
+        class CountSQLiteQuery(SQLiteQuery):
+            count = 0
+            def execute(self, query):
+                CountSQLiteQuery.count += 1
+                return super().execute(query)
+        
+        path = tests_dir / 'test_tables.cache'
+        try:
+            logger.info("----Кеш сохраняется в снимок и загружается при запуске.")
+            tables = Tables(
+                SQLiteQuery(tests_dir / 'test_tables.db'), 
+                cache_ttl=100, cache_snapshot=path
+            )
+            res = tables['person'].filter(id=1).get()
+            tables._save_cache_snapshot()
+            tables = Tables(
+                CountSQLiteQuery(tests_dir / 'test_tables.db'), 
+                cache_ttl=100, cache_snapshot=path
+            )
+            CountSQLiteQuery.count = 0
+            self.assertEqual(tables['person'].filter(id=1).get(), res)
+            self.assertEqual(CountSQLiteQuery.count, 0)
+            
+            logger.info("----Задачи asyncio.")
+            async def load_async():
+                tables = TablesAsync(
+                    AsyncSQLiteQuery(tests_dir / 'test_tables.db'), 
+                    cache_ttl=100, cache_snapshot=path
+                )
+                await tables.init()
+                self.assertEqual(tables['person'].filter(id=1).cache.get(), res)
+            self.loop.run_until_complete(load_async())
+        finally:
+            path.unlink(missing_ok=True)
+        logger.info("-------------------------------------------------------")
+        
         
 if __name__ == "__main__":
     TestTables.start()
\ No newline at end of file